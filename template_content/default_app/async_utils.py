@@ -0,0 +1,266 @@
+# asyncio versions of the helpers in utils.py, so one process can keep many transactions in flight
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from algosdk.transaction import (
+    ApplicationCreateTxn,
+    AssetCreateTxn,
+    AssetTransferTxn,
+    OnComplete,
+    PaymentTxn,
+    StateSchema,
+)
+from algosdk.atomic_transaction_composer import (
+    AtomicTransactionComposer,
+    TransactionWithSigner,
+    AccountTransactionSigner
+)
+from algosdk.error import AlgodHTTPError
+from algosdk.logic import get_application_address
+from algosdk.v2client.algod import AlgodClient
+from algokit_utils import Account
+
+from utils import ALGOD_CLIENT, get_dispenser, get_suggested_params
+from confirmations import atc_response, get_confirmation_service
+from gora_abi_client import MAIN_METHODS, MainDepositAlgoArgs, MainDepositTokenArgs, MainInitArgs
+
+class AsyncAlgodClient():
+    """Runs AlgodClient calls off the event loop with a bounded number of requests in flight.
+
+    algosdk's HTTP transport is blocking, so each request borrows a worker thread only for
+    the duration of the HTTP round trip; confirmations come from the client's ConfirmationService.
+    """
+
+    def __init__(self, algod_client: AlgodClient, max_concurrency: int = 64):
+        self.client = algod_client
+        self.confirmations = get_confirmation_service(algod_client)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(self, func, *args, **kwargs):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def call(self, method_name: str, *args, **kwargs):
+        return await self.run(getattr(self.client, method_name), *args, **kwargs)
+
+    async def suggested_params(self, **overrides):
+        return await self.run(get_suggested_params, self.client, **overrides)
+
+    async def send_transaction(self, signed_txn):
+        return await self.call("send_transaction", signed_txn)
+
+    async def send_transactions(self, signed_txns):
+        return await self.call("send_transactions", signed_txns)
+
+    async def wait_for_confirmation(self, txid: str, last_valid: int | None = None, wait_rounds: int = 4):
+        # resolved by the shared block follower rather than by polling this txid
+        future = self.confirmations.watch(txid, last_valid)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=max(wait_rounds, 1) * 10)
+
+    async def send_and_wait(self, signed_txns: list, wait_rounds: int = 4):
+        await self.send_transactions(signed_txns)
+        # a group confirms atomically, so the last txn stands in for all of them
+        last_valid = min(signed_txn.transaction.last_valid_round for signed_txn in signed_txns)
+        return await self.wait_for_confirmation(signed_txns[-1].get_txid(), last_valid, wait_rounds)
+
+    async def execute(self, atc: AtomicTransactionComposer, wait_rounds: int = 4):
+        """Like `atc.execute`: sends the group and returns its AtomicTransactionResponse."""
+        signed_txns = atc.gather_signatures()
+        txn_info = await self.send_and_wait(signed_txns, wait_rounds)
+        last_txid = signed_txns[-1].get_txid()
+        method_infos = {}
+        for method_index in atc.method_dict:
+            txid = atc.tx_ids[method_index]
+            try:
+                method_infos[txid] = txn_info if txid == last_txid else await self.call("pending_transaction_info", txid)
+            except AlgodHTTPError as error:
+                method_infos[txid] = error
+        return atc_response(atc, txn_info["confirmed-round"], method_infos)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+class AsyncMainContract():
+    def __init__(
+        self,
+        algod: AsyncAlgodClient,
+        gora_asset_id: int,
+        manager: str
+    ):
+        self.id = 0
+        self.address = None
+        self.owner = None
+        self.algod = algod
+        self.gora_asset_id = gora_asset_id
+        self.manager = manager
+        self.init_processed = False
+
+    @classmethod
+    async def create(
+        cls,
+        algod: AsyncAlgodClient,
+        deployer: Account,
+        gora_asset_id: int,
+        main_approval_code: bytes,
+        main_clear_code: bytes,
+        manager: str
+    ):
+        contract = cls(algod, gora_asset_id, manager)
+        await contract.deploy(deployer, main_approval_code, main_clear_code)
+        await fund_account(algod, contract.address, 2_955_000)
+        await contract.init(deployer)
+        return contract
+
+    async def deploy(
+        self,
+        user: Account,
+        main_approval_code: bytes,
+        main_clear_code: bytes,
+    ):
+        if self.id != 0:
+            raise RuntimeError("Contract has already been deployed")
+
+        unsigned_txn = ApplicationCreateTxn(
+            sp=await self.algod.suggested_params(),
+            sender=user.address,
+            on_complete=OnComplete.NoOpOC,
+            approval_program=main_approval_code,
+            clear_program=main_clear_code,
+            extra_pages=3,
+            global_schema=StateSchema(13,3),
+            local_schema=StateSchema(7,4)
+        )
+        signed_txn = unsigned_txn.sign(user.private_key)
+        txn_result = await self.algod.send_and_wait([signed_txn])
+
+        self.id = txn_result["application-index"]
+        self.address = get_application_address(self.id)
+        self.owner = user
+        return self.id
+
+    async def init(self, user: Account):
+        if self.id == 0:
+            raise RuntimeError("contract must be deployed first")
+
+        if self.init_processed == True:
+            raise RuntimeError("contract has already been initiated")
+
+        init_group = AtomicTransactionComposer()
+        init_group.add_method_call(
+            app_id=self.id,
+            method=MAIN_METHODS["init"],
+            sender=user.address,
+            sp=await self.algod.suggested_params(fee=2000),
+            signer=AccountTransactionSigner(user.private_key),
+            method_args=MainInitArgs(
+                token=self.gora_asset_id,
+                manager=self.manager
+            )
+        )
+        response = await self.algod.execute(init_group)
+        self.init_processed = True
+        return response.abi_results
+
+    async def deposit_algo(self, user: Account, amount: int, address_if_other=None):
+        account_to_deposit_to = user.address
+        if type(address_if_other) is str:
+            account_to_deposit_to = address_if_other
+
+        sp = await self.algod.suggested_params()
+        signer = AccountTransactionSigner(user.private_key)
+        payment_txn = TransactionWithSigner(
+            PaymentTxn(sender=user.address, sp=sp, receiver=self.address, amt=amount),
+            signer
+        )
+
+        atc = AtomicTransactionComposer()
+        atc.add_method_call(
+            app_id=self.id,
+            method=MAIN_METHODS["deposit_algo"],
+            sender=user.address,
+            sp=sp,
+            signer=signer,
+            method_args=MainDepositAlgoArgs(
+                algorand_txn=payment_txn,
+                account_to_deposit_to=account_to_deposit_to
+            )
+        )
+        return await self.algod.execute(atc)
+
+    async def deposit_token(self, user: Account, amount: int, address_if_other=None):
+        account_to_deposit_to = user.address
+        if type(address_if_other) is str:
+            account_to_deposit_to = address_if_other
+
+        sp = await self.algod.suggested_params()
+        signer = AccountTransactionSigner(user.private_key)
+        transfer_txn = TransactionWithSigner(
+            AssetTransferTxn(sender=user.address, sp=sp, receiver=self.address, amt=amount, index=self.gora_asset_id),
+            signer
+        )
+
+        atc = AtomicTransactionComposer()
+        atc.add_method_call(
+            app_id=self.id,
+            method=MAIN_METHODS["deposit_token"],
+            sender=user.address,
+            sp=sp,
+            signer=signer,
+            method_args=MainDepositTokenArgs(
+                token_txn=transfer_txn,
+                application_token=self.gora_asset_id,
+                account_to_deposit_to=account_to_deposit_to
+            )
+        )
+        return await self.algod.execute(atc)
+
+def get_async_algod(algod_client: AlgodClient | None = None, max_concurrency: int = 64):
+    return AsyncAlgodClient(algod_client or ALGOD_CLIENT, max_concurrency)
+
+async def fund_account(algod: AsyncAlgodClient, receiver_address: str, amount: int):
+    dispenser_account = await algod.run(get_dispenser, algod.client)
+    unsigned_txn = PaymentTxn(
+        sender=dispenser_account.address,
+        sp=await algod.suggested_params(),
+        receiver=receiver_address,
+        amt=amount
+    )
+    return await algod.send_and_wait([unsigned_txn.sign(dispenser_account.private_key)])
+
+async def deploy_token(algod: AsyncAlgodClient, account: Account):
+    unsigned_txn = AssetCreateTxn(
+        asset_name="GORA",
+        unit_name="GORA",
+        url="goracle.io",
+        decimals=6,
+        total=1e16,
+        sender=account.address,
+        sp=await algod.suggested_params(),
+        metadata_hash="",
+        default_frozen=False
+    )
+    txn_result = await algod.send_and_wait([unsigned_txn.sign(account.private_key)])
+    return txn_result["asset-index"]
+
+async def opt_in(algod: AsyncAlgodClient, token_id: int, user: Account):
+    unsigned_txn = AssetTransferTxn(
+        sp=await algod.suggested_params(),
+        sender=user.address,
+        receiver=user.address,
+        index=token_id,
+        amt=0
+    )
+    return await algod.send_and_wait([unsigned_txn.sign(user.private_key)])
+
+async def send_asa(algod: AsyncAlgodClient, main_account: Account, user: Account, asset_id: int, amount: int):
+    unsigned_txn = AssetTransferTxn(
+        sp=await algod.suggested_params(),
+        sender=main_account.address,
+        receiver=user.address,
+        index=asset_id,
+        amt=amount
+    )
+    return await algod.send_and_wait([unsigned_txn.sign(main_account.private_key)])
@@ -0,0 +1,283 @@
+# Benchmarks for the build, encoding and client hot paths, with a baseline kept in
+# benchmark_baseline.json and a compare command that fails on regressions past a threshold.
+#   python default_app/benchmarks.py run        print timings
+#   python default_app/benchmarks.py baseline   run and write the baseline
+#   python default_app/benchmarks.py compare    run and compare with the baseline
+import os
+import sys
+import json
+import time
+import timeit
+import platform
+import argparse
+import itertools
+import statistics
+import subprocess
+import importlib.metadata
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+# the client cases run against the in-process stand-in, never a real network
+os.environ["GORACLE_FAKE_ALGOD"] = "1"
+
+from algosdk import abi as sdk_abi
+
+from build_graph import PROTOCOL_ASSETS_PATH, compile_artifact, generate_teal, protocol_build_graph, setup_contract_imports
+from utils import fund_account, fund_many, generate_account, get_methods_list, convert_feed_result_json
+
+sys.path.append(".")
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+FEED_EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feed_examples.json")
+# bump when the cases or the way they are timed change, so old baselines aren't compared
+BASELINE_FORMAT = 1
+# run to run noise on a shared single core machine reaches 35%, keep clear of it
+DEFAULT_THRESHOLD = 0.5
+ABI_TYPES = ("RequestInfo", "ProposalsEntry", "LocalHistoryEntry", "ResponseBody")
+
+@dataclass
+class Case:
+    name: str
+    # returns the function to time, so setup cost stays out of the timings
+    setup: Callable[[], Callable[[], object]]
+
+class Skip(Exception):
+    """A case that can't run here, e.g. for a missing optional dependency."""
+
+def compile_cases():
+    # pyteal AST construction and code generation per protocol contract, without algod
+    setup_contract_imports()
+    params = {}
+
+    def contract_case(name):
+        def setup():
+            if not params:
+                artifacts = {}
+                for node_name, node in protocol_build_graph(1).nodes.items():
+                    params[node_name] = node.params(artifacts)
+                    artifacts[node_name] = compile_artifact(node_name, generate_teal(node_name, params[node_name])[0], params[node_name])
+            return lambda: generate_teal(name, params[name])
+        return Case(f"compile.{name}", setup)
+
+    return [contract_case(name) for name in ("vote_verify_lsig", "voting_clear", "main_clear", "voting_approval", "main_approval")]
+
+def lookup_cases():
+    def method_signatures():
+        from utils.gora_pyteal_utils import get_method_signature, main_contract_abi, voting_contract_abi
+        names = [(method["name"], "main") for method in main_contract_abi["methods"]]
+        names += [(method["name"], "voting") for method in voting_contract_abi["methods"]]
+        return lambda: [get_method_signature(name, contract) for name, contract in names]
+
+    def methods_list():
+        return lambda: get_methods_list(PROTOCOL_ASSETS_PATH + "/abi/main-contract.json")
+
+    return [Case("lookup.get_method_signature", method_signatures), Case("lookup.get_methods_list", methods_list)]
+
+def sample_value(abi_type):
+    # a deterministic value filling every field of an algosdk ABI type
+    if isinstance(abi_type, sdk_abi.TupleType):
+        return [sample_value(child) for child in abi_type.child_types]
+    if isinstance(abi_type, sdk_abi.ArrayStaticType):
+        return [sample_value(abi_type.child_type)] * abi_type.static_length
+    if isinstance(abi_type, sdk_abi.ArrayDynamicType):
+        return [sample_value(abi_type.child_type)] * 64
+    if isinstance(abi_type, sdk_abi.UintType):
+        return 2**abi_type.bit_size - 1
+    if isinstance(abi_type, sdk_abi.ByteType):
+        return 0xAB
+    if isinstance(abi_type, sdk_abi.BoolType):
+        return True
+    if isinstance(abi_type, sdk_abi.AddressType):
+        return bytes(range(32))
+    if isinstance(abi_type, sdk_abi.StringType):
+        return "gora" * 8
+    raise TypeError(f"no sample value for {abi_type}")
+
+def abi_cases():
+    def sdk_type(type_name):
+        from pyteal import abi
+        import utils.abi_types
+        return sdk_abi.ABIType.from_string(str(abi.type_spec_from_annotation(getattr(utils.abi_types, type_name))))
+
+    def encode(type_name):
+        def setup():
+            abi_type = sdk_type(type_name)
+            value = sample_value(abi_type)
+            return lambda: abi_type.encode(value)
+        return Case(f"abi.encode.{type_name}", setup)
+
+    def decode(type_name):
+        def setup():
+            abi_type = sdk_type(type_name)
+            encoded = abi_type.encode(sample_value(abi_type))
+            if abi_type.encode(abi_type.decode(encoded)) != encoded:
+                raise RuntimeError(f"{type_name} doesn't round trip")
+            return lambda: abi_type.decode(encoded)
+        return Case(f"abi.decode.{type_name}", setup)
+
+    return [case(type_name) for type_name in ABI_TYPES for case in (encode, decode)]
+
+def feed_cases():
+    with open(FEED_EXAMPLES_PATH) as feed_examples_file:
+        feed_examples = json.load(feed_examples_file)
+    return [
+        Case(f"feed.convert_feed_result_json.{name}", lambda example=example: lambda: convert_feed_result_json(example))
+        for name, example in feed_examples.items()
+    ]
+
+def z_table_cases():
+    def setup():
+        try:
+            from helpers.z_table import make_table
+        except ImportError as error:
+            raise Skip(str(error)) from error
+        return lambda: make_table(50, 7)
+    return [Case("z_table.make_table", setup)]
+
+def client_cases():
+    # a fresh amount on every call, as the ledger rejects a txid it has already seen
+    amounts = itertools.count(100_000)
+
+    def fund_one():
+        receiver = generate_account().address
+        return lambda: fund_account(receiver, next(amounts))
+
+    def fund_batch(size):
+        def setup():
+            receivers = [generate_account().address for _ in range(size)]
+            return lambda: fund_many([(receiver, next(amounts)) for receiver in receivers])
+        return Case(f"client.fund_many.{size}", setup)
+
+    return [Case("client.fund_account", fund_one), fund_batch(16), fund_batch(64)]
+
+def all_cases():
+    return compile_cases() + lookup_cases() + abi_cases() + feed_cases() + z_table_cases() + client_cases()
+
+def time_case(function:Callable, repeat:int, min_seconds:float):
+    # enough calls per sample for the clock not to matter, like `python -m timeit`
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < min_seconds and number < 1_000_000:
+        number *= 10
+    samples = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "number": number,
+        "repeat": repeat,
+    }
+
+def run_cases(cases:list[Case], repeat:int = 5, min_seconds:float = 0.2, verbose:bool = True):
+    results, skipped = {}, {}
+    for case in cases:
+        try:
+            function = case.setup()
+        except Skip as reason:
+            skipped[case.name] = str(reason)
+            if verbose:
+                print(f"{case.name:<60} skipped: {reason}")
+            continue
+        # a first call outside the timings: imports, caches
+        function()
+        results[case.name] = time_case(function, repeat, min_seconds)
+        if verbose:
+            print(f"{case.name:<60} {format_seconds(results[case.name]['median']):>10} (min {format_seconds(results[case.name]['min'])}, {results[case.name]['number']} x {repeat})")
+    return results, skipped
+
+def format_seconds(seconds:float):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpu_count": os.cpu_count(),
+        "pyteal": importlib.metadata.version("pyteal"),
+        "py-algorand-sdk": importlib.metadata.version("py-algorand-sdk"),
+        "git_commit": commit,
+    }
+
+def make_baseline(results:dict, skipped:dict):
+    return {
+        "format": BASELINE_FORMAT,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "cases": results,
+        "skipped": skipped,
+    }
+
+def compare(baseline:dict, results:dict, threshold:float = DEFAULT_THRESHOLD, statistic:str = "min", selected:list[str] | None = None):
+    """(report lines, regressed case names): a case regresses when its `statistic` is more than
+    `threshold` slower than the baseline's. The min is the default, being the least noisy on a
+    busy machine; cases left out by `selected` aren't reported as missing."""
+    lines, regressions = [], []
+    for name, result in results.items():
+        if name not in baseline["cases"]:
+            lines.append(f"{name:<60} {'':>10} {format_seconds(result[statistic]):>10}   new")
+            continue
+        before = baseline["cases"][name][statistic]
+        change = result[statistic] / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "faster"
+        lines.append(f"{name:<60} {format_seconds(before):>10} {format_seconds(result[statistic]):>10} {change * 100:>+7.1f}% {flag}")
+    for name in baseline["cases"]:
+        if name not in results and (selected is None or name in selected):
+            lines.append(f"{name:<60} {format_seconds(baseline['cases'][name][statistic]):>10} {'':>10}   not run")
+    return lines, regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build, encoding and client benchmarks")
+    parser.add_argument("command", choices=("run", "baseline", "compare"))
+    parser.add_argument("-k", "--filter", action="append", default=[], help="only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="minimum time per sample")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="slowdown that counts as a regression, as a fraction")
+    parser.add_argument("--statistic", choices=("min", "median"), default="min", help="what compare looks at")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    selected = [case for case in all_cases() if not args.filter or any(pattern in case.name for pattern in args.filter)]
+    start = time.perf_counter()
+    case_results, case_skips = run_cases(selected, args.repeat, args.min_seconds)
+    print(f"\n{len(case_results)} cases in {time.perf_counter() - start:.1f}s, {len(case_skips)} skipped")
+
+    current = make_baseline(case_results, case_skips)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(current, json_file, indent=4)
+
+    if args.command == "baseline":
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(current, baseline_file, indent=4)
+        print(f"Baseline written to {args.baseline}")
+    elif args.command == "compare":
+        with open(args.baseline) as baseline_file:
+            stored = json.load(baseline_file)
+        if stored.get("format") != BASELINE_FORMAT:
+            print(f"{args.baseline} is format {stored.get('format')}, this suite writes format {BASELINE_FORMAT}: make a new baseline")
+            sys.exit(2)
+        differing = {key: (value, current["environment"].get(key)) for key, value in stored["environment"].items() if key != "git_commit" and current["environment"].get(key) != value}
+        if differing:
+            print("Baseline was made on a different setup, timings may not be comparable: " + ", ".join(f"{key} {old} -> {new}" for key, (old, new) in differing.items()))
+        report, regressed = compare(stored, case_results, args.threshold, args.statistic, [case.name for case in selected])
+        print(f"\n{'case':<60} {'baseline':>10} {'current':>10}   ({args.statistic})")
+        print("\n".join(report))
+        if regressed:
+            print(f"\n{len(regressed)} regressions beyond {args.threshold:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
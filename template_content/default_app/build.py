@@ -1,25 +1,66 @@
 # Build the sample contract in this directory using Beaker and output to ./artifacts
+import os
+import time
+import argparse
 from pathlib import Path
-from beaker import *
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 import default_app
-import algosdk
-from pyteal import *
+from utils import ALGOD_CLIENT
+from algokit_utils.application_specification import ApplicationSpecification
 
+ARTIFACTS_PATH = Path(__file__).parent / "artifacts"
 
-def build(MAIN_APP_ID,DEMO_MODE=False) -> Path:
+@dataclass(frozen=True)
+class AppVariant:
+    main_app_id: int
+    demo_mode: bool = False
+
+    @property
+    def name(self):
+        return f"{self.main_app_id}-demo" if self.demo_mode else str(self.main_app_id)
+
+def build_app_spec(main_app_id:int, demo_mode:bool = False, client=None) -> ApplicationSpecification:
+    """The app spec for one DefaultApp variant. Nothing is written and no module state changes,
+    so any number of these can run in one process. Without a `client` it builds against the
+    default app's ALGOD_CLIENT, which every pool worker creates for itself on import."""
+    return default_app.make_app(main_app_id, demo_mode).build(client or ALGOD_CLIENT)
+
+def build(MAIN_APP_ID,DEMO_MODE=False,output_dir:Path = ARTIFACTS_PATH) -> Path:
     """Build the beaker app, export it to disk, and return the Path to the app spec file"""
-    app = default_app.app
+    app_spec = build_app_spec(MAIN_APP_ID, DEMO_MODE)
+    app_spec.export(output_dir)
 
-    default_app.MAIN_APP_ID = Int(MAIN_APP_ID)
-    default_app.MAIN_APP_ADDRESS = Bytes(algosdk.encoding.decode_address(algosdk.logic.get_application_address(MAIN_APP_ID)))
-    default_app.DEMO_MODE = DEMO_MODE
+    print(f"Dumping {app_spec.contract.name} to {output_dir}")
 
-    output_dir = Path(__file__).parent / "artifacts"
-    app.build(localnet.get_algod_client()).export(output_dir)
+    return Path(output_dir) / "application.json"
 
-    print(f"Dumping {app.name} to {output_dir}")
-    
-    return output_dir / "application.json"
+def build_variant_json(variant:AppVariant):
+    return build_app_spec(variant.main_app_id, variant.demo_mode).to_json()
+
+def build_variants(variants:list[AppVariant], max_workers:int | None = None, output_dir:Path | None = None) -> dict[AppVariant, ApplicationSpecification]:
+    """Build many variants on a process pool (pyteal holds the GIL). With `output_dir`, each one
+    is exported to its own `<output_dir>/<variant name>/` as well."""
+    specs = {}
+    unique = list(dict.fromkeys(variants))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for variant, spec_json in zip(unique, pool.map(build_variant_json, unique)):
+            specs[variant] = ApplicationSpecification.from_json(spec_json)
+            if output_dir is not None:
+                specs[variant].export(Path(output_dir) / variant.name)
+    return specs
 
 if __name__ == "__main__":
-    build()
+    parser = argparse.ArgumentParser(description="Build DefaultApp variants")
+    parser.add_argument("main_app_ids", type=int, nargs="+")
+    parser.add_argument("--demo", action="store_true", help="build with DEMO_MODE, which skips the voting contract check")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output-dir", default=str(ARTIFACTS_PATH / "variants"))
+    args = parser.parse_args()
+
+    if len(args.main_app_ids) == 1:
+        build(args.main_app_ids[0], args.demo)
+    else:
+        start = time.perf_counter()
+        built = build_variants([AppVariant(main_app_id, args.demo) for main_app_id in args.main_app_ids], args.workers, args.output_dir)
+        print(f"Built {len(built)} variants into {args.output_dir} in {time.perf_counter() - start:.2f}s on {args.workers or os.cpu_count()} workers")
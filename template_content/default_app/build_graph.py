@@ -0,0 +1,368 @@
+# Build the Gora protocol contracts in-process as a dependency graph instead of
+# shelling out to a fresh interpreter for every contract
+import os
+import sys
+import json
+import time
+import runpy
+import base64
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable
+
+from algosdk.encoding import decode_address
+from algosdk.logic import address as program_address
+
+from utils import compileTeal, get_ABI_hash, protocol_filepath
+
+sys.path.append(".")
+
+from protocol.utils.smart_assert import SMART_ASSERT_MARKER, error_map
+from protocol.utils.template_patch import TEMPLATE_PREFIX, patch_program, placeholder_values, substitute, template_map
+
+PROTOCOL_ASSETS_PATH = protocol_filepath + "/assets"
+ERROR_MAP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "smart_assert_map.json")
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "build_manifest.json")
+# the templated build has no deployment parameters, so its manifest is the template store
+TEMPLATE_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "template_manifest.json")
+
+# module, pyteal mode name, avm version, scratch slot optimization
+CONTRACTS = {
+    "vote_verify_lsig": ("vote_verify_lsig", "Signature", 7, False),
+    "voting_approval": ("voting_approval", "Application", 8, True),
+    "voting_clear": ("voting_clear", "Application", 8, False),
+    "main_approval": ("main_approval", "Application", 8, False),
+    "main_clear": ("main_clear", "Application", 8, False),
+}
+
+# contracts that go through the post-compile stages (GORACLE_DISPATCH_MODE, GORACLE_TEAL_OPTIMIZE),
+# the same ones whose scripts apply them
+POST_COMPILED = ("main_approval", "voting_approval")
+
+@dataclass
+class BuildArtifact:
+    name: str
+    teal: str
+    program: bytes
+    program_b64: str
+    program_hash: str
+    params: dict = field(default_factory=dict)
+    teal_seconds: float = 0.0
+    compile_seconds: float = 0.0
+    # compact SmartAssert sites (GORACLE_SMART_ASSERT=compact), see protocol/utils/smart_assert.py
+    error_map: list = field(default_factory=list)
+    # where each TMPL_* variable of a templated build sits in `program`, see protocol/utils/template_patch.py
+    templates: dict = field(default_factory=dict)
+
+def artifact_to_json(artifact:BuildArtifact):
+    fields = asdict(artifact)
+    del fields["program"]
+    return fields
+
+def artifact_from_json(fields:dict):
+    return BuildArtifact(program=base64.b64decode(fields["program_b64"]), **fields)
+
+@dataclass
+class BuildNode:
+    name: str
+    deps: list[str] = field(default_factory=list)
+    # receives the artifacts of this node's deps and returns the kwargs for approval_program()
+    params: Callable[[dict[str, BuildArtifact]], dict] = lambda artifacts: {}
+
+def setup_contract_imports():
+    # make the contract sources importable the same way running them as scripts does
+    for import_path in (protocol_filepath, PROTOCOL_ASSETS_PATH):
+        if import_path not in sys.path:
+            sys.path.insert(0, import_path)
+    os.environ.setdefault("GORACLE_ABI_PATH", PROTOCOL_ASSETS_PATH + "/abi")
+
+    # default_app's utils.py shadows the protocol's utils package, which the contracts import
+    shadowing_utils = sys.modules.get("utils")
+    if shadowing_utils is not None and not hasattr(shadowing_utils, "__path__"):
+        shadowing_dir = os.path.dirname(os.path.abspath(shadowing_utils.__file__))
+        sys.path[:] = [p for p in sys.path if os.path.abspath(p) != shadowing_dir]
+        del sys.modules["utils"]
+
+def init_build_worker():
+    setup_contract_imports()
+    # pay for pyteal and the ABI JSON loads once per worker, not once per contract
+    import pyteal # noqa: F401
+    import utils.gora_pyteal_utils # noqa: F401
+
+loaded_contracts = {}
+
+def load_contract(module_name:str):
+    # run the source the same way `python <contract>.py` does (minus the __main__ block);
+    # voting_approval and helpers/voting_base import each other and only resolve as a script
+    if module_name not in loaded_contracts:
+        loaded_contracts[module_name] = runpy.run_path(
+            PROTOCOL_ASSETS_PATH + f"/{module_name}.py",
+            run_name=f"gora_build_{module_name}"
+        )
+    return loaded_contracts[module_name]
+
+def no_phase(name:str):
+    return nullcontext()
+
+def generate_teal(contract_name:str, params:dict, phase:Callable = no_phase):
+    # `phase(name)` wraps each step, see build_profile.py
+    import pyteal
+
+    module_name, mode_name, version, optimize_scratch_slots = CONTRACTS[contract_name]
+    with phase("load"):
+        contract = load_contract(module_name)
+    with phase("ast"):
+        if "approval_program" in contract:
+            program = contract["approval_program"](**params)
+        else:
+            program = contract["clear_state_program"]()
+
+    start = time.perf_counter()
+    with phase("codegen"):
+        teal = pyteal.compileTeal(
+            program,
+            getattr(pyteal.Mode, mode_name),
+            version=version,
+            optimize=pyteal.OptimizeOptions(scratch_slots=optimize_scratch_slots)
+        )
+    with phase("post_compile"):
+        if contract_name in POST_COMPILED:
+            from utils.dispatch import apply_dispatch_mode
+            from utils.teal_optimizer import apply_optimizer_mode
+            teal = apply_optimizer_mode(apply_dispatch_mode(teal, contract_name))
+        if TEMPLATE_PREFIX in teal:
+            from utils.template_patch import hoist_templates
+            teal = hoist_templates(teal)
+    return teal, time.perf_counter() - start
+
+class BuildGraph():
+    def __init__(self, max_workers:int | None = None, manifest=None):
+        self.nodes: dict[str, BuildNode] = {}
+        self.max_workers = max_workers
+        # a build_manifest.BuildManifest: nodes whose inputs it has seen before are not rebuilt
+        self.manifest = manifest
+
+    def add(self, name:str, deps:list[str] | None = None, params:Callable | None = None):
+        if name not in CONTRACTS:
+            raise KeyError(f"unknown contract {name}")
+        for dep in deps or []:
+            if dep not in self.nodes:
+                raise KeyError(f"{name} depends on {dep} which has not been added")
+        node = BuildNode(name, deps or [])
+        if params is not None:
+            node.params = params
+        self.nodes[name] = node
+        return node
+
+    def run(self) -> dict[str, BuildArtifact]:
+        artifacts: dict[str, BuildArtifact] = {}
+        pending: dict[Future, tuple[BuildNode, dict]] = {}
+        remaining = dict(self.nodes)
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_build_worker) as pool:
+            while remaining or pending:
+                # queue everything whose deps are already built
+                for name, node in list(remaining.items()):
+                    if all(dep in artifacts for dep in node.deps):
+                        params = node.params(artifacts)
+                        del remaining[name]
+                        unchanged = self.manifest.lookup(name, params) if self.manifest else None
+                        if unchanged is not None:
+                            artifacts[name] = unchanged
+                        else:
+                            pending[pool.submit(generate_teal, name, params)] = (node, params)
+
+                if not pending:
+                    if remaining:
+                        raise RuntimeError(f"build graph has unresolved deps: {list(remaining)}")
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node, params = pending.pop(future)
+                    teal, teal_seconds = future.result()
+
+                    # algod compile happens here so every node shares the compile cache
+                    artifacts[node.name] = compile_artifact(node.name, teal, params, teal_seconds)
+                    if self.manifest:
+                        self.manifest.record(artifacts[node.name])
+
+        if self.manifest:
+            self.manifest.save()
+        return artifacts
+
+    def run_in_process(self, generate:Callable | None = None) -> dict[str, BuildArtifact]:
+        # for a process that already ran init_build_worker (see build_server.py); nodes were
+        # added after their deps, so insertion order is a build order
+        generate = generate or generate_teal
+        artifacts: dict[str, BuildArtifact] = {}
+        for name, node in self.nodes.items():
+            params = node.params(artifacts)
+            unchanged = self.manifest.lookup(name, params) if self.manifest else None
+            if unchanged is not None:
+                artifacts[name] = unchanged
+                continue
+            teal, teal_seconds = generate(name, params)
+            artifacts[name] = compile_artifact(name, teal, params, teal_seconds)
+            if self.manifest:
+                self.manifest.record(artifacts[name])
+        if self.manifest:
+            self.manifest.save()
+        return artifacts
+
+def compile_artifact(name:str, teal:str, params:dict, teal_seconds:float = 0.0, phase:Callable = no_phase):
+    start = time.perf_counter()
+    compact_asserts = SMART_ASSERT_MARKER in teal
+    # a templated program is compiled with placeholders and keeps its TMPL_* names in `teal`
+    placeholders = placeholder_values(teal)
+    with phase("algod_compile"):
+        compiled = compileTeal(substitute(teal, placeholders) if placeholders else teal, source_map=compact_asserts)
+    program = base64.b64decode(compiled["result"])
+    return BuildArtifact(
+        name=name,
+        teal=teal,
+        program=program,
+        program_b64=compiled["result"],
+        program_hash=compiled["hash"],
+        params=params,
+        teal_seconds=teal_seconds,
+        compile_seconds=time.perf_counter() - start,
+        error_map=error_map(teal, compiled.get("sourcemap")) if compact_asserts else [],
+        templates=template_map(program, teal) if placeholders else {}
+    )
+
+def instantiate_artifact(template:BuildArtifact, values:dict, params:dict):
+    """A templated artifact with `values` patched into its bytecode, as if built with `params`."""
+    start = time.perf_counter()
+    program = patch_program(template.program, template.templates, values)
+    # every instruction after the constant blocks moves by the same amount
+    shift = len(program) - len(template.program)
+    return BuildArtifact(
+        name=template.name,
+        teal=substitute(template.teal, values),
+        program=program,
+        program_b64=base64.b64encode(program).decode(),
+        program_hash=program_address(program),
+        params=params,
+        compile_seconds=time.perf_counter() - start,
+        error_map=[dict(site, pc=site["pc"] + shift if site["pc"] is not None else None) for site in template.error_map]
+    )
+
+def protocol_build_graph(token_asset_id:int, minimum_stake:int = 500, max_workers:int | None = None, manifest=None):
+    main_abi_hash = get_ABI_hash(PROTOCOL_ASSETS_PATH + "/abi/main-contract.json")
+
+    graph = BuildGraph(max_workers, manifest)
+    graph.add("vote_verify_lsig")
+    graph.add("voting_clear")
+    graph.add("main_clear")
+    # the lsig's address is baked into the voting contract
+    graph.add(
+        "voting_approval",
+        deps=["vote_verify_lsig"],
+        params=lambda artifacts: {
+            "CONTRACT_VERSION": main_abi_hash,
+            "VOTE_VERIFY_LSIG_ADDRESS": artifacts["vote_verify_lsig"].program_hash,
+        }
+    )
+    # and the compiled voting programs are baked into the main contract
+    graph.add(
+        "main_approval",
+        deps=["voting_approval", "voting_clear"],
+        params=lambda artifacts: {
+            "TOKEN_ASSET_ID": token_asset_id,
+            "CONTRACT_VERSION": main_abi_hash,
+            "VOTE_APPROVAL_PROGRAM": artifacts["voting_approval"].program_b64,
+            "VOTE_CLEAR_PROGRAM": artifacts["voting_clear"].program_b64,
+            "MINIMUM_STAKE": minimum_stake,
+        }
+    )
+    return graph
+
+def protocol_template_graph(max_workers:int | None = None, manifest=None):
+    """The protocol with its deployment parameters left as TMPL_* variables, for instantiate_protocol()."""
+    graph = BuildGraph(max_workers, manifest)
+    graph.add("vote_verify_lsig")
+    graph.add("voting_clear")
+    graph.add("main_clear")
+    graph.add(
+        "voting_approval",
+        params=lambda artifacts: {
+            "CONTRACT_VERSION": "TMPL_CONTRACT_VERSION",
+            "VOTE_VERIFY_LSIG_ADDRESS": "TMPL_VOTE_VERIFY_LSIG_ADDRESS",
+        }
+    )
+    # the clear program is the same for every deployment, so it stays baked in
+    graph.add(
+        "main_approval",
+        deps=["voting_clear"],
+        params=lambda artifacts: {
+            "TOKEN_ASSET_ID": "TMPL_TOKEN_ASSET_ID",
+            "CONTRACT_VERSION": "TMPL_CONTRACT_VERSION",
+            "VOTE_APPROVAL_PROGRAM": "TMPL_VOTE_APPROVAL_PROGRAM",
+            "VOTE_CLEAR_PROGRAM": artifacts["voting_clear"].program_b64,
+            "MINIMUM_STAKE": "TMPL_MINIMUM_STAKE",
+        }
+    )
+    return graph
+
+def build_protocol_templates(max_workers:int | None = None, incremental:bool = True):
+    manifest = None
+    if incremental:
+        from build_manifest import BuildManifest
+        manifest = BuildManifest(TEMPLATE_MANIFEST_PATH)
+    return protocol_template_graph(max_workers, manifest).run()
+
+def instantiate_protocol(templates:dict[str, BuildArtifact], token_asset_id:int, minimum_stake:int = 500):
+    """What build_protocol() returns, made by patching the templated build rather than compiling:
+    the lsig address goes into the voting program, which goes into the main program."""
+    main_abi_hash = get_ABI_hash(PROTOCOL_ASSETS_PATH + "/abi/main-contract.json")
+    artifacts = {name: templates[name] for name in ("vote_verify_lsig", "voting_clear", "main_clear")}
+    lsig_address = artifacts["vote_verify_lsig"].program_hash
+    artifacts["voting_approval"] = instantiate_artifact(
+        templates["voting_approval"],
+        {
+            "TMPL_CONTRACT_VERSION": main_abi_hash.encode(),
+            "TMPL_VOTE_VERIFY_LSIG_ADDRESS": decode_address(lsig_address),
+        },
+        {"CONTRACT_VERSION": main_abi_hash, "VOTE_VERIFY_LSIG_ADDRESS": lsig_address}
+    )
+    artifacts["main_approval"] = instantiate_artifact(
+        templates["main_approval"],
+        {
+            "TMPL_TOKEN_ASSET_ID": token_asset_id,
+            "TMPL_CONTRACT_VERSION": main_abi_hash.encode(),
+            "TMPL_VOTE_APPROVAL_PROGRAM": artifacts["voting_approval"].program,
+            "TMPL_MINIMUM_STAKE": minimum_stake,
+        },
+        {
+            "TOKEN_ASSET_ID": token_asset_id,
+            "CONTRACT_VERSION": main_abi_hash,
+            "VOTE_APPROVAL_PROGRAM": artifacts["voting_approval"].program_b64,
+            "VOTE_CLEAR_PROGRAM": artifacts["voting_clear"].program_b64,
+            "MINIMUM_STAKE": minimum_stake,
+        }
+    )
+    return artifacts
+
+def build_protocol(token_asset_id:int, minimum_stake:int = 500, max_workers:int | None = None, incremental:bool = True):
+    # GORACLE_TEMPLATED_BUILD: patch a build shared by every deployment instead of compiling for this one
+    if os.environ.get("GORACLE_TEMPLATED_BUILD"):
+        return instantiate_protocol(build_protocol_templates(max_workers, incremental), token_asset_id, minimum_stake)
+    # a running build_server.py has everything imported already
+    if os.environ.get("GORACLE_BUILD_SERVER"):
+        from build_server import request_protocol_build
+        return request_protocol_build(token_asset_id, minimum_stake)
+    manifest = None
+    if incremental:
+        from build_manifest import BuildManifest
+        manifest = BuildManifest()
+    return protocol_build_graph(token_asset_id, minimum_stake, max_workers, manifest).run()
+
+def write_error_maps(artifacts:dict[str, BuildArtifact], path:str = ERROR_MAP_PATH):
+    # what protocol/utils/smart_assert.py decodes compact SmartAssert failures with
+    error_maps = {name: artifact.error_map for name, artifact in artifacts.items() if artifact.error_map}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as error_map_file:
+        json.dump(error_maps, error_map_file, indent=4)
+    return path
@@ -0,0 +1,264 @@
+# Build manifest for incremental protocol builds: records, for each artifact, the hashes of the
+# contract modules and JSON assets it was generated from along with its build parameters, so a
+# later build only regenerates the artifacts whose inputs changed and whatever depends on them
+import os
+import ast
+import json
+import hashlib
+import argparse
+import importlib.metadata
+
+from build_graph import (
+    CONTRACTS,
+    MANIFEST_PATH,
+    PROTOCOL_ASSETS_PATH,
+    TEMPLATE_MANIFEST_PATH,
+    artifact_from_json,
+    artifact_to_json,
+    protocol_build_graph,
+    protocol_template_graph,
+)
+from utils import FAKE_ALGOD, protocol_filepath
+
+# environment the generated TEAL depends on besides the sources, recorded as is
+BUILD_ENV_VARS = (
+    "GORACLE_ABI_PATH",
+    "GORACLE_DISPATCH_MODE",
+    "GORACLE_DISPATCH_PROFILE",
+    "GORACLE_TEAL_OPTIMIZE",
+    "GORACLE_SMART_ASSERT",
+    "GORACLE_DEV_ALLOW_UPDATES",
+    "GORACLE_DEV_NO_TIME_LOCK",
+    "GORACLE_DEV_SC_LOG_LEVEL",
+)
+# any other GORACLE_* setting could be read by a contract too, so it is fingerprinted by hash (it
+# may be a credential), except for these and the settings named after them (GORACLE_FAKE_ALGOD_*),
+# which only change how a build or deployment runs
+ENV_PREFIX = "GORACLE_"
+RUNTIME_ENV_VARS = ("GORACLE_FAKE_ALGOD", "GORACLE_BUILD_SERVER", "GORACLE_TEAL_CACHE_DIR", "GORACLE_TEAL_CACHE_MAX_BYTES")
+# where `import x.y` can resolve to, after the importing file's own directory
+IMPORT_ROOTS = (PROTOCOL_ASSETS_PATH, protocol_filepath)
+DATA_SUFFIXES = (".json",)
+SKIPPED_DIRS = ("__pycache__", "node_modules", "test")
+
+# built by their own build.py scripts rather than the build graph, listed so `affected` covers them
+STANDALONE_CONTRACTS = {
+    "default_consumer": PROTOCOL_ASSETS_PATH + "/default_consumer/default_consumer.py",
+    "stake_delegator": PROTOCOL_ASSETS_PATH + "/stake_delegator/stake_delegator.py",
+    "vesting": PROTOCOL_ASSETS_PATH + "/vesting/vesting.py",
+}
+
+def contract_source(name:str):
+    if name in CONTRACTS:
+        return PROTOCOL_ASSETS_PATH + f"/{CONTRACTS[name][0]}.py"
+    return STANDALONE_CONTRACTS[name]
+
+def file_hash(path:str):
+    with open(path, "rb") as source_file:
+        return hashlib.sha256(source_file.read()).hexdigest()
+
+def data_file_index():
+    files = []
+    for root, dirs, file_names in os.walk(protocol_filepath):
+        dirs[:] = [d for d in dirs if d not in SKIPPED_DIRS and not d.startswith(".")]
+        files += [os.path.join(root, file_name) for file_name in file_names if file_name.endswith(DATA_SUFFIXES)]
+    return files
+
+def resolve_module(module_name:str, roots:list[str]):
+    parts = module_name.split(".")
+    for root in roots:
+        base = os.path.join(root, *parts)
+        for candidate in (base + ".py", os.path.join(base, "__init__.py")):
+            if os.path.isfile(candidate):
+                return os.path.abspath(candidate)
+    return None
+
+class DependencyScanner():
+    """Finds the local modules a contract source imports (transitively) and the JSON assets those
+    modules name, by reading the sources rather than importing them. Unresolved imports are
+    installed packages."""
+
+    def __init__(self):
+        self.data_files = data_file_index()
+        self.scanned: dict[str, tuple[list[str], list[str]]] = {}
+
+    def direct_deps(self, path:str):
+        if path in self.scanned:
+            return self.scanned[path]
+        with open(path) as source_file:
+            tree = ast.parse(source_file.read(), path)
+        directory = os.path.dirname(path)
+        modules, data = [], []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                candidates = [(alias.name, [directory, *IMPORT_ROOTS]) for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                if node.level:
+                    package_dir = directory
+                    for _ in range(node.level - 1):
+                        package_dir = os.path.dirname(package_dir)
+                    roots = [package_dir]
+                else:
+                    roots = [directory, *IMPORT_ROOTS]
+                prefix = node.module + "." if node.module else ""
+                # `from package import module` imports the module too
+                candidates = [(node.module, roots)] if node.module else []
+                candidates += [(prefix + alias.name, roots) for alias in node.names if alias.name != "*"]
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value.endswith(DATA_SUFFIXES):
+                data += self.data_file_matches(node.value)
+                continue
+            else:
+                continue
+            for module_name, roots in candidates:
+                module_path = resolve_module(module_name, roots)
+                if module_path is not None and module_path != os.path.abspath(path):
+                    modules.append(module_path)
+        self.scanned[path] = (modules, data)
+        return self.scanned[path]
+
+    def data_file_matches(self, name:str):
+        # paths in the sources are built from ABI_PATH, __file__ etc., so match on the trailing components
+        suffix = os.path.normpath(name).replace("\\", "/").lstrip("/")
+        while suffix.startswith("../"):
+            suffix = suffix[3:]
+        matches = [path for path in self.data_files if path.replace("\\", "/").endswith("/" + suffix)]
+        # the copies under examples/ and the like sit deeper than the protocol's own
+        shallowest = min((path.count(os.sep) for path in matches), default=0)
+        return [path for path in matches if path.count(os.sep) == shallowest]
+
+    def inputs(self, source_path:str):
+        seen, data, stack = set(), set(), [os.path.abspath(source_path)]
+        while stack:
+            path = stack.pop()
+            if path in seen:
+                continue
+            seen.add(path)
+            modules, data_files = self.direct_deps(path)
+            stack += modules
+            data.update(data_files)
+        return sorted(seen | data)
+
+def build_env():
+    env = {"pyteal": importlib.metadata.version("pyteal"), "fake_algod": FAKE_ALGOD}
+    for name in BUILD_ENV_VARS:
+        value = os.environ.get(name)
+        env[name] = value
+        # a profile or ABI file outside the tree is an input too
+        if value and os.path.isfile(value):
+            env[name + "_sha256"] = file_hash(value)
+    for name, value in os.environ.items():
+        if name.startswith(ENV_PREFIX) and name not in BUILD_ENV_VARS and not name.startswith(RUNTIME_ENV_VARS):
+            env[name + "_sha256"] = hashlib.sha256(value.encode()).hexdigest()
+    return env
+
+def fingerprint(inputs:dict, params:dict, env:dict):
+    return hashlib.sha256(json.dumps([inputs, params, env], sort_keys=True).encode()).hexdigest()
+
+class BuildManifest():
+    def __init__(self, path:str = MANIFEST_PATH):
+        self.path = path
+        try:
+            with open(path) as manifest_file:
+                self.entries = json.load(manifest_file)
+        except (OSError, ValueError):
+            self.entries = {}
+        self.scanner = DependencyScanner()
+        self.env = build_env()
+        self.pending: dict[str, dict] = {}
+        self.reused: list[str] = []
+        self.rebuilt: dict[str, list[str]] = {}
+
+    def inputs(self, name:str):
+        return {
+            os.path.relpath(path, protocol_filepath): file_hash(path)
+            for path in self.scanner.inputs(contract_source(name))
+        }
+
+    def changes(self, name:str, entry:dict | None):
+        # why an artifact has to be rebuilt, for the report
+        if entry is None:
+            return ["not built before"]
+        pending = self.pending[name]
+        changed = sorted(
+            path for path in entry["inputs"].keys() | pending["inputs"].keys()
+            if entry["inputs"].get(path) != pending["inputs"].get(path)
+        )
+        changed += sorted(f"param {key}" for key in entry["params"].keys() | pending["params"].keys() if entry["params"].get(key) != pending["params"].get(key))
+        changed += sorted(f"env {key}" for key in entry["env"].keys() | pending["env"].keys() if entry["env"].get(key) != pending["env"].get(key))
+        return changed
+
+    def lookup(self, name:str, params:dict):
+        inputs = self.inputs(name)
+        self.pending[name] = {
+            "fingerprint": fingerprint(inputs, params, self.env),
+            "inputs": inputs,
+            "params": params,
+            "env": self.env,
+        }
+        entry = self.entries.get(name)
+        if entry is not None and entry["fingerprint"] == self.pending[name]["fingerprint"]:
+            self.reused.append(name)
+            return artifact_from_json(entry["artifact"])
+        self.rebuilt[name] = self.changes(name, entry)
+        return None
+
+    def record(self, artifact):
+        self.entries[artifact.name] = dict(self.pending.pop(artifact.name), artifact=artifact_to_json(artifact))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as manifest_file:
+            json.dump(self.entries, manifest_file, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def report(self):
+        lines = [f"{name:<20} reused" for name in self.reused]
+        for name, changed in self.rebuilt.items():
+            lines.append(f"{name:<20} rebuilt: {', '.join(changed)}")
+        return "\n".join(lines)
+
+def affected_by(changed_paths:list[str]):
+    """The contracts (graph and standalone) whose inputs include any of the given files."""
+    scanner = DependencyScanner()
+    changed = {os.path.abspath(path) for path in changed_paths}
+    return [
+        name for name in list(CONTRACTS) + list(STANDALONE_CONTRACTS)
+        if changed & set(scanner.inputs(contract_source(name)))
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental protocol builds")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="build the protocol, reusing unchanged artifacts")
+    build_parser.add_argument("token_asset_id", type=int)
+    build_parser.add_argument("--minimum-stake", type=int, default=500)
+    build_parser.add_argument("--full", action="store_true", help="ignore the manifest and rebuild everything")
+    templates_parser = commands.add_parser("templates", help="build the protocol with TMPL_* variables for deploy-time patching")
+    templates_parser.add_argument("--full", action="store_true", help="ignore the template store and rebuild everything")
+    inputs_parser = commands.add_parser("inputs", help="list the files a contract is built from")
+    inputs_parser.add_argument("contract", choices=list(CONTRACTS) + list(STANDALONE_CONTRACTS))
+    affected_parser = commands.add_parser("affected", help="list the contracts a change to these files affects")
+    affected_parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        manifest = BuildManifest()
+        if args.full:
+            manifest.entries = {}
+        protocol_build_graph(args.token_asset_id, args.minimum_stake, manifest=manifest).run()
+        print(manifest.report())
+    elif args.command == "templates":
+        manifest = BuildManifest(TEMPLATE_MANIFEST_PATH)
+        if args.full:
+            manifest.entries = {}
+        templates = protocol_template_graph(manifest=manifest).run()
+        print(manifest.report())
+        for name, artifact in templates.items():
+            for variable, entry in artifact.templates.items():
+                print(f"{name:<20} {variable:<32} {entry['block']} constant {entry['index']} at byte {entry['offset']}")
+    elif args.command == "inputs":
+        for path in DependencyScanner().inputs(contract_source(args.contract)):
+            print(os.path.relpath(path, protocol_filepath))
+    else:
+        print("\n".join(affected_by(args.paths)) or "nothing")
@@ -0,0 +1,240 @@
+# Profile the contract build pipeline: wall time, CPU time and peak traced memory of every phase
+# (imports, pyteal AST construction, TEAL code generation, the post-compile stages, beaker's
+# app.build and the algod compile) for every contract. Writes the phases as JSON that also loads
+# as a Chrome/Perfetto trace, and as folded stacks for flamegraph.pl or speedscope.
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+sys.path.append(".")
+
+from build_graph import PROTOCOL_ASSETS_PATH, compile_artifact, generate_teal, protocol_build_graph, setup_contract_imports
+from utils import FAKE_ALGOD, compileTeal
+
+ARTIFACTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+PROTOCOL_CONTRACTS = ("vote_verify_lsig", "voting_clear", "main_clear", "voting_approval", "main_approval")
+# beaker apps built from their own modules; the last two still use the class based beaker 0.x API
+BEAKER_CONTRACTS = {
+    "default_app": lambda module: module.make_app(1),
+    "default_consumer": lambda module: module.app,
+    "stake_delegator": lambda module: module.StakeDelegator(version=8),
+    "vesting": lambda module: module.Vesting(8),
+}
+# each group is profiled in a fresh interpreter, so its imports are paid for where they happen
+GROUPS = {"protocol": PROTOCOL_CONTRACTS, **{name: (name,) for name in BEAKER_CONTRACTS}}
+
+@dataclass
+class PhaseRecord:
+    group: str
+    run: str
+    contract: str
+    phase: str
+    # epoch seconds, comparable across the group processes
+    start: float
+    wall_seconds: float
+    cpu_seconds: float
+    # peak traced allocations above what was allocated when the phase started
+    peak_bytes: int | None
+    error: str | None = None
+
+class Profiler():
+    def __init__(self, group:str, memory:bool = True):
+        self.group = group
+        self.run = "cold"
+        self.memory = memory
+        self.records: list[PhaseRecord] = []
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, contract:str, name:str):
+        error = None
+        traced = 0
+        if self.memory:
+            traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start, wall, cpu = time.time(), time.perf_counter(), time.process_time()
+        try:
+            yield
+        except Exception as exception:
+            error = f"{type(exception).__name__}: {exception}"
+            raise
+        finally:
+            self.records.append(PhaseRecord(
+                group=self.group,
+                run=self.run,
+                contract=contract,
+                phase=name,
+                start=start,
+                wall_seconds=time.perf_counter() - wall,
+                cpu_seconds=time.process_time() - cpu,
+                peak_bytes=tracemalloc.get_traced_memory()[1] - traced if self.memory else None,
+                error=error
+            ))
+
+    def contract_phases(self, contract:str):
+        # the `phase` hook build_graph.generate_teal and compile_artifact take
+        return lambda name: self.phase(contract, name)
+
+def profile_protocol(profiler:Profiler, token_asset_id:int):
+    setup_contract_imports()
+    if profiler.run == "cold":
+        with profiler.phase("setup", "import pyteal"):
+            import pyteal # noqa: F401
+        with profiler.phase("setup", "import gora_pyteal_utils"):
+            import utils.gora_pyteal_utils # noqa: F401
+
+    artifacts = {}
+    for name, node in protocol_build_graph(token_asset_id).nodes.items():
+        phases = profiler.contract_phases(name)
+        params = node.params(artifacts)
+        teal, teal_seconds = generate_teal(name, params, phases)
+        artifacts[name] = compile_artifact(name, teal, params, teal_seconds, phases)
+
+def profile_beaker_app(profiler:Profiler, name:str):
+    # default_app.py sets up its own imports; the standalone contracts need the protocol's utils
+    # package and their own abi_structures and key_map modules
+    if name != "default_app" and profiler.run == "cold":
+        setup_contract_imports()
+        sys.path.insert(0, PROTOCOL_ASSETS_PATH + f"/{name}")
+    if profiler.run == "cold":
+        with profiler.phase("setup", "import pyteal"):
+            import pyteal # noqa: F401
+        with profiler.phase("setup", "import beaker"):
+            import beaker # noqa: F401
+
+    with profiler.phase(name, "import"):
+        module = importlib.import_module(name)
+    with profiler.phase(name, "make_app"):
+        app = BEAKER_CONTRACTS[name](module)
+    # beaker builds the AST and generates the TEAL in one router compile
+    with profiler.phase(name, "build"):
+        app_spec = app.build()
+    with profiler.phase(name, "algod_compile"):
+        compileTeal(app_spec.approval_program)
+        compileTeal(app_spec.clear_program)
+
+def profile_group(group:str, token_asset_id:int, memory:bool, warm:bool):
+    """Runs in a fresh interpreter; returns the group's phase records as dicts."""
+    profiler = Profiler(group, memory)
+    for run in ("cold", "warm") if warm else ("cold",):
+        profiler.run = run
+        try:
+            if group == "protocol":
+                profile_protocol(profiler, token_asset_id)
+            else:
+                profile_beaker_app(profiler, group)
+        except Exception: # pylint: disable=broad-except
+            # recorded on the phase that failed; the other groups still get profiled
+            break
+    return [asdict(record) for record in profiler.records]
+
+def run_groups(groups:list[str], token_asset_id:int, memory:bool = True, warm:bool = False):
+    records = []
+    for group in groups:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            records += [PhaseRecord(**record) for record in pool.submit(profile_group, group, token_asset_id, memory, warm).result()]
+    return records
+
+def totals(records:list[PhaseRecord], key):
+    summed = {}
+    for record in records:
+        entry = summed.setdefault(key(record), {"wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_bytes": None, "errors": []})
+        entry["wall_seconds"] += record.wall_seconds
+        entry["cpu_seconds"] += record.cpu_seconds
+        if record.peak_bytes is not None:
+            entry["peak_bytes"] = max(entry["peak_bytes"] or 0, record.peak_bytes)
+        if record.error:
+            entry["errors"].append(f"{record.phase}: {record.error}")
+    return dict(sorted(summed.items(), key=lambda item: -item[1]["wall_seconds"]))
+
+def trace_events(records:list[PhaseRecord]):
+    groups = list(dict.fromkeys(record.group for record in records))
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": group}} for pid, group in enumerate(groups)]
+    for record in records:
+        events.append({
+            "name": f"{record.contract} {record.phase}",
+            "cat": record.run,
+            "ph": "X",
+            "ts": record.start * 1e6,
+            "dur": record.wall_seconds * 1e6,
+            "pid": groups.index(record.group),
+            "tid": 0,
+            "args": {
+                "cpu_ms": round(record.cpu_seconds * 1e3, 3),
+                "peak_kib": None if record.peak_bytes is None else round(record.peak_bytes / 1024, 1),
+                "error": record.error,
+            },
+        })
+    return events
+
+def profile_json(records:list[PhaseRecord], memory:bool):
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "fake_algod": FAKE_ALGOD,
+            "tracemalloc": memory,
+            "env": {name: os.environ.get(name) for name in ("GORACLE_DISPATCH_MODE", "GORACLE_TEAL_OPTIMIZE", "GORACLE_SMART_ASSERT")},
+        },
+        "phases": [asdict(record) for record in records],
+        "by_contract": totals(records, lambda record: f"{record.run} {record.contract}"),
+        "by_phase": totals(records, lambda record: f"{record.run} {record.phase}"),
+        "traceEvents": trace_events(records),
+        "displayTimeUnit": "ms",
+    }
+
+def folded_stacks(records:list[PhaseRecord], metric:str = "wall"):
+    # flamegraph.pl wants integer sample counts: microseconds, or bytes for memory
+    lines = []
+    for record in records:
+        if metric == "wall":
+            value = record.wall_seconds * 1e6
+        elif metric == "cpu":
+            value = record.cpu_seconds * 1e6
+        else:
+            value = record.peak_bytes or 0
+        if int(value) > 0:
+            lines.append(f"{record.run};{record.group};{record.contract};{record.phase} {int(value)}")
+    return "\n".join(lines) + "\n"
+
+def format_profile(records:list[PhaseRecord]):
+    lines = [f"{'contract':<20} {'phase':<26} {'wall ms':>9} {'cpu ms':>9} {'peak KiB':>10}"]
+    for record in records:
+        peak = "" if record.peak_bytes is None else f"{record.peak_bytes / 1024:.0f}"
+        contract = f"setup ({record.group})" if record.contract == "setup" else record.contract
+        contract = contract if record.run == "cold" else f"{contract} (warm)"
+        lines.append(f"{contract:<20} {record.phase:<26} {record.wall_seconds * 1e3:>9.1f} {record.cpu_seconds * 1e3:>9.1f} {peak:>10}" + (f"  {record.error}" if record.error else ""))
+    lines += ["", "Wall time by phase, most first:"]
+    total = sum(record.wall_seconds for record in records) or 1
+    for phase, entry in totals(records, lambda record: f"{record.run} {record.phase}").items():
+        lines.append(f"  {phase:<32} {entry['wall_seconds'] * 1e3:>9.1f} ms {100 * entry['wall_seconds'] / total:>5.1f}%")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-phase build profile of every contract")
+    parser.add_argument("--token-asset-id", type=int, default=1, help="any id works, it only changes constants")
+    parser.add_argument("--group", action="append", choices=list(GROUPS), help="profile only these (default: all)")
+    parser.add_argument("--warm", action="store_true", help="build everything a second time in the same process, as build_server.py would")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc, which slows allocation heavy phases down")
+    parser.add_argument("--json", default=os.path.join(ARTIFACTS_PATH, "build_profile.json"))
+    parser.add_argument("--folded", default=os.path.join(ARTIFACTS_PATH, "build_profile.folded"))
+    parser.add_argument("--folded-metric", choices=("wall", "cpu", "memory"), default="wall")
+    args = parser.parse_args()
+
+    profile_records = run_groups(args.group or list(GROUPS), args.token_asset_id, not args.no_memory, args.warm)
+    print(format_profile(profile_records))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+    with open(args.json, "w") as json_file:
+        json.dump(profile_json(profile_records, not args.no_memory), json_file, indent=4)
+    with open(args.folded, "w") as folded_file:
+        folded_file.write(folded_stacks(profile_records, args.folded_metric))
+    print(f"\nProfile written to {args.json} (loads in chrome://tracing and Perfetto) and {args.folded}")
@@ -0,0 +1,204 @@
+# Long-lived build server for the protocol contracts: keeps pyteal, the ABI JSON and the contract
+# sources loaded, answers build requests over a local socket and drops what it has cached as soon
+# as a watched source changes. Set GORACLE_BUILD_SERVER to the socket path to have build_protocol()
+# go through a running server.
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import socketserver
+
+from build_graph import (
+    CONTRACTS,
+    PROTOCOL_ASSETS_PATH,
+    BuildArtifact,
+    artifact_from_json,
+    artifact_to_json,
+    compile_artifact,
+    generate_teal,
+    init_build_worker,
+    load_contract,
+    loaded_contracts,
+    protocol_build_graph,
+)
+from utils import protocol_filepath
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "gora_build_server.sock")
+# helpers/ lives under assets/
+WATCHED_DIRS = (PROTOCOL_ASSETS_PATH, protocol_filepath + "/utils")
+WATCHED_SUFFIXES = (".py", ".json", ".yaml")
+SKIPPED_DIRS = ("__pycache__", "node_modules", "test")
+
+def source_snapshot():
+    snapshot = {}
+    for watched_dir in WATCHED_DIRS:
+        for root, dirs, files in os.walk(watched_dir):
+            dirs[:] = [d for d in dirs if d not in SKIPPED_DIRS and not d.startswith(".")]
+            for file_name in files:
+                if file_name.endswith(WATCHED_SUFFIXES):
+                    path = os.path.join(root, file_name)
+                    try:
+                        snapshot[path] = os.stat(path).st_mtime_ns
+                    except OSError:
+                        pass
+    return snapshot
+
+def params_key(name:str, params:dict):
+    return name + json.dumps(params, sort_keys=True)
+
+class BuildServer():
+    def __init__(self, poll_seconds:float = 0.5):
+        self.poll_seconds = poll_seconds
+        self.lock = threading.Lock()
+        self.teal_cache: dict[str, tuple[str, float]] = {}
+        self.artifact_cache: dict[str, BuildArtifact] = {}
+        self.snapshot = source_snapshot()
+        self.changed: list[str] = []
+        self.generation = 0
+        self.builds = 0
+        self.stopped = threading.Event()
+
+        init_build_worker()
+        # the first contract load pays for the ABI JSON and pyteal's own setup
+        for module_name, _, _, _ in CONTRACTS.values():
+            load_contract(module_name)
+
+    def watch(self):
+        while not self.stopped.wait(self.poll_seconds):
+            snapshot = source_snapshot()
+            if snapshot != self.snapshot:
+                changed = sorted(path for path in snapshot.keys() | self.snapshot.keys() if snapshot.get(path) != self.snapshot.get(path))
+                with self.lock:
+                    self.changed += changed
+                self.snapshot = snapshot
+
+    def reload_sources(self):
+        # called with the lock held; the next build re-imports what changed
+        print(f"sources changed: {', '.join(os.path.relpath(path, protocol_filepath) for path in self.changed)}", flush=True)
+        self.changed = []
+        self.generation += 1
+        self.teal_cache.clear()
+        self.artifact_cache.clear()
+        loaded_contracts.clear()
+        watched = tuple(os.path.abspath(watched_dir) for watched_dir in WATCHED_DIRS)
+        for module_name, module in list(sys.modules.items()):
+            module_file = getattr(module, "__file__", None)
+            # protocol.utils.* is build_graph's own import of the same files, keep it bound
+            if module_file and os.path.abspath(module_file).startswith(watched) and not module_name.startswith("protocol."):
+                del sys.modules[module_name]
+        init_build_worker()
+
+    def cached_teal(self, name:str, params:dict):
+        key = params_key(name, params)
+        if key not in self.teal_cache:
+            self.teal_cache[key] = generate_teal(name, params)
+        return self.teal_cache[key]
+
+    def build(self, name:str, params:dict):
+        if name not in CONTRACTS:
+            raise KeyError(f"unknown contract {name}")
+        key = params_key(name, params)
+        if key not in self.artifact_cache:
+            teal, teal_seconds = self.cached_teal(name, params)
+            self.artifact_cache[key] = compile_artifact(name, teal, params, teal_seconds)
+            self.builds += 1
+        return self.artifact_cache[key]
+
+    def build_protocol(self, token_asset_id:int, minimum_stake:int = 500):
+        graph = protocol_build_graph(token_asset_id, minimum_stake)
+        artifacts = {}
+        for name, node in graph.nodes.items():
+            artifacts[name] = self.build(name, node.params(artifacts))
+        return artifacts
+
+    def handle(self, request:dict):
+        with self.lock:
+            if self.changed:
+                self.reload_sources()
+            op = request.get("op")
+            if op == "build":
+                return {"artifact": artifact_to_json(self.build(request["contract"], request.get("params", {})))}
+            if op == "build_protocol":
+                artifacts = self.build_protocol(request["token_asset_id"], request.get("minimum_stake", 500))
+                return {"artifacts": {name: artifact_to_json(artifact) for name, artifact in artifacts.items()}}
+            if op == "status":
+                return {"generation": self.generation, "builds": self.builds, "cached": len(self.artifact_cache), "watched_files": len(self.snapshot)}
+            if op == "stop":
+                self.stopped.set()
+                return {}
+            raise ValueError(f"unknown op {op}")
+
+class BuildRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            start = time.perf_counter()
+            try:
+                response = dict(self.server.build_server.handle(json.loads(line)), ok=True)
+            except Exception as error: # pylint: disable=broad-except
+                response = {"ok": False, "error": f"{type(error).__name__}: {error}"}
+            response["seconds"] = time.perf_counter() - start
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+def serve(socket_path:str = DEFAULT_SOCKET_PATH, poll_seconds:float = 0.5):
+    start = time.perf_counter()
+    build_server = BuildServer(poll_seconds)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, BuildRequestHandler) as server:
+        server.daemon_threads = True
+        server.build_server = build_server
+        threading.Thread(target=build_server.watch, daemon=True).start()
+        threading.Thread(target=lambda: (build_server.stopped.wait(), server.shutdown()), daemon=True).start()
+        print(f"build server ready on {socket_path} in {time.perf_counter() - start:.1f}s, watching {len(build_server.snapshot)} files", flush=True)
+        server.serve_forever()
+    os.remove(socket_path)
+
+# -- client --
+
+def send_request(request:dict, socket_path:str | None = None):
+    socket_path = socket_path or os.environ.get("GORACLE_BUILD_SERVER") or DEFAULT_SOCKET_PATH
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode() + b"\n")
+        response = json.loads(connection.makefile("rb").readline())
+    if not response["ok"]:
+        raise RuntimeError(f"build server: {response['error']}")
+    return response
+
+def request_build(contract:str, params:dict | None = None, socket_path:str | None = None):
+    response = send_request({"op": "build", "contract": contract, "params": params or {}}, socket_path)
+    return artifact_from_json(response["artifact"])
+
+def request_protocol_build(token_asset_id:int, minimum_stake:int = 500, socket_path:str | None = None):
+    response = send_request({"op": "build_protocol", "token_asset_id": token_asset_id, "minimum_stake": minimum_stake}, socket_path)
+    return {name: artifact_from_json(fields) for name, fields in response["artifacts"].items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm build server for the protocol contracts")
+    parser.add_argument("--socket", default=os.environ.get("GORACLE_BUILD_SERVER") or DEFAULT_SOCKET_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the server")
+    serve_parser.add_argument("--poll", type=float, default=0.5, help="seconds between source checks")
+    build_parser = commands.add_parser("build", help="print the TEAL of one contract")
+    build_parser.add_argument("contract", choices=list(CONTRACTS))
+    build_parser.add_argument("params", nargs="?", default="{}", help="approval_program() kwargs as JSON")
+    protocol_parser = commands.add_parser("protocol", help="build every contract and print their hashes")
+    protocol_parser.add_argument("token_asset_id", type=int)
+    commands.add_parser("status")
+    commands.add_parser("stop")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.socket, args.poll)
+    elif args.command == "build":
+        print(request_build(args.contract, json.loads(args.params), args.socket).teal, end="")
+    elif args.command == "protocol":
+        for name, artifact in request_protocol_build(args.token_asset_id, socket_path=args.socket).items():
+            print(f"{name:<20} {artifact.program_hash} {len(artifact.program):>6} bytes")
+    else:
+        print(json.dumps(send_request({"op": args.command}, args.socket), indent=4))
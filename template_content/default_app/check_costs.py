@@ -0,0 +1,89 @@
+# Build the protocol contracts and check their worst-case opcode cost and size against
+# protocol/assets/cost_budgets.json, so cost regressions fail before they reach a deployment
+import os
+import sys
+import json
+import argparse
+
+from algosdk.abi import Method
+
+sys.path.append(".")
+
+from build_graph import build_protocol, PROTOCOL_ASSETS_PATH
+from utils import ALGOD_CLIENT, is_fake_algod
+from protocol.utils.teal_cost import TealProgram, analyze_teal, check_budgets, format_report
+from protocol.utils.dispatch import compare_dispatch, format_comparison
+
+BUDGETS_PATH = PROTOCOL_ASSETS_PATH + "/cost_budgets.json"
+ABI_FILES = ("main-contract.json", "voting-contract.json")
+
+def abi_signatures():
+    # names the selectors of a jump-table router, which only carries their hashes
+    signatures = []
+    for abi_file in ABI_FILES:
+        with open(PROTOCOL_ASSETS_PATH + "/abi/" + abi_file) as contract_file:
+            signatures += [Method.undictify(method).get_signature() for method in json.load(contract_file)["methods"]]
+    return signatures
+
+def program_size(artifact, exact_sizes: bool):
+    if exact_sizes:
+        return len(artifact.program)
+    return sum(TealProgram(artifact.teal).section_sizes().values())
+
+def cost_reports(artifacts: dict, budgets: dict, exact_sizes: bool = True):
+    """Reports for every built program. Without `exact_sizes` the sizes are estimated from the
+    TEAL, for builds whose bytecode didn't come from a real algod."""
+    signatures = abi_signatures()
+    reports = {}
+    for name, artifact in artifacts.items():
+        program_budgets = budgets.get(name, {})
+        clear_name = program_budgets.get("clear_program")
+        reports[name] = analyze_teal(
+            artifact.teal,
+            name,
+            program_size=len(artifact.program) if exact_sizes else None,
+            clear_program_size=program_size(artifacts[clear_name], exact_sizes) if clear_name else None,
+            extra_pages=program_budgets.get("extra_pages", 0),
+            budget=program_budgets.get("budget", 700),
+            signatures=signatures
+        )
+    return reports
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--token-asset-id", type=int, default=1, help="any id works, it only changes constants")
+    parser.add_argument("--budgets", default=BUDGETS_PATH)
+    parser.add_argument("--json", help="also write the full reports to this file")
+    parser.add_argument("--compare-dispatch", action="store_true", help="also compare the Cond routers against match dispatch")
+    args = parser.parse_args()
+
+    if args.compare_dispatch:
+        # the comparison starts from pyteal's own router
+        os.environ["GORACLE_DISPATCH_MODE"] = "cond"
+
+    with open(args.budgets) as budgets_file:
+        all_budgets = json.load(budgets_file)
+    artifacts = build_protocol(args.token_asset_id)
+    # the stand-in's compile output is a placeholder, not the program, so its length means nothing
+    exact_sizes = not is_fake_algod(ALGOD_CLIENT)
+    if not exact_sizes:
+        print("Warning: compiled with the offline algod stand-in, sizes are estimated from the TEAL (~)\n")
+    reports = cost_reports(artifacts, all_budgets, exact_sizes)
+
+    violations = []
+    for report in reports.values():
+        print(format_report(report))
+        violations += check_budgets(report, all_budgets.get(report["name"], {}))
+
+    if args.compare_dispatch:
+        for name in ("main_approval", "voting_approval"):
+            print("\n" + format_comparison(compare_dispatch(artifacts[name].teal, name)))
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(reports, json_file, indent=4)
+
+    if violations:
+        print("\n".join(["", "Budget violations:"] + violations))
+        sys.exit(1)
+    print("\nAll programs within budget" + ("" if exact_sizes else " (sizes estimated, compile against algod to confirm)"))
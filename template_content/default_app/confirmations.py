@@ -0,0 +1,232 @@
+# One block follower that confirms every pending transaction, instead of one
+# pending_transaction_info polling loop per txid
+import time
+import base64
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import msgpack
+from algosdk import constants, encoding
+from algosdk.atomic_transaction_composer import (
+    ABIResult,
+    AtomicTransactionComposer,
+    AtomicTransactionComposerStatus,
+    AtomicTransactionResponse
+)
+from algosdk.error import AlgodHTTPError
+from algosdk.v2client.algod import AlgodClient
+
+logger = logging.getLogger(__name__)
+
+def sort_msgpack_dict(obj):
+    # canonical msgpack encoding (what txids are hashed over) has sorted keys all the way down
+    # and leaves out empty values
+    if isinstance(obj, dict):
+        return OrderedDict((key, sort_msgpack_dict(obj[key])) for key in sorted(obj) if obj[key])
+    if isinstance(obj, list):
+        return [sort_msgpack_dict(item) for item in obj]
+    return obj
+
+def get_block_txids(block: dict):
+    # blocks store txns without their genesis id/hash, so put them back before hashing
+    txids = []
+    for signed_txn in block.get("txns", []):
+        txn = dict(signed_txn["txn"])
+        if signed_txn.get("hgi"):
+            txn["gen"] = block["gen"]
+        txn["gh"] = block["gh"]
+        encoded_txn = msgpack.packb(sort_msgpack_dict(txn), use_bin_type=True)
+        txid = base64.b32encode(encoding.checksum(constants.txid_prefix + encoded_txn)).decode()
+        txids.append(txid.strip("="))
+    return txids
+
+def atc_response(atc: AtomicTransactionComposer, confirmed_round: int, method_infos: dict):
+    """The AtomicTransactionResponse `atc.execute` would return for a group confirmed in
+    `confirmed_round`, given each method call's pending info (or the error fetching it) by txid."""
+    atc.status = AtomicTransactionComposerStatus.COMMITTED
+    results = []
+    for method_index, method in atc.method_dict.items():
+        txid = atc.tx_ids[method_index]
+        txn_info = method_infos.get(txid)
+        if isinstance(txn_info, dict):
+            results.append(atc.parse_result(method, txid, txn_info))
+        else:
+            results.append(ABIResult(
+                tx_id=txid,
+                raw_value=bytes(),
+                return_value=None,
+                decode_error=txn_info,
+                tx_info={},
+                method=method
+            ))
+    return AtomicTransactionResponse(confirmed_round=confirmed_round, tx_ids=atc.tx_ids, results=results)
+
+class PendingTxn():
+    def __init__(self, txid: str, last_valid: int | None, callback, fetch_info: bool):
+        self.txid = txid
+        self.last_valid = last_valid
+        self.callback = callback
+        self.fetch_info = fetch_info
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+
+class ConfirmationService():
+    """Follows new blocks with `status_after_block` and resolves every watched txid found in them.
+
+    Each round costs one status call and one block fetch however many transactions are pending.
+    `watch` returns a Future that resolves to the txn's pending info (when `fetch_info` is set)
+    or to `{"txid", "confirmed-round"}`, and the per-txn submit to confirm latency is kept for `stats`.
+    """
+
+    def __init__(self, algod_client: AlgodClient, recent_rounds: int = 1000, max_failures: int = 10):
+        self.client = algod_client
+        self.recent_rounds = recent_rounds
+        # consecutive algod errors after which pending txns are failed rather than left waiting
+        self.max_failures = max_failures
+        self.round = None
+        self.pending: dict[str, PendingTxn] = {}
+        # txids from the last few blocks, so txns confirmed before they were watched still resolve
+        self.recent: OrderedDict[str, int] = OrderedDict()
+        self.latencies: list[float] = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            if self.round is None:
+                # rescan the current round too, in case a txn landed just before we started
+                self.round = self.client.status()["last-round"] - 1
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.follow_blocks, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def watch(self, txid: str, last_valid: int | None = None, callback=None, fetch_info: bool = True):
+        pending_txn = PendingTxn(txid, last_valid, callback, fetch_info)
+        with self.lock:
+            confirmed_round = self.recent.get(txid)
+            if confirmed_round is None:
+                self.pending[txid] = pending_txn
+        if confirmed_round is not None:
+            self.resolve(pending_txn, confirmed_round)
+        self.start()
+        return pending_txn.future
+
+    def wait(self, txid: str, wait_rounds: int = 4, last_valid: int | None = None):
+        if last_valid is None:
+            # like algosdk's wait_for_confirmation, give up wait_rounds rounds from now
+            self.start()
+            last_valid = self.round + 1 + wait_rounds
+        future = self.watch(txid, last_valid)
+        # allow generous wall-clock time per round; the block follower enforces last_valid
+        return future.result(timeout=max(wait_rounds, 1) * 10)
+
+    def resolve(self, pending_txn: PendingTxn, confirmed_round: int):
+        latency = time.monotonic() - pending_txn.submitted_at
+        with self.lock:
+            self.latencies.append(latency)
+
+        try:
+            if pending_txn.fetch_info:
+                result = self.client.pending_transaction_info(pending_txn.txid)
+            else:
+                result = {"txid": pending_txn.txid, "confirmed-round": confirmed_round}
+        except Exception as error:
+            pending_txn.future.set_exception(error)
+            return
+
+        result["confirmation-latency"] = latency
+        pending_txn.future.set_result(result)
+        if pending_txn.callback is not None:
+            pending_txn.callback(result)
+
+    def process_block(self, round_number: int):
+        raw_block = self.client.block_info(round_number, response_format="msgpack")
+        block = msgpack.unpackb(raw_block, raw=False, strict_map_key=False)["block"]
+
+        confirmed = []
+        expired = []
+        with self.lock:
+            for txid in get_block_txids(block):
+                self.recent[txid] = round_number
+                if txid in self.pending:
+                    confirmed.append(self.pending.pop(txid))
+            while len(self.recent) and next(iter(self.recent.values())) < round_number - self.recent_rounds:
+                self.recent.popitem(last=False)
+            for txid, pending_txn in list(self.pending.items()):
+                if pending_txn.last_valid is not None and pending_txn.last_valid <= round_number:
+                    expired.append(self.pending.pop(txid))
+
+        for pending_txn in confirmed:
+            self.resolve(pending_txn, round_number)
+        for pending_txn in expired:
+            pending_txn.future.set_exception(
+                TimeoutError(f"Transaction {pending_txn.txid} not confirmed by its last valid round {pending_txn.last_valid}")
+            )
+
+    def fail_pending(self, error: Exception):
+        with self.lock:
+            failed = list(self.pending.values())
+            self.pending.clear()
+        for pending_txn in failed:
+            pending_txn.future.set_exception(error)
+
+    def follow_blocks(self):
+        failures = 0
+        while not self.stop_event.is_set():
+            try:
+                last_round = self.client.status_after_block(self.round)["last-round"]
+                for round_number in range(self.round + 1, last_round + 1):
+                    self.process_block(round_number)
+                    self.round = round_number
+                failures = 0
+            except Exception as error:
+                # pick up from the last processed round, unless algod has been failing for a while
+                failures += 1
+                logger.warning("following blocks after round %s failed (%d in a row)", self.round, failures, exc_info=True)
+                if failures >= self.max_failures:
+                    self.fail_pending(RuntimeError(f"algod failed {failures} times in a row while following blocks: {error}"))
+                self.stop_event.wait(1)
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            pending = len(self.pending)
+        if not latencies:
+            return {"confirmed": 0, "pending": pending}
+        return {
+            "confirmed": len(latencies),
+            "pending": pending,
+            "mean": sum(latencies) / len(latencies),
+            "p50": latencies[len(latencies) // 2],
+            "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "max": latencies[-1],
+        }
+
+confirmation_services: dict[int, ConfirmationService] = {}
+
+def get_confirmation_service(algod_client: AlgodClient):
+    if id(algod_client) not in confirmation_services:
+        confirmation_services[id(algod_client)] = ConfirmationService(algod_client)
+    return confirmation_services[id(algod_client)]
+
+def execute_atc(algod_client: AlgodClient, atc: AtomicTransactionComposer, wait_rounds: int = 4):
+    """`atc.execute`, waiting on the client's ConfirmationService instead of polling."""
+    tx_ids = atc.submit(algod_client)
+    # a group confirms atomically, so the last txn stands in for all of them
+    txn_info = get_confirmation_service(algod_client).wait(tx_ids[-1], wait_rounds)
+    method_infos = {}
+    for method_index in atc.method_dict:
+        txid = tx_ids[method_index]
+        try:
+            method_infos[txid] = txn_info if txid == tx_ids[-1] else algod_client.pending_transaction_info(txid)
+        except AlgodHTTPError as error:
+            method_infos[txid] = error
+    return atc_response(atc, txn_info["confirmed-round"], method_infos)
@@ -0,0 +1,6 @@
+# the default app's modules import each other as top-level modules, and the protocol as protocol.*
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,188 @@
+# Record call traces of the protocol contracts on the offline AVM (protocol/utils/avm.py), for
+# checking that a rewritten build behaves like the original and for measuring per-method cost
+import base64
+import json
+import math
+import os
+import sys
+
+from algosdk import abi
+
+sys.path.append(".")
+
+from protocol.utils.avm import AVM, Ledger, Program, app_address, app_call, asset_transfer, itob, method_call, payment, sha512_256
+from abi_structures import response_body_type
+from gora_abi_client import MAIN_METHODS, VOTING_METHODS
+
+request_spec_type = abi.ABIType.from_string("((uint32,byte[],uint64)[],uint32,byte[])")
+destination_spec_type = abi.ABIType.from_string("(uint64,byte[])")
+destination_method_type = abi.ABIType.from_string("byte[]")
+UINT64_HALF = round((2**64 - 1) / 2)
+MAX_Z = 7
+# the time_lock init sets, votes are valid until it has passed from the request round
+TIME_LOCK = 10
+
+with open("protocol/assets/helpers/z_table.json") as z_table_file:
+    Z_TABLE = [int.from_bytes(base64.b64decode(entry), "big") for entry in json.load(z_table_file)]
+
+def protocol_ledger(artifacts: dict):
+    """A ledger that knows the built programs by their bytecode, so app creates can run them."""
+    ledger = Ledger()
+    programs = {}
+    for name, artifact in artifacts.items():
+        programs[name] = ledger.register_program(Program(artifact.teal, name), artifact.program)
+    return ledger, programs
+
+def vote_count(vrf_result: bytes, stake: int):
+    """The (vote_count, z_index) the voting contract accepts for a VRF result, like approxCDF in gora_utils.ts."""
+    q = int.from_bytes(vrf_result[:8], "big")
+    if q < UINT64_HALF:
+        z_index = max(index for index, entry in enumerate(Z_TABLE) if UINT64_HALF + (UINT64_HALF - q) >= entry)
+    else:
+        z_index = min(index for index, entry in enumerate(Z_TABLE) if q <= entry)
+    mean = stake // 1000
+    deviation = z_index * 100 // len(Z_TABLE) * MAX_Z * math.isqrt(mean * 999 // 1000) // 100
+    return (mean - deviation if q < UINT64_HALF else mean + deviation), z_index
+
+def vote_group(avm: AVM, artifacts: dict, main_app_id: int, voting_app_id: int, participation_account: bytes, primary_account: bytes, stake: int, requester: bytes, key: bytes, destination: tuple, response: bytes):
+    """The vote_verify logic sig call and the vote it authorizes, as a node sends them for a request."""
+    ledger = avm.ledger
+    key_hash = sha512_256(requester + key)
+    request_info = ledger.apps[main_app_id]["boxes"][key_hash]
+    request_id, request_round = request_info[:32], int.from_bytes(request_info[40:48], "big")
+    block_seed = ledger.block_seeds.get(request_round, sha512_256(b"seed" + itob(request_round)))
+    vrf_proof = os.urandom(80)
+    vrf_result = avm.vrf_verifier(block_seed, vrf_proof, participation_account)[0]
+    count, z_index = vote_count(vrf_result, stake)
+    previous_vote = ledger.apps[voting_app_id]["boxes"][primary_account]
+    lsig = artifacts["vote_verify_lsig"]
+    return [
+        app_call(
+            lsig.program_hash, main_app_id,
+            [MAIN_METHODS["claim_rewards_vote_verify"].get_selector(), vrf_result, vrf_proof, block_seed, itob(1), itob(2), itob(3), itob(1), key_hash, previous_vote, itob(4)],
+            accounts=[participation_account, primary_account, app_address(voting_app_id), previous_vote[96:128]],
+            applications=[voting_app_id],
+            lsig=(Program(lsig.teal, "vote_verify_lsig"), []),
+            Fee=0,
+        ),
+        method_call(
+            participation_account, voting_app_id, VOTING_METHODS["vote"],
+            [
+                vrf_result, vrf_proof, main_app_id, destination[0], destination_method_type.encode(destination[1]), requester, primary_account, 1,
+                response_body_type.encode([request_id, requester, response, b"trace", 0, 0]), count, z_index, None
+            ],
+            Lease=request_id, FirstValid=request_round + 1, LastValid=request_round + TIME_LOCK, Fee=2000
+        ),
+    ]
+
+def record_smoke_trace(artifacts: dict, token_asset_id: int, requests: int = 50, requesters: int = 4):
+    """Deploy the main contract, drive its user-facing methods and have the stakers vote a request
+    through the voting contract; failing calls are recorded too.
+
+    Returns the CallTrace and the main app id.
+    """
+    ledger, _ = protocol_ledger(artifacts)
+    avm = AVM(ledger)
+    owner = os.urandom(32)
+    users = [os.urandom(32) for _ in range(requesters)]
+    participation_accounts = [os.urandom(32) for _ in users]
+    ledger.fund(owner, 10**13)
+    ledger.create_asset(owner, asset_id=token_asset_id)
+    # the app a completed request is delivered to
+    destination_app_id = ledger.create_app(owner, Program("#pragma version 8\nint 1\nreturn\n", "destination"))
+    # the vote_verify logic sig sends its calls with a zero fee, but its account still needs the minimum balance
+    ledger.fund(artifacts["vote_verify_lsig"].program_hash, 10**6)
+    for user, participation_account in zip(users, participation_accounts):
+        ledger.fund(participation_account, 10**9)
+        ledger.fund(user, 10**12)
+        ledger.opt_in_asset(user, token_asset_id)
+        ledger.write(ledger.account(user)["assets"], token_asset_id, 10**14)
+    ledger.commit()
+
+    trace = avm.start_trace()
+    created = avm.execute_group([app_call(
+        owner, 0,
+        ApprovalProgram=artifacts["main_approval"].program,
+        ClearStateProgram=artifacts["main_clear"].program,
+        GlobalNumUint=64, GlobalNumByteSlice=64, LocalNumUint=16, LocalNumByteSlice=16, ExtraProgramPages=3
+    )])
+    main_app_id = created.calls[0].created_app_id
+    main_address = app_address(main_app_id)
+    avm.execute_group([payment(owner, main_address, 10**9)])
+    avm.execute_group([method_call(owner, main_app_id, MAIN_METHODS["init"], [token_asset_id, owner], Fee=3000)])
+    deployed = avm.execute_group([method_call(owner, main_app_id, MAIN_METHODS["deploy_voting_contract"], [], Fee=3000)])
+    voting_app_id = next(call.created_app_id for call in deployed.calls[0].inner if call.created_app_id)
+
+    for user, participation_account in zip(users, participation_accounts):
+        avm.execute_group([app_call(user, main_app_id, on_completion=1)])
+        avm.execute_group([
+            asset_transfer(user, main_address, token_asset_id, 10**13),
+            method_call(user, main_app_id, MAIN_METHODS["deposit_token"], [None, token_asset_id, user]),
+        ])
+        avm.execute_group([
+            payment(user, main_address, 10**10),
+            method_call(user, main_app_id, MAIN_METHODS["deposit_algo"], [None, user]),
+        ])
+        avm.execute_group([method_call(user, main_app_id, MAIN_METHODS["register_participation_account"], [participation_account])])
+        avm.execute_group([method_call(user, main_app_id, MAIN_METHODS["heartbeat"], [bytes(4), 1, 1])])
+        # box storage for the voter's proposal and history entries
+        avm.execute_group([
+            payment(participation_account, app_address(voting_app_id), 121_000),
+            method_call(participation_account, voting_app_id, VOTING_METHODS["register_voter"], [None, user, main_app_id]),
+        ])
+
+    # stake changes are time locked from the opt-in on, and requests from then on can be refunded
+    ledger.round += 11
+    for user in users:
+        avm.execute_group([
+            asset_transfer(user, main_address, token_asset_id, 10**9),
+            method_call(user, main_app_id, MAIN_METHODS["stake"], [None]),
+        ])
+
+    request_args = request_spec_type.encode([[[6, b"v2/crypto/prices", 60]], 3, b"trace"])
+    destination = destination_spec_type.encode([0, b""])
+    for number in range(requests):
+        user = users[number % len(users)]
+        key = f"trace-{number}".encode()
+        avm.execute_group([method_call(user, main_app_id, MAIN_METHODS["request"], [request_args, destination, 1, key, [], [], [], []])])
+    # a repeated key is rejected
+    avm.execute_group([method_call(users[0], main_app_id, MAIN_METHODS["request"], [request_args, destination, 1, b"trace-0", [], [], [], []])])
+
+    # the stake a vote counts is the one from before the request round, so vote on later requests:
+    # the stakers vote the first until it passes the threshold and is delivered, a vote after that
+    # is rejected and the last staker starts the voting round of the second
+    selector = MAIN_METHODS["heartbeat"].get_selector()
+    vote_destination = destination_spec_type.encode([destination_app_id, selector])
+    for key, voters in [(b"trace-vote-0", len(users)), (b"trace-vote-1", 1)]:
+        ledger.round += 1
+        avm.execute_group([method_call(users[0], main_app_id, MAIN_METHODS["request"], [request_args, vote_destination, 1, key, [], [], [], []])])
+        ledger.round += 1
+        for user, participation_account in list(zip(users, participation_accounts))[-voters:]:
+            avm.execute_group(vote_group(
+                avm, artifacts, main_app_id, voting_app_id, participation_account, user, 10**9,
+                users[0], key, (destination_app_id, selector), b"trace-response"
+            ))
+
+    # votes from a finished voting round pay out their rewards, after which their proposal can go
+    for user, participation_account in zip(users, participation_accounts):
+        previous_vote = ledger.apps[voting_app_id]["boxes"][user]
+        avm.execute_group([
+            method_call(user, main_app_id, MAIN_METHODS["claim_rewards"], [user, previous_vote, previous_vote[96:128], voting_app_id]),
+            method_call(user, voting_app_id, VOTING_METHODS["reset_previous_vote"], [user, user, main_app_id]),
+        ])
+        avm.execute_group([method_call(participation_account, voting_app_id, VOTING_METHODS["delete_box"], [previous_vote[32:64]])])
+
+    # requests nobody voted on are refundable once the time lock has passed
+    ledger.round += 11
+    for number, user in enumerate(users[:requests]):
+        key_hash = sha512_256(user + f"trace-{number}".encode())
+        avm.execute_group([method_call(user, main_app_id, MAIN_METHODS["refund_request"], [user, key_hash])])
+
+    for user, participation_account in zip(users, participation_accounts):
+        avm.execute_group([method_call(participation_account, voting_app_id, VOTING_METHODS["deregister_voter"], [user, main_app_id], Fee=2000)])
+        avm.execute_group([method_call(user, main_app_id, MAIN_METHODS["withdraw_algo"], [10**6], Fee=2000)])
+        avm.execute_group([method_call(user, main_app_id, MAIN_METHODS["withdraw_token"], [10**6, token_asset_id], Fee=2000)])
+        avm.execute_group([method_call(user, main_app_id, MAIN_METHODS["unstake"], [10**6, token_asset_id], Fee=2000)])
+        avm.execute_group([method_call(user, main_app_id, MAIN_METHODS["unregister_participation_account"], [])])
+    avm.trace = None
+    return trace, main_app_id
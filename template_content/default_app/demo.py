@@ -7,7 +7,6 @@ import base64
 import json
 from pathlib import Path
 from algosdk import atomic_transaction_composer as atc, abi,encoding
-from algosdk.transaction import LogicSigAccount
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -23,108 +22,88 @@ import default_app
 from utils import *
 from abi_structures import response_body_type
 from build import build
+from build_graph import write_error_maps
+from deploy_diff import DeployDiff
+from deploy_orchestrator import payment, protocol_deploy_plan
+from algokit_utils.application_client import substitute_template_and_compile
 
 app = default_app.app
 
-def demo() -> None:
-    with open(default_app_path + "/feed_examples.json") as f:
-        feed_examples = json.load(f)
-    feed_type = "defi"
-    feed_example = feed_examples[feed_type]
-    feed_result_bytes = convert_feed_result_json(feed_example)
-
-    # cli: algokit localnet start
-    subprocess.run(["algokit","localnet","reset"])
-    subprocess.run(["algokit","localnet","start"])
-
-    # import algod with localnet params
-    client = ALGOD_CLIENT
-
-    # get suggested params
-    suggested_params = client.suggested_params()
-
-    # fund owner account
-    owner = generate_account()
-    fund_account(owner.address,1_000_000_000_000)
-
-    # deploy test Gora token
-    asset_id = deploy_token(owner)
-
-    # compile the vote_verify_lsig
-    vote_verify_lsig_out = subprocess.run(["python", protocol_filepath + "/assets/vote_verify_lsig.py", ""],capture_output=True)
-    vote_verify_lsig_compiled = compileTeal(vote_verify_lsig_out.stdout)
-    vote_verify_lsig_bytes = base64.b64decode(vote_verify_lsig_compiled["result"])
-    vote_verify_lsig_acct = LogicSigAccount(vote_verify_lsig_bytes)
-
-    # fund the lsig
-    fund_account(vote_verify_lsig_acct.address(),1_000_000_000)
-
-    # get hash of main contract's abi
-    main_abi_hash = get_ABI_hash(protocol_filepath+"/assets/abi/main-contract.json")
-
-    # compile vote contract
-    vote_approval_out = subprocess.run(["python", protocol_filepath + "/assets/voting_approval.py", f"{{CONTRACT_VERSION: {main_abi_hash}, VOTE_VERIFY_LSIG_ADDRESS: {vote_verify_lsig_acct.address()}}}"],capture_output=True)
-    vote_approval_out_compiled = compileTeal(vote_approval_out.stdout)
-    vote_approval_out_b64 = vote_approval_out_compiled["result"]
-    vote_clear_out = subprocess.run(["python", protocol_filepath + "/assets/voting_clear.py", ""],capture_output=True)
-    vote_clear_out_compiled = compileTeal(vote_clear_out.stdout)
-    vote_clear_out_b64 = vote_clear_out_compiled["result"]
-
-    # deploy main contract
-    main_approval_out = subprocess.run(
-        [
-            "python", protocol_filepath + "/assets/main_approval.py", 
-            f"{{\
-                TOKEN_ASSET_ID: {asset_id}, \
-                CONTRACT_VERSION: {main_abi_hash},\
-                VOTE_APPROVAL_PROGRAM: {vote_approval_out_b64},\
-                VOTE_CLEAR_PROGRAM: {vote_clear_out_b64},\
-                MINIMUM_STAKE: {500},\
-            }}"],
-            capture_output=True
-    )
-    main_approval_out_compiled = compileTeal(main_approval_out.stdout)
-    main_approval_out_bytes = base64.b64decode(main_approval_out_compiled["result"])
-    main_clear_out = subprocess.run(["python", protocol_filepath + "/assets/main_clear.py", ""],capture_output=True)
-    main_clear_out_compiled = compileTeal(main_clear_out.stdout)
-    main_clear_out_bytes = base64.b64decode(main_clear_out_compiled["result"])
-
-    main_app = Main_Contract(
-        client,
-        owner,
-        asset_id,
-        main_approval_out_bytes,
-        main_clear_out_bytes,
-        owner.address
+def add_default_app_steps(plan, data_box_cost:int):
+    """The default app's part of the bootstrap, on top of deploy_orchestrator.protocol_deploy_plan."""
+    def prepare_default_app(values):
+        # compile the app spec and teal files
+        build(values["main_app"].id,True)
+        values["default_app_client"] = algokit_utils.ApplicationClient(
+            algod_client=plan.client,
+            app_spec=Path(default_app_path + "/artifacts/application.json"),
+            signer=values["requester"],
+        )
+
+    def default_app_done(values, infos):
+        values["default_app_client"].app_id = infos[0]["application-index"]
+        values["default_app_address"] = values["default_app_client"].app_address
+
+    def compose_funding(composer, values):
+        # TODO: can't figure out why I need the extra 3200
+        payment("dispenser", values["default_app_address"], 100_000 + 3200 + 602_500 + data_box_cost)(composer, values)
+
+    def compose_opt_in_gora(composer, values):
+        values["default_app_client"].compose_call(
+            composer,
+            default_app.opt_in_gora,
+            transaction_parameters=algokit_utils.OnCompleteCallParameters(suggested_params=values["sp"]),
+            asset_reference=values["asset_id"],
+            main_app_reference=values["main_app"].id
+        )
+
+    def compose_deposits(composer, values):
+        main_app, owner = values["main_app"], values["owner"]
+        main_app.compose_deposit_algo(composer, owner, 100_000, values["default_app_address"], values["sp"])
+        main_app.compose_deposit_token(composer, owner, 7_000_000_000, values["default_app_address"], values["sp"])
+
+    plan.add(
+        "default_app",
+        lambda composer, values: values["default_app_client"].compose_create(
+            composer,
+            transaction_parameters=algokit_utils.CreateCallParameters(suggested_params=values["sp"])
+        ),
+        needs=["main_app"],
+        prepare=prepare_default_app,
+        done=default_app_done
     )
+    plan.add("default_app_funding", compose_funding, needs=["default_app"])
+    plan.add("opt_in_gora", compose_opt_in_gora, needs=["default_app", "main_init"], after=["default_app_funding"])
+    plan.add("deposits", compose_deposits, needs=["default_app", "main_init"], after=["opt_in_gora"])
+    return plan
 
-    #generate a requester and opt into Gora token
-    requester = generate_account()
-    fund_account(requester.address,1_000_000)
-    opt_in(token_id=asset_id,user=requester)
-
-    send_asa(owner,requester,asset_id,50_000_000_000)
-
-    fund_account(main_app.address, 202_000)
-    # fund_account(main_app_address, 2955000)
-
+def redeploy_default_app(deployment, client, owner, requester, asset_id, main_app, data_box_cost:int):
     # compile the app spec and teal files
-    default_app_client = None
     app_spec_path_str = default_app_path + "/artifacts/application.json"
     app_spec_path = Path(app_spec_path_str)
     build(main_app.id,True)
 
     default_app_client = algokit_utils.ApplicationClient(
-        algod_client=ALGOD_CLIENT,
+        algod_client=client,
         app_spec=app_spec_path,
         signer=requester,
     )
 
+    # an unchanged default app has been created, funded and opted in already
+    approval, clear = substitute_template_and_compile(client, default_app_client.app_spec, {})
+    default_app_status, default_app_id = deployment.app_status(
+        "default_app_id",
+        requester.address,
+        (approval.binary_hash, clear.binary_hash)
+    )
+    if default_app_status == "current":
+        default_app_client.app_id = default_app_id
+        print(f"Reusing app {default_app_id}")
+        return default_app_client
+
     # Deploy the app on-chain
     create_response = default_app_client.create()
-    default_app_id = default_app_client.app_id
     default_app_address = default_app_client.app_address
-    fund_account(default_app_address, 100_000+3200) # TODO: can't figure out why I need the extra 3200
     print(
         f"""
             Deployed app in txid {create_response.tx_id}
@@ -133,17 +112,12 @@ def demo() -> None:
         """
     )
 
-    # Create a data box
-    data_box_name = bytes(feed_type,"utf-8")
-
-    # we add 8 to account for the abi array length indicator at the beginning
-    print(len(feed_result_bytes))
-    data_box_cost = (len(data_box_name) + len(feed_result_bytes) + 8) * 400 + 2500
-    
-    signer = atc.AccountTransactionSigner(owner.private_key)
-
-    # Set up app to make requests
-    fund_account(default_app_address, 602_500 + data_box_cost)
+    # Fund the main app and set up the default app to make requests, in one batch
+    fund_many([
+        (main_app.address, 202_000),
+        (default_app_address, 100_000+3200), # TODO: can't figure out why I need the extra 3200
+        (default_app_address, 602_500 + data_box_cost)
+    ])
 
     default_app_client.call(
         default_app.opt_in_gora,
@@ -153,6 +127,57 @@ def demo() -> None:
 
     main_app.deposit_algo(owner,100_000,default_app_address)
     main_app.deposit_token(owner,7_000_000_000,default_app_address)
+    deployment.record_app("default_app_id", default_app_client.app_id)
+    return default_app_client
+
+def demo(deploy_diff:bool = False) -> None:
+    with open(default_app_path + "/feed_examples.json") as f:
+        feed_examples = json.load(f)
+    feed_type = "defi"
+    feed_example = feed_examples[feed_type]
+    feed_result_bytes = convert_feed_result_json(feed_example)
+
+    # Create a data box
+    data_box_name = bytes(feed_type,"utf-8")
+
+    # we add 8 to account for the abi array length indicator at the beginning
+    print(len(feed_result_bytes))
+    data_box_cost = (len(data_box_name) + len(feed_result_bytes) + 8) * 400 + 2500
+
+    if deploy_diff:
+        # keep the localnet, and whatever of the protocol on it still matches the local build
+        subprocess.run(["algokit","localnet","start"])
+    else:
+        # cli: algokit localnet start
+        subprocess.run(["algokit","localnet","reset"])
+        subprocess.run(["algokit","localnet","start"])
+
+    # import algod with localnet params
+    client = ALGOD_CLIENT
+
+    # get suggested params
+    suggested_params = client.suggested_params()
+
+    if deploy_diff:
+        deployment = DeployDiff(client)
+        owner, requester, asset_id, main_app, protocol_artifacts = deployment.deploy()
+        print(deployment.summary())
+        default_app_client = redeploy_default_app(deployment, client, owner, requester, asset_id, main_app, data_box_cost)
+    else:
+        # the whole bootstrap as waves of atomic groups, see deploy_orchestrator.py
+        plan = add_default_app_steps(protocol_deploy_plan(client), data_box_cost)
+        deployed = plan.run()
+        print(plan.report())
+        owner, requester, asset_id, main_app = deployed["owner"], deployed["requester"], deployed["asset_id"], deployed["main_app"]
+        protocol_artifacts = deployed["artifacts"]
+        default_app_client = deployed["default_app_client"]
+
+    if any(artifact.error_map for artifact in protocol_artifacts.values()):
+        print(f"SmartAssert error map written to {write_error_maps(protocol_artifacts)}")
+
+    default_app_id = default_app_client.app_id
+    default_app_address = default_app_client.app_address
+    signer = atc.AccountTransactionSigner(owner.private_key)
 
     # Form request inputs
     key = b"foo"
@@ -226,4 +251,5 @@ def demo() -> None:
     subprocess.run(["algokit", "localnet", "explore"])
 
 if __name__ == "__main__":
-    demo()
+    # --deploy-diff: keep the localnet and only redeploy what changed since the last run
+    demo(deploy_diff="--deploy-diff" in sys.argv[1:])
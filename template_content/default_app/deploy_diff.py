@@ -0,0 +1,184 @@
+# Idempotent protocol deployment: remembers what it deployed in artifacts/deployment.json, checks
+# each of those against the chain and only creates, updates, funds or opts in what is missing or
+# out of date, so a redeploy after a contract change is an app update rather than a full bootstrap.
+# The state file holds the localnet owner and requester mnemonics, which is why artifacts/ is ignored.
+import os
+import json
+import base64
+
+from algosdk import mnemonic
+from algosdk.account import address_from_private_key
+from algosdk.error import AlgodHTTPError
+from algosdk.logic import address as program_address
+from algosdk.transaction import LogicSigAccount
+from algokit_utils import Account
+
+from build_graph import build_protocol
+from utils import (
+    ALGOD_CLIENT,
+    Main_Contract,
+    deploy_token,
+    fund_many,
+    generate_account,
+    get_suggested_params,
+    opt_in,
+    send_asa,
+)
+
+DEPLOYMENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "deployment.json")
+# what demo.py bootstraps with
+OWNER_FUNDING = 1_000_000_000_000
+LSIG_FUNDING = 1_000_000_000
+MAIN_APP_FUNDING = 2_955_000
+REQUESTER_FUNDING = 1_000_000
+REQUESTER_TOKENS = 50_000_000_000
+
+def load_deployment(path:str = DEPLOYMENT_PATH):
+    try:
+        with open(path) as deployment_file:
+            return json.load(deployment_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_deployment(deployment:dict, path:str = DEPLOYMENT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as deployment_file:
+        json.dump(deployment, deployment_file, indent=4)
+
+def account_from_mnemonic(words:str):
+    private_key = mnemonic.to_private_key(words)
+    return Account(private_key=private_key, address=address_from_private_key(private_key))
+
+def app_program_hashes(client, app_id:int):
+    """Hashes (logic addresses) of an app's on-chain approval and clear programs, or None if it is gone."""
+    try:
+        params = client.application_info(app_id)["params"]
+    except AlgodHTTPError:
+        return None
+    return (
+        program_address(base64.b64decode(params["approval-program"])),
+        program_address(base64.b64decode(params["clear-state-program"])),
+    )
+
+class DeployDiff():
+    def __init__(self, client=None, path:str = DEPLOYMENT_PATH):
+        self.client = client or ALGOD_CLIENT
+        self.path = path
+        self.state = load_deployment(path)
+        # steps taken and skipped, for the summary
+        self.actions: list[str] = []
+
+        # a reset localnet has a new genesis, and nothing recorded for the old one exists anymore
+        genesis_hash = get_suggested_params(self.client).gh
+        if self.state.get("genesis_hash") != genesis_hash:
+            self.state = {"genesis_hash": genesis_hash}
+
+    def note(self, action:str):
+        self.actions.append(action)
+
+    def account_info(self, address:str):
+        return self.client.account_info(address)
+
+    def account(self, role:str, funding:int):
+        if role in self.state:
+            account = account_from_mnemonic(self.state[role])
+            if self.account_info(account.address)["amount"] > 0:
+                self.note(f"{role}: reusing {account.address}")
+                return account
+        account = generate_account()
+        fund_many([(account.address, funding)])
+        self.state[role] = mnemonic.from_private_key(account.private_key)
+        self.note(f"{role}: created and funded {account.address}")
+        return account
+
+    def token(self, owner:Account):
+        asset_id = self.state.get("token_asset_id")
+        created = [asset["index"] for asset in self.account_info(owner.address).get("created-assets", [])]
+        if asset_id in created:
+            self.note(f"token: reusing {asset_id}")
+            return asset_id
+        asset_id = deploy_token(owner)
+        self.state["token_asset_id"] = asset_id
+        self.note(f"token: created {asset_id}")
+        return asset_id
+
+    def top_up(self, role:str, address:str, amount:int):
+        balance = self.account_info(address)["amount"]
+        if balance >= amount:
+            self.note(f"{role}: funded already")
+            return
+        fund_many([(address, amount - balance)])
+        self.note(f"{role}: topped up by {amount - balance}")
+
+    def opted_in(self, account:Account, asset_id:int):
+        assets = self.account_info(account.address).get("assets", [])
+        if any(asset["asset-id"] == asset_id for asset in assets):
+            return False
+        opt_in(token_id=asset_id, user=account)
+        return True
+
+    def app_status(self, key:str, creator:str, program_hashes:tuple[str, str]):
+        """("missing" | "stale" | "current", app id) for the app recorded under `key`, by comparing
+        its on-chain program hashes with `program_hashes`."""
+        app_id = self.state.get(key)
+        created = [app["id"] for app in self.account_info(creator).get("created-apps", [])]
+        on_chain = app_program_hashes(self.client, app_id) if app_id in created else None
+        if on_chain is None:
+            return "missing", None
+        return ("current" if on_chain == tuple(program_hashes) else "stale"), app_id
+
+    def record_app(self, key:str, app_id:int):
+        self.state[key] = app_id
+        self.save()
+
+    def main_app(self, owner:Account, asset_id:int, artifacts:dict):
+        approval, clear = artifacts["main_approval"], artifacts["main_clear"]
+        status, app_id = self.app_status("main_app_id", owner.address, (approval.program_hash, clear.program_hash))
+
+        if status == "missing":
+            main_app = Main_Contract(self.client, owner, asset_id, approval.program, clear.program, owner.address)
+            self.state["main_app_id"] = main_app.id
+            self.note(f"main app: created {main_app.id}")
+            return main_app
+
+        main_app = Main_Contract(self.client, owner, asset_id, approval.program, clear.program, owner.address, app_id=app_id)
+        if status == "current":
+            self.note(f"main app: {app_id} is up to date")
+        else:
+            main_app._update(owner, approval.program, clear.program)
+            self.note(f"main app: updated {app_id}")
+        self.top_up("main app", main_app.address, MAIN_APP_FUNDING)
+        return main_app
+
+    def deploy(self, requester_tokens:int = REQUESTER_TOKENS):
+        """Bring the protocol on this network up to the local build. Returns the owner, the
+        requester, the token asset id, the main app and the build artifacts."""
+        owner = self.account("owner", OWNER_FUNDING)
+        requester = self.account("requester", REQUESTER_FUNDING)
+        asset_id = self.token(owner)
+
+        artifacts = build_protocol(asset_id)
+        lsig = LogicSigAccount(artifacts["vote_verify_lsig"].program)
+        self.top_up("vote verify lsig", lsig.address(), LSIG_FUNDING)
+
+        main_app = self.main_app(owner, asset_id, artifacts)
+
+        if self.opted_in(requester, asset_id):
+            send_asa(owner, requester, asset_id, requester_tokens)
+            self.note("requester: opted in to the token and funded")
+        else:
+            self.note("requester: opted in already")
+
+        self.save()
+        return owner, requester, asset_id, main_app, artifacts
+
+    def save(self):
+        save_deployment(self.state, self.path)
+
+    def summary(self):
+        return "\n".join(self.actions)
+
+if __name__ == "__main__":
+    deploy_diff = DeployDiff()
+    deploy_diff.deploy()
+    print(deploy_diff.summary())
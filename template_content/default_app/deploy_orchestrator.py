@@ -0,0 +1,317 @@
+# Deploy the protocol as a dependency graph of steps instead of a chain of blocking calls: every
+# step whose inputs are on chain goes out in the same wave, steps that only have to come after
+# one another share an atomic group, and each wave's groups are submitted together and confirmed
+# in the same round
+import copy
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Callable
+
+from algosdk.atomic_transaction_composer import AccountTransactionSigner, AtomicTransactionComposer, TransactionWithSigner
+from algosdk.logic import get_application_address
+from algosdk.transaction import AssetCreateTxn, AssetTransferTxn, LogicSigAccount, PaymentTxn
+
+from build_graph import build_protocol
+from utils import (
+    ALGOD_CLIENT,
+    MAX_GROUP_SIZE,
+    Main_Contract,
+    generate_account,
+    get_confirmation_service,
+    get_dispenser,
+    get_suggested_params,
+)
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class DeployStep:
+    name: str
+    # adds this step's transactions to the group it was packed into
+    compose: Callable[[AtomicTransactionComposer, dict], None]
+    # steps whose confirmed results (app and asset ids) this one uses: it goes out a wave later
+    needs: list[str] = field(default_factory=list)
+    # steps this one only has to follow: the same atomic group is enough
+    after: list[str] = field(default_factory=list)
+    # off-chain work once `needs` are confirmed, e.g. building programs that embed an app id
+    prepare: Callable[[dict], None] | None = None
+    # gets the pending transaction info of each of this step's transactions once confirmed
+    done: Callable[[dict, list[dict]], None] | None = None
+
+@dataclass
+class Wave:
+    steps: list[str]
+    groups: list[list[str]]
+    txns: int = 0
+    first_round: int = 0
+    last_round: int = 0
+    prepare_seconds: float = 0.0
+    seconds: float = 0.0
+
+class DeployPlan():
+    def __init__(self, client=None, wait_rounds:int = 4):
+        self.client = client or ALGOD_CLIENT
+        self.wait_rounds = wait_rounds
+        self.steps: dict[str, DeployStep] = {}
+        # shared by every step's callbacks: accounts, ids, artifacts, clients
+        self.values: dict = {}
+        self.waves: list[Wave] = []
+
+    def add(self, name:str, compose:Callable, needs:list[str] | None = None, after:list[str] | None = None, prepare:Callable | None = None, done:Callable | None = None):
+        for dep in (needs or []) + (after or []):
+            if dep not in self.steps:
+                raise KeyError(f"{name} depends on {dep} which has not been added")
+        self.steps[name] = DeployStep(name, compose, needs or [], after or [], prepare, done)
+        return self.steps[name]
+
+    def next_wave(self, confirmed:set[str]):
+        # everything whose needs are confirmed, minus what follows a step that can't go out yet
+        ready = [name for name, step in self.steps.items() if name not in confirmed and all(dep in confirmed for dep in step.needs)]
+        changed = True
+        while changed:
+            changed = False
+            for name in list(ready):
+                if any(dep not in confirmed and dep not in ready for dep in self.steps[name].after):
+                    ready.remove(name)
+                    changed = True
+        return ready
+
+    def pack(self, wave:list[str], sizes:dict[str, int]):
+        """Atomic groups for a wave: steps joined by `after` edges stay in one group, in step order,
+        and unrelated steps are packed together up to the group size limit."""
+        component = {name: name for name in wave}
+        def root(name):
+            while component[name] != name:
+                name = component[name]
+            return name
+        for name in wave:
+            for dep in self.steps[name].after:
+                if dep in component:
+                    component[root(name)] = root(dep)
+
+        components: dict[str, list[str]] = {}
+        for name in wave:
+            components.setdefault(root(name), []).append(name)
+
+        groups, group, group_size = [], [], 0
+        for members in components.values():
+            size = sum(sizes[name] for name in members)
+            if size > MAX_GROUP_SIZE:
+                raise RuntimeError(f"steps {members} have to share a group but need {size} transactions")
+            if group_size + size > MAX_GROUP_SIZE:
+                groups.append(group)
+                group, group_size = [], 0
+            group += members
+            group_size += size
+        if group:
+            groups.append(group)
+        return groups
+
+    def compose_group(self, names:list[str]):
+        atc = AtomicTransactionComposer()
+        ranges = {}
+        for name in names:
+            start = atc.get_tx_count()
+            self.steps[name].compose(atc, self.values)
+            ranges[name] = (start, atc.get_tx_count())
+        return atc, ranges
+
+    def run(self):
+        confirmation_service = get_confirmation_service(self.client)
+        confirmation_service.start()
+        confirmed: set[str] = set()
+
+        while len(confirmed) < len(self.steps):
+            wave_start = time.perf_counter()
+            names = self.next_wave(confirmed)
+            if not names:
+                raise RuntimeError(f"deploy plan has unresolved deps: {[name for name in self.steps if name not in confirmed]}")
+
+            for name in names:
+                if self.steps[name].prepare:
+                    self.steps[name].prepare(self.values)
+            prepare_seconds = time.perf_counter() - wave_start
+
+            # one suggested params per wave, valid for long enough to confirm every group in it
+            self.values["sp"] = get_suggested_params(self.client, validity_rounds=self.wait_rounds + 10)
+            sizes = {name: self.compose_group([name])[0].get_tx_count() for name in names}
+            groups = self.pack(names, sizes)
+
+            # submit every group before waiting on any of them
+            submitted, confirmed_groups = [], []
+            first_round = self.client.status()["last-round"]
+            infos = {}
+            try:
+                for group in groups:
+                    atc, ranges = self.compose_group(group)
+                    signed_txns = atc.gather_signatures()
+                    self.client.send_transactions(signed_txns)
+                    txids = [signed_txn.get_txid() for signed_txn in signed_txns]
+                    futures = [confirmation_service.watch(txid, last_valid=self.values["sp"].last) for txid in txids]
+                    submitted.append((group, ranges, futures))
+
+                for group, ranges, futures in submitted:
+                    results = [future.result(timeout=self.wait_rounds * 10) for future in futures]
+                    for name, (start, end) in ranges.items():
+                        infos[name] = results[start:end]
+                    confirmed_groups.append(group)
+            except Exception:
+                self.report_failure(len(self.waves) + 1, confirmed, [group for group, _, _ in submitted], confirmed_groups, groups)
+                raise
+            last_round = max(info["confirmed-round"] for step_infos in infos.values() for info in step_infos)
+
+            for name in names:
+                if self.steps[name].done:
+                    self.steps[name].done(self.values, infos[name])
+                confirmed.add(name)
+            self.waves.append(Wave(
+                steps=names,
+                groups=groups,
+                txns=sum(sizes.values()),
+                first_round=first_round + 1,
+                last_round=last_round,
+                prepare_seconds=prepare_seconds,
+                seconds=time.perf_counter() - wave_start
+            ))
+        return self.values
+
+    def report_failure(self, wave:int, confirmed:set[str], submitted:list[list[str]], confirmed_groups:list[list[str]], groups:list[list[str]]):
+        # what is on chain already, so a failed deploy can be picked up by hand
+        pending = [group for group in submitted if group not in confirmed_groups]
+        unsent = [group for group in groups if group not in submitted]
+        logger.error(
+            "deploy failed in wave %d; confirmed steps: %s; confirmed groups in this wave: %s; submitted but unconfirmed: %s; not submitted: %s",
+            wave,
+            [name for name in self.steps if name in confirmed],
+            confirmed_groups,
+            pending,
+            unsent
+        )
+
+    def critical_path(self):
+        # the chain of deps that sets the number of waves, traced back from the last wave
+        wave_of = {name: number for number, wave in enumerate(self.waves) for name in wave.steps}
+        path = [self.waves[-1].steps[-1]] if self.waves else []
+        while path:
+            step = self.steps[path[-1]]
+            previous = [dep for dep in step.needs if wave_of[dep] == wave_of[step.name] - 1]
+            previous += [dep for dep in step.after if wave_of[dep] == wave_of[step.name] and dep not in path]
+            if not previous:
+                break
+            path.append(previous[0])
+        return list(reversed(path))
+
+    def report(self):
+        lines = []
+        for number, wave in enumerate(self.waves, start=1):
+            rounds = f"round {wave.first_round}" if wave.first_round >= wave.last_round else f"rounds {wave.first_round}-{wave.last_round}"
+            lines.append(f"wave {number}: {wave.txns} txns in {len(wave.groups)} groups, {rounds}, {wave.seconds:.2f}s ({wave.prepare_seconds:.2f}s preparing)")
+            for group in wave.groups:
+                lines.append(f"    [{', '.join(group)}]")
+        if self.waves:
+            lines.append(f"{len(self.waves)} waves, rounds {self.waves[0].first_round}-{self.waves[-1].last_round}, {sum(wave.seconds for wave in self.waves):.2f}s")
+            lines.append(f"critical path: {' -> '.join(self.critical_path())}")
+        return "\n".join(lines)
+
+def payment(sender, receiver:str, amount:int):
+    def compose(atc:AtomicTransactionComposer, values:dict):
+        account = values[sender] if isinstance(sender, str) else sender
+        atc.add_transaction(TransactionWithSigner(
+            PaymentTxn(sender=account.address, sp=values["sp"], receiver=values.get(receiver, receiver), amt=amount),
+            AccountTransactionSigner(account.private_key)
+        ))
+    return compose
+
+def protocol_deploy_plan(client=None, requester_tokens:int = 50_000_000_000, main_app_funding:int = 2_955_000 + 202_000):
+    """The protocol part of demo.py's bootstrap: accounts, token, lsig funding, main app, init and
+    the requester's tokens. demo.py adds the default app's steps on top."""
+    plan = DeployPlan(client)
+    values = plan.values
+    values["dispenser"] = get_dispenser(plan.client)
+    values["owner"] = generate_account()
+    values["requester"] = generate_account()
+
+    def compose_accounts(atc, values):
+        payment("dispenser", values["owner"].address, 1_000_000_000_000)(atc, values)
+        payment("dispenser", values["requester"].address, 1_000_000)(atc, values)
+
+    def compose_token(atc, values):
+        owner = values["owner"]
+        atc.add_transaction(TransactionWithSigner(
+            AssetCreateTxn(
+                sender=owner.address,
+                sp=values["sp"],
+                total=10**16,
+                default_frozen=False,
+                unit_name="GORA",
+                asset_name="GORA",
+                url="goracle.io",
+                decimals=6
+            ),
+            AccountTransactionSigner(owner.private_key)
+        ))
+
+    def token_done(values, infos):
+        values["asset_id"] = infos[0]["asset-index"]
+
+    def build_programs(values):
+        if "artifacts" not in values:
+            values["artifacts"] = build_protocol(values["asset_id"])
+            values["lsig_address"] = LogicSigAccount(values["artifacts"]["vote_verify_lsig"].program).address()
+
+    def compose_main_app(atc, values):
+        owner, artifacts = values["owner"], values["artifacts"]
+        atc.add_transaction(TransactionWithSigner(
+            Main_Contract.create_txn(owner, artifacts["main_approval"].program, artifacts["main_clear"].program, values["sp"]),
+            AccountTransactionSigner(owner.private_key)
+        ))
+
+    def main_app_done(values, infos):
+        owner, artifacts = values["owner"], values["artifacts"]
+        values["main_app"] = Main_Contract(
+            plan.client,
+            owner,
+            values["asset_id"],
+            artifacts["main_approval"].program,
+            artifacts["main_clear"].program,
+            owner.address,
+            app_id=infos[0]["application-index"]
+        )
+        values["main_address"] = get_application_address(values["main_app"].id)
+
+    def compose_opt_in(atc, values):
+        requester = values["requester"]
+        atc.add_transaction(TransactionWithSigner(
+            AssetTransferTxn(sender=requester.address, sp=values["sp"], receiver=requester.address, amt=0, index=values["asset_id"]),
+            AccountTransactionSigner(requester.private_key)
+        ))
+
+    def compose_requester_tokens(atc, values):
+        owner = values["owner"]
+        atc.add_transaction(TransactionWithSigner(
+            AssetTransferTxn(sender=owner.address, sp=values["sp"], receiver=values["requester"].address, amt=requester_tokens, index=values["asset_id"]),
+            AccountTransactionSigner(owner.private_key)
+        ))
+
+    def compose_init(atc, values):
+        # init opts the app into the token with an inner transaction, so it covers two fees
+        sp = copy.copy(values["sp"])
+        sp.fee, sp.flat_fee = 2000, True
+        values["main_app"].compose_init(atc, values["owner"], sp=sp)
+
+    plan.add("accounts", compose_accounts)
+    plan.add("token", compose_token, after=["accounts"], done=token_done)
+    # the lsig doesn't embed the token, but it is built together with the main app, which does
+    plan.add("lsig_funding", lambda atc, values: payment("dispenser", values["lsig_address"], 1_000_000_000)(atc, values), needs=["token"], prepare=build_programs)
+    plan.add("main_app", compose_main_app, needs=["token"], prepare=build_programs, done=main_app_done)
+    plan.add("requester_opt_in", compose_opt_in, needs=["token"], after=["accounts"])
+    plan.add("requester_tokens", compose_requester_tokens, needs=["token"], after=["requester_opt_in"])
+    plan.add("main_funding", lambda atc, values: payment("dispenser", values["main_address"], main_app_funding)(atc, values), needs=["main_app"])
+    plan.add("main_init", compose_init, needs=["main_app"], after=["main_funding"])
+    return plan
+
+if __name__ == "__main__":
+    deploy_plan = protocol_deploy_plan()
+    deploy_plan.run()
+    print(deploy_plan.report())
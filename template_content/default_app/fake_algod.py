@@ -0,0 +1,437 @@
+# In-process stand-in for the algod REST subset used by utils.py, async_utils.py and the
+# block follower, so client-side code can be run and benchmarked without a localnet
+import os
+import copy
+import time
+import base64
+import random
+import hashlib
+import threading
+
+import msgpack
+from algosdk import account, encoding
+from algosdk.error import AlgodHTTPError
+from algosdk.logic import get_application_address
+from algosdk.transaction import SuggestedParams
+from algokit_utils import Account
+
+FAKE_GENESIS_ID = "fakenet-v1"
+FAKE_GENESIS_HASH = base64.b64encode(hashlib.sha256(FAKE_GENESIS_ID.encode()).digest()).decode()
+FAKE_CONSENSUS_VERSION = "future"
+MIN_TXN_FEE = 1000
+MIN_BALANCE = 100_000
+
+def teal_lines(source: str):
+    from protocol.utils.teal_cost import split_teal_line
+    return [(line, split_teal_line(line)) for line in source.splitlines()]
+
+def assemble_header(source: str):
+    from protocol.utils.teal_cost import decode_byte_constant, parse_int_constant
+    from protocol.utils.template_patch import encode_header
+    version, ints, byte_constants = 1, [], []
+    for _, tokens in teal_lines(source):
+        if tokens[:2] == ["#pragma", "version"]:
+            version = int(tokens[2])
+        elif tokens and tokens[0] == "intcblock":
+            ints = [parse_int_constant(token) for token in tokens[1:]]
+        elif tokens and tokens[0] == "bytecblock":
+            byte_constants = [decode_byte_constant([token]) for token in tokens[1:]]
+    return encode_header(version, ints, byte_constants)
+
+def strip_constant_blocks(source: str):
+    # the code after the blocks doesn't depend on what is in them
+    return "\n".join(line for line, tokens in teal_lines(source) if not tokens or tokens[0] not in ("intcblock", "bytecblock"))
+
+def json_encodable(obj):
+    # algod's JSON responses carry byte fields as base64
+    if isinstance(obj, dict):
+        return {key: json_encodable(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [json_encodable(item) for item in obj]
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode()
+    return obj
+
+class FakeAlgodClient():
+    """Deterministic, in-memory algod.
+
+    With `round_time` 0 (the default) it behaves like a dev-mode localnet: every accepted
+    submission is committed in its own block straight away. With `round_time` > 0 a clock
+    thread commits everything pending once per `round_time` seconds, like a real network.
+    `latency` (plus up to `latency_jitter`, drawn from a seeded RNG) is slept on every call
+    to model the HTTP round trip.
+
+    Transactions are checked for validity window, fee and overspend and applied to a small
+    ledger of balances, ASA holdings, app opt-ins, global state and boxes. Programs are not
+    evaluated: app calls succeed unless `app_call_handler(client, signed_txn)` raises, and
+    boxes they reference are created empty when `create_referenced_boxes` is set.
+    """
+
+    def __init__(
+        self,
+        round_time: float = 0.0,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        start_round: int = 1,
+        max_block_txns: int = 25_000,
+        create_referenced_boxes: bool = True,
+        app_call_handler=None,
+        seed: int = 0
+    ):
+        self.round_time = round_time
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.max_block_txns = max_block_txns
+        self.create_referenced_boxes = create_referenced_boxes
+        self.app_call_handler = app_call_handler
+        self.random = random.Random(seed)
+
+        self.round = start_round
+        self.blocks: dict[int, list] = {start_round: []}
+        self.pending: list = []
+        self.txns: dict[str, dict] = {}
+        self.accounts: dict[str, dict] = {}
+        self.apps: dict[int, dict] = {}
+        self.assets: dict[int, dict] = {}
+        self.next_index = 1000
+        self.calls: dict[str, int] = {}
+
+        self.lock = threading.Condition()
+        self.stop_event = threading.Event()
+        self.clock = None
+
+        # a funded dispenser, picked up by utils.get_dispenser in place of the KMD lookup
+        private_key, address = account.generate_account()
+        self.dispenser = Account(private_key=private_key, address=address)
+        self.fund(address, 10**15)
+
+        if round_time > 0:
+            self.clock = threading.Thread(target=self.run_clock, daemon=True)
+            self.clock.start()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            round_time=float(os.environ.get("GORACLE_FAKE_ALGOD_ROUND_TIME", 0)),
+            latency=float(os.environ.get("GORACLE_FAKE_ALGOD_LATENCY", 0)),
+            latency_jitter=float(os.environ.get("GORACLE_FAKE_ALGOD_LATENCY_JITTER", 0)),
+            seed=int(os.environ.get("GORACLE_FAKE_ALGOD_SEED", 0))
+        )
+
+    # -- round clock --
+
+    def run_clock(self):
+        while not self.stop_event.wait(self.round_time):
+            self.advance()
+
+    def close(self):
+        self.stop_event.set()
+
+    def commit_block(self):
+        # caller holds the lock
+        block_txns = self.pending[:self.max_block_txns]
+        self.pending = self.pending[self.max_block_txns:]
+        self.round += 1
+        self.blocks[self.round] = block_txns
+        for signed_txn in block_txns:
+            self.txns[signed_txn.get_txid()]["confirmed-round"] = self.round
+        self.lock.notify_all()
+
+    def advance(self, rounds: int = 1):
+        with self.lock:
+            for _ in range(rounds):
+                self.commit_block()
+            return self.round
+
+    def simulate_latency(self, method_name: str):
+        self.calls[method_name] = self.calls.get(method_name, 0) + 1
+        delay = self.latency
+        if self.latency_jitter:
+            with self.lock:
+                delay += self.random.uniform(0, self.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    # -- ledger --
+
+    def fund(self, address: str, amount: int):
+        with self.lock:
+            self.get_account(self.accounts, address)["amount"] += amount
+
+    def get_account(self, accounts: dict, address: str):
+        if address not in accounts:
+            if address in self.accounts:
+                accounts[address] = copy.deepcopy(self.accounts[address])
+            else:
+                accounts[address] = {"amount": 0, "assets": {}, "apps": set()}
+        return accounts[address]
+
+    def reject(self, message: str):
+        raise AlgodHTTPError(f"TransactionPool.Remember: {message}", 400)
+
+    def apply_txn(self, accounts: dict, apps: dict, assets: dict, signed_txn):
+        txn = signed_txn.transaction
+        txid = signed_txn.get_txid()
+        if txid in self.txns:
+            self.reject(f"transaction already in ledger: {txid}")
+        if txn.genesis_hash != FAKE_GENESIS_HASH:
+            self.reject(f"txn {txid} has wrong genesis hash")
+        if not (txn.first_valid_round <= self.round + 1 <= txn.last_valid_round):
+            self.reject(f"txn dead: round {self.round + 1} outside of {txn.first_valid_round}--{txn.last_valid_round}")
+        if txn.fee < MIN_TXN_FEE and txn.group is None:
+            self.reject(f"txn {txid} fee {txn.fee} below threshold {MIN_TXN_FEE}")
+
+        sender = self.get_account(accounts, txn.sender)
+        spent = txn.fee
+        result = {}
+
+        if txn.type == "pay":
+            spent += txn.amt
+            self.get_account(accounts, txn.receiver)["amount"] += txn.amt
+        elif txn.type == "axfer":
+            if txn.amount == 0 and txn.sender == txn.receiver:
+                sender["assets"].setdefault(txn.index, 0)
+            else:
+                receiver = self.get_account(accounts, txn.receiver)
+                if txn.index not in receiver["assets"]:
+                    self.reject(f"receiver {txn.receiver} is not opted in to asset {txn.index}")
+                if sender["assets"].get(txn.index, 0) < txn.amount:
+                    self.reject(f"underflow on subtracting {txn.amount} from asset {txn.index} balance of {txn.sender}")
+                sender["assets"][txn.index] -= txn.amount
+                receiver["assets"][txn.index] += txn.amount
+        elif txn.type == "acfg" and not txn.index:
+            self.next_index += 1
+            assets[self.next_index] = {"creator": txn.sender, "total": int(txn.total), "decimals": txn.decimals}
+            sender["assets"][self.next_index] = int(txn.total)
+            result["asset-index"] = self.next_index
+        elif txn.type == "appl":
+            app_id = txn.index
+            if not app_id:
+                self.next_index += 1
+                app_id = self.next_index
+                apps[app_id] = {
+                    "creator": txn.sender,
+                    "approval-program": txn.approval_program,
+                    "clear-state-program": txn.clear_program,
+                    "global-state": {},
+                    "boxes": {},
+                }
+                result["application-index"] = app_id
+            elif app_id not in apps:
+                self.reject(f"application {app_id} does not exist")
+            elif txn.on_complete == 4:
+                # UpdateApplication; only the creator gets past CheckUpdateMode
+                if apps[app_id]["creator"] != txn.sender:
+                    self.reject(f"only the creator can update application {app_id}")
+                apps[app_id]["approval-program"] = txn.approval_program
+                apps[app_id]["clear-state-program"] = txn.clear_program
+            if txn.on_complete == 1:
+                sender["apps"].add(app_id)
+            if self.create_referenced_boxes:
+                for box in txn.boxes or []:
+                    box_app = txn.index if box.app_index == 0 else txn.foreign_apps[box.app_index - 1]
+                    if box_app in apps:
+                        apps[box_app]["boxes"].setdefault(box.name, b"")
+            if self.app_call_handler is not None:
+                result.update(self.app_call_handler(self, signed_txn) or {})
+
+        if sender["amount"] < spent:
+            self.reject(f"overspend (account {txn.sender}, data {{_struct:{{}} Status:Offline MicroAlgos:{{Raw:{sender['amount']}}}}}, tried to spend {{{spent}}})")
+        sender["amount"] -= spent
+        return result
+
+    def submit(self, signed_txns: list):
+        with self.lock:
+            # apply the group to copies so a failing txn leaves the ledger untouched
+            accounts = {}
+            apps = copy.deepcopy(self.apps)
+            assets = dict(self.assets)
+            next_index = self.next_index
+
+            try:
+                results = [self.apply_txn(accounts, apps, assets, signed_txn) for signed_txn in signed_txns]
+            except AlgodHTTPError:
+                self.next_index = next_index
+                raise
+
+            self.accounts.update(accounts)
+            self.apps = apps
+            self.assets = assets
+            for signed_txn, result in zip(signed_txns, results):
+                self.txns[signed_txn.get_txid()] = dict(result, txn=signed_txn, **{"confirmed-round": 0})
+                self.pending.append(signed_txn)
+
+            if self.round_time <= 0:
+                self.commit_block()
+        return signed_txns[0].get_txid()
+
+    # -- algod REST subset --
+
+    def status(self):
+        self.simulate_latency("status")
+        with self.lock:
+            return {
+                "last-round": self.round,
+                "last-version": FAKE_CONSENSUS_VERSION,
+                "time-since-last-round": 0,
+                "catchup-time": 0,
+            }
+
+    def status_after_block(self, block_num: int):
+        self.simulate_latency("status_after_block")
+        with self.lock:
+            # algod gives up after about a minute and returns the current status
+            self.lock.wait_for(lambda: self.round > block_num or self.stop_event.is_set(), timeout=60)
+            return {
+                "last-round": self.round,
+                "last-version": FAKE_CONSENSUS_VERSION,
+                "time-since-last-round": 0,
+                "catchup-time": 0,
+            }
+
+    def suggested_params(self):
+        self.simulate_latency("suggested_params")
+        with self.lock:
+            return SuggestedParams(
+                fee=0,
+                first=self.round,
+                last=self.round + 1000,
+                gh=FAKE_GENESIS_HASH,
+                gen=FAKE_GENESIS_ID,
+                flat_fee=False,
+                consensus_version=FAKE_CONSENSUS_VERSION,
+                min_fee=MIN_TXN_FEE
+            )
+
+    def send_transaction(self, txn, **kwargs):
+        self.simulate_latency("send_transaction")
+        return self.submit([txn])
+
+    def send_transactions(self, txns, **kwargs):
+        self.simulate_latency("send_transactions")
+        return self.submit(list(txns))
+
+    def pending_transaction_info(self, transaction_id: str, **kwargs):
+        self.simulate_latency("pending_transaction_info")
+        with self.lock:
+            if transaction_id not in self.txns:
+                raise AlgodHTTPError("txn does not exist", 404)
+            info = dict(self.txns[transaction_id])
+        signed_txn = info.pop("txn")
+        info["pool-error"] = ""
+        info["txn"] = {"txn": json_encodable(signed_txn.transaction.dictify())}
+        return info
+
+    def block_info(self, block=None, response_format="json", round_num=None, **kwargs):
+        self.simulate_latency("block_info")
+        round_number = block if block is not None else round_num
+        with self.lock:
+            if round_number not in self.blocks:
+                raise AlgodHTTPError(f"ledger does not have entry {round_number}", 404)
+            block_txns = list(self.blocks[round_number])
+
+        txns = []
+        for signed_txn in block_txns:
+            # blocks leave the genesis fields out of each txn, like algod does
+            txn = signed_txn.transaction.dictify()
+            txn.pop("gen", None)
+            txn.pop("gh", None)
+            txns.append({"txn": txn, "hgi": True, "sig": base64.b64decode(signed_txn.signature or "")})
+        block_data = {
+            "rnd": round_number,
+            "gen": FAKE_GENESIS_ID,
+            "gh": base64.b64decode(FAKE_GENESIS_HASH),
+            "txns": txns,
+        }
+        if response_format == "msgpack":
+            return msgpack.packb({"block": block_data}, use_bin_type=True)
+        return {"block": {"rnd": round_number, "gen": FAKE_GENESIS_ID, "gh": FAKE_GENESIS_HASH, "txns": len(txns)}}
+
+    def account_info(self, address: str, **kwargs):
+        self.simulate_latency("account_info")
+        with self.lock:
+            account_data = copy.deepcopy(self.get_account(self.accounts, address))
+            created_apps = [app_id for app_id, app in self.apps.items() if app["creator"] == address]
+            created_assets = [asset_id for asset_id, asset in self.assets.items() if asset["creator"] == address]
+        return {
+            "address": address,
+            "amount": account_data["amount"],
+            "min-balance": MIN_BALANCE * (1 + len(account_data["assets"]) + len(account_data["apps"]) + len(created_apps)),
+            "assets": [{"asset-id": asset_id, "amount": amount, "is-frozen": False} for asset_id, amount in account_data["assets"].items()],
+            "apps-local-state": [{"id": app_id, "key-value": []} for app_id in sorted(account_data["apps"])],
+            "created-apps": [{"id": app_id} for app_id in created_apps],
+            "created-assets": [{"index": asset_id} for asset_id in created_assets],
+            "round": self.round,
+        }
+
+    def application_info(self, application_id: int, **kwargs):
+        self.simulate_latency("application_info")
+        with self.lock:
+            if application_id not in self.apps:
+                raise AlgodHTTPError("application does not exist", 404)
+            app = self.apps[application_id]
+            return {
+                "id": application_id,
+                "params": {
+                    "creator": app["creator"],
+                    "approval-program": base64.b64encode(app["approval-program"] or b"").decode(),
+                    "clear-state-program": base64.b64encode(app["clear-state-program"] or b"").decode(),
+                    "global-state": [
+                        {"key": base64.b64encode(key).decode(), "value": value}
+                        for key, value in app["global-state"].items()
+                    ],
+                },
+            }
+
+    def application_boxes(self, application_id: int, limit: int = 0, **kwargs):
+        self.simulate_latency("application_boxes")
+        with self.lock:
+            if application_id not in self.apps:
+                raise AlgodHTTPError("application does not exist", 404)
+            names = list(self.apps[application_id]["boxes"])
+        if limit:
+            names = names[:limit]
+        return {"boxes": [{"name": base64.b64encode(name).decode()} for name in names]}
+
+    def application_box_by_name(self, application_id: int, box_name: bytes, **kwargs):
+        self.simulate_latency("application_box_by_name")
+        with self.lock:
+            boxes = self.apps.get(application_id, {}).get("boxes", {})
+            if box_name not in boxes:
+                raise AlgodHTTPError("box not found", 404)
+            return {
+                "name": base64.b64encode(box_name).decode(),
+                "round": self.round,
+                "value": base64.b64encode(boxes[box_name]).decode(),
+            }
+
+    def compile(self, source: str, source_map: bool = False, **kwargs):
+        # not real TEAL assembly, just a stable stand-in keyed on the source; the version and the
+        # explicit constant blocks are encoded for real so templated builds can be patched
+        self.simulate_latency("compile")
+        program = assemble_header(source) + hashlib.sha512(strip_constant_blocks(source).encode()).digest()
+        return {
+            "hash": encoding.encode_address(encoding.checksum(b"Program" + program)),
+            "result": base64.b64encode(program).decode(),
+        }
+
+    # -- helpers for tests and benchmarks --
+
+    def create_app(self, creator: str, app_id: int | None = None, asset_ids: list[int] = ()):
+        with self.lock:
+            if app_id is None:
+                self.next_index += 1
+                app_id = self.next_index
+            self.apps[app_id] = {
+                "creator": creator,
+                "approval-program": b"",
+                "clear-state-program": b"",
+                "global-state": {},
+                "boxes": {},
+            }
+        self.fund(get_application_address(app_id), MIN_BALANCE)
+        # stands in for the app opting itself in, like the main contract's init does for GORA
+        with self.lock:
+            for asset_id in asset_ids:
+                self.get_account(self.accounts, get_application_address(app_id))["assets"].setdefault(asset_id, 0)
+        return app_id
@@ -0,0 +1,273 @@
+# Provision a fleet of requester accounts for load testing the oracle request path.
+# Every account ends up funded, opted into the GORA ASA and the main app, holding GORA
+# and holding algo + GORA deposits in the main app.
+import os
+import json
+import argparse
+
+from algosdk import mnemonic
+from algosdk.account import address_from_private_key
+from algosdk.atomic_transaction_composer import (
+    AtomicTransactionComposer,
+    TransactionWithSigner,
+    AccountTransactionSigner
+)
+from algosdk.error import AlgodHTTPError
+from algosdk.logic import get_application_address
+from algosdk.transaction import ApplicationOptInTxn, AssetTransferTxn, PaymentTxn
+from algokit_utils import Account
+
+from utils import (
+    ALGOD_CLIENT,
+    MAX_GROUP_SIZE,
+    fund_many,
+    generate_account,
+    get_suggested_params
+)
+from confirmations import get_confirmation_service
+from gora_abi_client import MAIN_METHODS, MainDepositAlgoArgs, MainDepositTokenArgs
+
+# asa opt-in, app opt-in, GORA transfer, deposit_algo (pay + call), deposit_token (axfer + call)
+TXNS_PER_ACCOUNT = 7
+# both files hold private keys, so they default to the git-ignored artifacts directory
+ARTIFACTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+CHECKPOINT_PATH = os.path.join(ARTIFACTS_PATH, "fleet_checkpoint.json")
+MANIFEST_PATH = os.path.join(ARTIFACTS_PATH, "fleet_manifest.json")
+
+def write_private_json(path: str, data: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", opener=lambda file, flags: os.open(file, flags, 0o600)) as json_file:
+        json.dump(data, json_file, indent=4)
+
+class FleetProvisioner():
+    def __init__(
+        self,
+        owner: Account,
+        main_app_id: int,
+        gora_asset_id: int,
+        checkpoint_path: str,
+        algo_per_account: int = 2_000_000,
+        tokens_per_account: int = 20_000_000_000,
+        algo_deposit: int = 500_000,
+        token_deposit: int = 10_000_000_000,
+        wait_rounds: int = 10
+    ):
+        self.owner = owner
+        self.main_app_id = main_app_id
+        self.main_app_address = get_application_address(main_app_id)
+        self.gora_asset_id = gora_asset_id
+        self.checkpoint_path = checkpoint_path
+        self.algo_per_account = algo_per_account
+        self.tokens_per_account = tokens_per_account
+        self.algo_deposit = algo_deposit
+        self.token_deposit = token_deposit
+        self.wait_rounds = wait_rounds
+        self.accounts = []
+        self.load_checkpoint()
+
+    def load_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            if checkpoint["main_app_id"] != self.main_app_id or checkpoint["gora_asset_id"] != self.gora_asset_id:
+                raise RuntimeError(f"{self.checkpoint_path} belongs to a different deployment")
+            self.accounts = checkpoint["accounts"]
+
+    def save_checkpoint(self):
+        checkpoint = {
+            "main_app_id": self.main_app_id,
+            "gora_asset_id": self.gora_asset_id,
+            "accounts": self.accounts
+        }
+        tmp_path = self.checkpoint_path + ".tmp"
+        write_private_json(tmp_path, checkpoint)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def sync_with_chain(self):
+        # a run can die after a group confirmed but before the checkpoint was saved, so take
+        # each unfinished account's stage from the ledger rather than resending its txns
+        for account in self.accounts:
+            if account["stage"] == "ready":
+                continue
+            account_info = ALGOD_CLIENT.account_info(account["address"])
+            # the app opt-in shares an atomic group with the deposits, so it means setup went through
+            if any(app["id"] == self.main_app_id for app in account_info.get("apps-local-state", [])):
+                account["stage"] = "ready"
+            elif account_info["amount"] > 0:
+                account["stage"] = "funded"
+            else:
+                account["stage"] = "created"
+        self.save_checkpoint()
+
+    def accounts_at(self, stage: str):
+        return [account for account in self.accounts if account["stage"] == stage]
+
+    def create_accounts(self, size: int):
+        while len(self.accounts) < size:
+            account = generate_account()
+            self.accounts.append({
+                "address": account.address,
+                "private_key": account.private_key,
+                "stage": "created"
+            })
+        self.save_checkpoint()
+
+    def fund_accounts(self):
+        accounts = self.accounts_at("created")
+        if not accounts:
+            return
+        fund_many([(account["address"], self.algo_per_account) for account in accounts], self.wait_rounds)
+        for account in accounts:
+            account["stage"] = "funded"
+        self.save_checkpoint()
+
+    def add_account_setup(self, atc: AtomicTransactionComposer, account: dict, sp):
+        address = account["address"]
+        signer = AccountTransactionSigner(account["private_key"])
+        owner_signer = AccountTransactionSigner(self.owner.private_key)
+
+        # order matters inside the group: opt in before receiving, receive before depositing
+        atc.add_transaction(TransactionWithSigner(
+            AssetTransferTxn(sender=address, sp=sp, receiver=address, amt=0, index=self.gora_asset_id),
+            signer
+        ))
+        atc.add_transaction(TransactionWithSigner(
+            ApplicationOptInTxn(sender=address, sp=sp, index=self.main_app_id),
+            signer
+        ))
+        atc.add_transaction(TransactionWithSigner(
+            AssetTransferTxn(
+                sender=self.owner.address,
+                sp=sp,
+                receiver=address,
+                amt=self.tokens_per_account,
+                index=self.gora_asset_id
+            ),
+            owner_signer
+        ))
+        atc.add_method_call(
+            app_id=self.main_app_id,
+            method=MAIN_METHODS["deposit_algo"],
+            sender=address,
+            sp=sp,
+            signer=signer,
+            method_args=MainDepositAlgoArgs(
+                algorand_txn=TransactionWithSigner(
+                    PaymentTxn(sender=address, sp=sp, receiver=self.main_app_address, amt=self.algo_deposit),
+                    signer
+                ),
+                account_to_deposit_to=address
+            )
+        )
+        atc.add_method_call(
+            app_id=self.main_app_id,
+            method=MAIN_METHODS["deposit_token"],
+            sender=address,
+            sp=sp,
+            signer=signer,
+            method_args=MainDepositTokenArgs(
+                token_txn=TransactionWithSigner(
+                    AssetTransferTxn(
+                        sender=address,
+                        sp=sp,
+                        receiver=self.main_app_address,
+                        amt=self.token_deposit,
+                        index=self.gora_asset_id
+                    ),
+                    signer
+                ),
+                application_token=self.gora_asset_id,
+                account_to_deposit_to=address
+            )
+        )
+
+    def set_up_accounts(self):
+        accounts = self.accounts_at("funded")
+        if not accounts:
+            return
+
+        sp = get_suggested_params(validity_rounds=self.wait_rounds + 10)
+        accounts_per_group = MAX_GROUP_SIZE // TXNS_PER_ACCOUNT
+        confirmation_service = get_confirmation_service(ALGOD_CLIENT)
+        confirmation_service.start()
+
+        # submit every group back to back, then wait for all of them together
+        submitted = []
+        failures = 0
+        for start in range(0, len(accounts), accounts_per_group):
+            group_accounts = accounts[start:start + accounts_per_group]
+            atc = AtomicTransactionComposer()
+            for account in group_accounts:
+                self.add_account_setup(atc, account, sp)
+            atc.build_group()
+            signed_txns = atc.gather_signatures()
+            try:
+                ALGOD_CLIENT.send_transactions(signed_txns)
+            except AlgodHTTPError as error:
+                print(f"setup group for {[account['address'] for account in group_accounts]} rejected: {error}")
+                failures += len(group_accounts)
+                continue
+            future = confirmation_service.watch(signed_txns[0].get_txid(), last_valid=sp.last, fetch_info=False)
+            submitted.append((group_accounts, future))
+
+        for group_accounts, future in submitted:
+            try:
+                future.result(timeout=max(self.wait_rounds, 1) * 10)
+            except Exception:
+                # left as "funded" so the next run retries them
+                failures += len(group_accounts)
+                continue
+            for account in group_accounts:
+                account["stage"] = "ready"
+
+        self.save_checkpoint()
+        return failures
+
+    def provision(self, size: int):
+        # only accounts from an earlier run can already be on chain
+        if self.accounts:
+            self.sync_with_chain()
+        self.create_accounts(size)
+        self.fund_accounts()
+        return self.set_up_accounts()
+
+    def write_manifest(self, manifest_path: str):
+        manifest = {
+            "main_app_id": self.main_app_id,
+            "gora_asset_id": self.gora_asset_id,
+            "accounts": [
+                {"address": account["address"], "private_key": account["private_key"]}
+                for account in self.accounts_at("ready")
+            ]
+        }
+        write_private_json(manifest_path, manifest)
+        return manifest
+
+def load_fleet_manifest(manifest_path: str):
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    manifest["accounts"] = [
+        Account(private_key=account["private_key"], address=account["address"])
+        for account in manifest["accounts"]
+    ]
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provision funded, opted-in requester accounts for load testing")
+    parser.add_argument("--size", type=int, required=True)
+    parser.add_argument("--main-app-id", type=int, required=True)
+    parser.add_argument("--asset-id", type=int, required=True)
+    parser.add_argument("--owner-mnemonic", default=os.environ.get("GORACLE_OWNER_MNEMONIC"))
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    args = parser.parse_args()
+
+    if not args.owner_mnemonic:
+        parser.error("--owner-mnemonic or GORACLE_OWNER_MNEMONIC is required to hand out GORA")
+    owner_private_key = mnemonic.to_private_key(args.owner_mnemonic)
+    owner = Account(private_key=owner_private_key, address=address_from_private_key(owner_private_key))
+
+    provisioner = FleetProvisioner(owner, args.main_app_id, args.asset_id, args.checkpoint)
+    failures = provisioner.provision(args.size)
+    manifest = provisioner.write_manifest(args.manifest)
+    print(f"{len(manifest['accounts'])} accounts ready, {failures or 0} failed (rerun to retry)")
@@ -0,0 +1,109 @@
+# Generate gora_abi_client.py, a precompiled client for the main and voting contract ABIs,
+# so callers don't re-parse the ABI JSON and linearly search for methods on every call
+import os
+import sys
+import json
+import argparse
+
+from algosdk.abi import Method
+
+from utils import get_ABI_hash, protocol_filepath
+
+ABI_SPECS = {
+    "MAIN": protocol_filepath + "/assets/abi/main-contract.json",
+    "VOTING": protocol_filepath + "/assets/abi/voting-contract.json",
+}
+CLIENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gora_abi_client.py")
+
+HEADER = '''# Generated by generate_abi_client.py from protocol/assets/abi -- do not edit by hand.
+# Regenerate with `python default_app/generate_abi_client.py` whenever the ABI JSON changes.
+from typing import NamedTuple
+
+from algosdk.abi import Method
+from algosdk.atomic_transaction_composer import TransactionWithSigner
+
+'''
+TRANSACTION_TYPES = ("txn", "pay", "keyreg", "acfg", "axfer", "afrz", "appl")
+
+def python_type_hint(arg_type:str):
+    # what AtomicTransactionComposer.add_method_call takes for an argument of this type
+    if arg_type in TRANSACTION_TYPES:
+        return "TransactionWithSigner"
+    if arg_type.startswith("byte["):
+        return "bytes"
+    if arg_type.endswith("]"):
+        return f"list[{python_type_hint(arg_type[:arg_type.rindex('[')])}]"
+    if arg_type in ("address", "account", "string"):
+        return "str"
+    if arg_type in ("asset", "application", "byte") or arg_type.startswith("uint"):
+        return "int"
+    if arg_type == "bool":
+        return "bool"
+    return "tuple"
+
+def args_class_name(prefix:str, method:Method):
+    return prefix.capitalize() + "".join(part.capitalize() for part in method.name.split("_")) + "Args"
+
+def generate_args_class(prefix:str, method:Method):
+    # the values go to add_method_call as they are, which does the ABI encoding
+    lines = [f"class {args_class_name(prefix, method)}(NamedTuple):"]
+    lines += [f"    {arg.name}: {python_type_hint(str(arg.type))}" for arg in method.args] or ["    pass"]
+    return "\n".join(lines) + "\n"
+
+def generate_client():
+    source = HEADER
+    for prefix, spec_path in ABI_SPECS.items():
+        with open(spec_path) as spec_file:
+            spec_methods = json.load(spec_file)["methods"]
+        methods = [Method.undictify(method) for method in spec_methods]
+
+        source += f"{prefix}_ABI_HASH = {get_ABI_hash(spec_path)!r}\n\n"
+        source += f"{prefix}_METHODS: dict[str, Method] = {{\n"
+        for method in spec_methods:
+            source += f"    {method['name']!r}: Method.undictify({method!r}),\n"
+        source += "}\n\n"
+
+        source += f"{prefix}_SELECTORS: dict[bytes, Method] = {{\n"
+        for method in methods:
+            source += f"    {method.get_selector()!r}: {prefix}_METHODS[{method.name!r}],\n"
+        source += "}\n\n"
+
+        for method in methods:
+            source += generate_args_class(prefix, method) + "\n"
+
+    return source.rstrip() + "\n"
+
+def get_client_hashes():
+    hashes = {}
+    if not os.path.exists(CLIENT_PATH):
+        return hashes
+    with open(CLIENT_PATH) as client_file:
+        for line in client_file:
+            for prefix in ABI_SPECS:
+                if line.startswith(f"{prefix}_ABI_HASH = "):
+                    hashes[prefix] = line.split("=", 1)[1].strip().strip("'")
+    return hashes
+
+def is_client_stale():
+    client_hashes = get_client_hashes()
+    return any(
+        client_hashes.get(prefix) != get_ABI_hash(spec_path)
+        for prefix, spec_path in ABI_SPECS.items()
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="exit with an error if gora_abi_client.py is out of date")
+    args = parser.parse_args()
+
+    if args.check:
+        if is_client_stale():
+            print("gora_abi_client.py is out of date, run generate_abi_client.py")
+            sys.exit(1)
+        print("gora_abi_client.py is up to date")
+    else:
+        # generated before the file is opened, so a failure doesn't leave utils.py unimportable
+        client_source = generate_client()
+        with open(CLIENT_PATH, "w") as client_file:
+            client_file.write(client_source)
+        print(f"Wrote {CLIENT_PATH}")
@@ -0,0 +1,197 @@
+# Generated by generate_abi_client.py from protocol/assets/abi -- do not edit by hand.
+# Regenerate with `python default_app/generate_abi_client.py` whenever the ABI JSON changes.
+from typing import NamedTuple
+
+from algosdk.abi import Method
+from algosdk.atomic_transaction_composer import TransactionWithSigner
+
+MAIN_ABI_HASH = '45fc19fb88822de0360bc80d7a635359f83036b0f9562122eb5642bd1533cd74'
+
+MAIN_METHODS: dict[str, Method] = {
+    'init': Method.undictify({'name': 'init', 'desc': 'initialize the contract', 'args': [{'name': 'token', 'type': 'asset'}, {'name': 'manager', 'type': 'address'}], 'returns': {'type': 'void'}}),
+    'update_protocol_settings': Method.undictify({'name': 'update_protocol_settings', 'desc': 'a hook to change settings for the goracle protocol', 'args': [{'name': 'manager_address', 'type': 'address'}, {'name': 'refund_request_made_percentage', 'type': 'uint64'}, {'name': 'refund_processing_percentage', 'type': 'uint64'}, {'name': 'algo_request_fee', 'type': 'uint64'}, {'name': 'gora_request_fee', 'type': 'uint64'}, {'name': 'voting_threshold', 'type': 'uint64'}, {'name': 'time_lock', 'type': 'uint64'}, {'name': 'vote_refill_threshold', 'type': 'uint64'}, {'name': 'vote_refill_amount', 'type': 'uint64'}, {'name': 'subscription_token_lock', 'type': 'uint64'}], 'returns': {'type': 'void'}}),
+    'request': Method.undictify({'name': 'request', 'desc': 'Request an oracle response', 'args': [{'name': 'request_args', 'type': 'byte[]', 'desc': 'includes source ID and source args'}, {'name': 'destination', 'type': 'byte[]', 'desc': 'includes app ID and method signature'}, {'name': 'type', 'type': 'uint64', 'desc': 'request type'}, {'name': 'key', 'type': 'byte[]', 'desc': 'request key, this is used to access the request box, the box will be named Sha512_256(Concat(<REQUSTER_ADDR>, <KEY>))'}, {'name': 'app_refs', 'type': 'uint64[]', 'desc': 'list of app references to pass through to destination'}, {'name': 'asset_refs', 'type': 'uint64[]', 'desc': 'list of asset references to pass through to destination'}, {'name': 'account_refs', 'type': 'address[]', 'desc': 'list of account references to pass through to destination'}, {'name': 'box_refs', 'type': '(byte[],uint64)[]', 'desc': 'list of box references to pass through to destination'}], 'returns': {'type': 'void'}}),
+    'subscribe': Method.undictify({'name': 'subscribe', 'desc': 'Request an oracle subscription response', 'args': [{'name': 'request_args', 'type': 'byte[]', 'desc': 'includes a formated type, url, path args'}, {'name': 'destination', 'type': 'byte[]', 'desc': 'includes app ID and method signature'}, {'name': 'subscription_args', 'type': 'byte[]', 'desc': 'includes intervals in seconds, number of executions'}, {'name': 'type', 'type': 'uint64', 'desc': 'request type'}], 'returns': {'type': 'void'}}),
+    'register_participation_account': Method.undictify({'name': 'register_participation_account', 'desc': '', 'args': [{'name': 'public_key', 'type': 'address'}], 'returns': {'type': 'void'}}),
+    'unregister_participation_account': Method.undictify({'name': 'unregister_participation_account', 'desc': '', 'args': [], 'returns': {'type': 'void'}}),
+    'stake': Method.undictify({'name': 'stake', 'desc': 'Stake tokens to participate', 'args': [{'name': 'token_txn', 'type': 'axfer'}], 'returns': {'type': 'void'}}),
+    'unstake': Method.undictify({'name': 'unstake', 'desc': 'Unstake tokens to participate', 'args': [{'name': 'unstake_amount', 'type': 'uint64'}, {'name': 'application_token', 'type': 'asset'}], 'returns': {'type': 'void'}}),
+    'deposit_token': Method.undictify({'name': 'deposit_token', 'desc': 'Deposit tokens to pay for services', 'args': [{'name': 'token_txn', 'type': 'axfer'}, {'name': 'application_token', 'type': 'asset'}, {'name': 'account_to_deposit_to', 'type': 'account'}], 'returns': {'type': 'void'}}),
+    'deposit_algo': Method.undictify({'name': 'deposit_algo', 'desc': 'Deposit algorand to help cover fees', 'args': [{'name': 'algorand_txn', 'type': 'pay'}, {'name': 'account_to_deposit_to', 'type': 'account'}], 'returns': {'type': 'void'}}),
+    'withdraw_token': Method.undictify({'name': 'withdraw_token', 'desc': 'Withdraw deposited tokens', 'args': [{'name': 'withdraw_amount', 'type': 'uint64'}, {'name': 'application_token', 'type': 'asset'}], 'returns': {'type': 'void'}}),
+    'withdraw_algo': Method.undictify({'name': 'withdraw_algo', 'desc': 'Withdraw deposited algo', 'args': [{'name': 'withdraw_amount', 'type': 'uint64'}], 'returns': {'type': 'void'}}),
+    'claim_rewards': Method.undictify({'name': 'claim_rewards', 'desc': 'claims fees and rewards for voting', 'args': [{'name': 'rewards_address', 'type': 'account'}, {'name': 'previous_vote', 'type': 'byte[129]'}, {'name': 'previous_vote_requester', 'type': 'account'}, {'name': 'voting_contract', 'type': 'application'}], 'returns': {'type': 'void'}}),
+    'heartbeat': Method.undictify({'name': 'heartbeat', 'desc': 'function that allows user to log latest IP', 'args': [{'name': 'ip', 'type': 'byte[4]'}, {'name': 'port', 'type': 'uint16'}, {'name': 'network', 'type': 'uint32'}], 'returns': {'type': 'void'}}),
+    'deploy_voting_contract': Method.undictify({'name': 'deploy_voting_contract', 'desc': 'deploys voting contracts', 'args': [], 'returns': {'type': 'void'}}),
+    'refund_request': Method.undictify({'name': 'refund_request', 'desc': 'refunds a request when a request was not processed in time', 'args': [{'name': 'requester', 'type': 'account'}, {'name': 'request_key_hash', 'type': 'byte[32]'}], 'returns': {'type': 'void'}}),
+    'update_request_status': Method.undictify({'name': 'update_request_status', 'desc': 'voting app updates a requests status when request has completed', 'args': [{'name': 'voting_contract', 'type': 'application'}, {'name': 'request_key_hash', 'type': 'byte[32]'}, {'name': 'status', 'type': 'string'}, {'name': 'requester', 'type': 'account'}, {'name': 'proposal_bytes', 'type': 'byte[56]'}], 'returns': {'type': '(byte[32],uint64,uint64,uint64,uint64,byte[32])'}}),
+    'claim_rewards_vote_verify': Method.undictify({'name': 'claim_rewards_vote_verify', 'desc': 'Method for verification logic sig AND claiming rewards for previous vote', 'args': [{'name': 'vrf_result', 'type': 'byte[64]'}, {'name': 'vrf_proof', 'type': 'byte[80]'}, {'name': 'request_round_seed', 'type': 'byte[32]'}, {'name': 'participation_account', 'type': 'account'}, {'name': 'main_account', 'type': 'account'}, {'name': 'voting_address', 'type': 'account'}, {'name': 'voting_app', 'type': 'application'}, {'name': 'request_key_hash', 'type': 'byte[32]'}, {'name': 'previous_vote', 'type': 'byte[88]'}, {'name': 'previous_vote_requester', 'type': 'account'}], 'returns': {'type': 'void'}}),
+}
+
+MAIN_SELECTORS: dict[bytes, Method] = {
+    b'\x89\xfe\xceG': MAIN_METHODS['init'],
+    b'\xcah\xed\x8c': MAIN_METHODS['update_protocol_settings'],
+    b'oj\xe9\x8b': MAIN_METHODS['request'],
+    b'+\xdd\xaf\xa5': MAIN_METHODS['subscribe'],
+    b'\xe8Z\xe5%': MAIN_METHODS['register_participation_account'],
+    b'n~`\xee': MAIN_METHODS['unregister_participation_account'],
+    b'r\xca\x15\xad': MAIN_METHODS['stake'],
+    b':\xc8S\xb4': MAIN_METHODS['unstake'],
+    b'\xaa=\xa9\xb4': MAIN_METHODS['deposit_token'],
+    b'\xae\xc8(F': MAIN_METHODS['deposit_algo'],
+    b'\xab\xb4\x96\xfd': MAIN_METHODS['withdraw_token'],
+    b'\xda[\xb8\xb2': MAIN_METHODS['withdraw_algo'],
+    b'5h\x80\x9e': MAIN_METHODS['claim_rewards'],
+    b'W\xd70\n': MAIN_METHODS['heartbeat'],
+    b'\xd5\xd6JQ': MAIN_METHODS['deploy_voting_contract'],
+    b'\xf6\x8f\xee\xf3': MAIN_METHODS['refund_request'],
+    b'@\xdb\x8fO': MAIN_METHODS['update_request_status'],
+    b'#\xfd)a': MAIN_METHODS['claim_rewards_vote_verify'],
+}
+
+class MainInitArgs(NamedTuple):
+    token: int
+    manager: str
+
+class MainUpdateProtocolSettingsArgs(NamedTuple):
+    manager_address: str
+    refund_request_made_percentage: int
+    refund_processing_percentage: int
+    algo_request_fee: int
+    gora_request_fee: int
+    voting_threshold: int
+    time_lock: int
+    vote_refill_threshold: int
+    vote_refill_amount: int
+    subscription_token_lock: int
+
+class MainRequestArgs(NamedTuple):
+    request_args: bytes
+    destination: bytes
+    type: int
+    key: bytes
+    app_refs: list[int]
+    asset_refs: list[int]
+    account_refs: list[str]
+    box_refs: list[tuple]
+
+class MainSubscribeArgs(NamedTuple):
+    request_args: bytes
+    destination: bytes
+    subscription_args: bytes
+    type: int
+
+class MainRegisterParticipationAccountArgs(NamedTuple):
+    public_key: str
+
+class MainUnregisterParticipationAccountArgs(NamedTuple):
+    pass
+
+class MainStakeArgs(NamedTuple):
+    token_txn: TransactionWithSigner
+
+class MainUnstakeArgs(NamedTuple):
+    unstake_amount: int
+    application_token: int
+
+class MainDepositTokenArgs(NamedTuple):
+    token_txn: TransactionWithSigner
+    application_token: int
+    account_to_deposit_to: str
+
+class MainDepositAlgoArgs(NamedTuple):
+    algorand_txn: TransactionWithSigner
+    account_to_deposit_to: str
+
+class MainWithdrawTokenArgs(NamedTuple):
+    withdraw_amount: int
+    application_token: int
+
+class MainWithdrawAlgoArgs(NamedTuple):
+    withdraw_amount: int
+
+class MainClaimRewardsArgs(NamedTuple):
+    rewards_address: str
+    previous_vote: bytes
+    previous_vote_requester: str
+    voting_contract: int
+
+class MainHeartbeatArgs(NamedTuple):
+    ip: bytes
+    port: int
+    network: int
+
+class MainDeployVotingContractArgs(NamedTuple):
+    pass
+
+class MainRefundRequestArgs(NamedTuple):
+    requester: str
+    request_key_hash: bytes
+
+class MainUpdateRequestStatusArgs(NamedTuple):
+    voting_contract: int
+    request_key_hash: bytes
+    status: str
+    requester: str
+    proposal_bytes: bytes
+
+class MainClaimRewardsVoteVerifyArgs(NamedTuple):
+    vrf_result: bytes
+    vrf_proof: bytes
+    request_round_seed: bytes
+    participation_account: str
+    main_account: str
+    voting_address: str
+    voting_app: int
+    request_key_hash: bytes
+    previous_vote: bytes
+    previous_vote_requester: str
+
+VOTING_ABI_HASH = 'df6f2b43fc3d5eb2760f863024c8f4eda75b36b1165ae37400d30ef58a558e97'
+
+VOTING_METHODS: dict[str, Method] = {
+    'vote': Method.undictify({'name': 'vote', 'desc': 'Submit vote for block', 'args': [{'name': 'vrf_result', 'type': 'byte[64]'}, {'name': 'vrf_proof', 'type': 'byte[80]'}, {'name': 'staking_app', 'type': 'application'}, {'name': 'destination_app', 'type': 'application'}, {'name': 'destination_method', 'type': 'byte[]'}, {'name': 'requester', 'type': 'account'}, {'name': 'primary_account', 'type': 'account'}, {'name': 'response_type', 'type': 'uint32'}, {'name': 'response_body', 'type': 'byte[]'}, {'name': 'vote_count', 'type': 'uint64'}, {'name': 'z_index', 'type': 'uint64'}, {'name': 'lsig', 'type': 'appl'}], 'returns': {'type': 'void'}}),
+    'delete_box': Method.undictify({'name': 'delete_box', 'desc': 'Method for user to delete their old box', 'args': [{'name': 'vote_hash', 'type': 'byte[32]'}], 'returns': {'type': 'void'}}),
+    'reset_previous_vote': Method.undictify({'name': 'reset_previous_vote', 'desc': 'Method to manually reset a previous vote', 'args': [{'name': 'primary_account', 'type': 'account'}, {'name': 'rewards_address', 'type': 'account'}, {'name': 'main_contract', 'type': 'application'}], 'returns': {'type': 'void'}}),
+    'register_voter': Method.undictify({'name': 'register_voter', 'desc': 'registers participation account to store previous vote', 'args': [{'name': 'box_payment', 'type': 'pay'}, {'name': 'primary_account', 'type': 'account'}, {'name': 'main_contract', 'type': 'application'}], 'returns': {'type': 'void'}}),
+    'deregister_voter': Method.undictify({'name': 'deregister_voter', 'desc': 'deregisters participation account to store previous vote', 'args': [{'name': 'primary_account', 'type': 'account'}, {'name': 'main_contract', 'type': 'application'}], 'returns': {'type': 'void'}}),
+}
+
+VOTING_SELECTORS: dict[bytes, Method] = {
+    b'=F\xf2\x0f': VOTING_METHODS['vote'],
+    b'&\xc5\xa8%': VOTING_METHODS['delete_box'],
+    b'`#\xe5u': VOTING_METHODS['reset_previous_vote'],
+    b'\xe4\x91\xba\xbd': VOTING_METHODS['register_voter'],
+    b')\xc1\xc8\x8a': VOTING_METHODS['deregister_voter'],
+}
+
+class VotingVoteArgs(NamedTuple):
+    vrf_result: bytes
+    vrf_proof: bytes
+    staking_app: int
+    destination_app: int
+    destination_method: bytes
+    requester: str
+    primary_account: str
+    response_type: int
+    response_body: bytes
+    vote_count: int
+    z_index: int
+    lsig: TransactionWithSigner
+
+class VotingDeleteBoxArgs(NamedTuple):
+    vote_hash: bytes
+
+class VotingResetPreviousVoteArgs(NamedTuple):
+    primary_account: str
+    rewards_address: str
+    main_contract: int
+
+class VotingRegisterVoterArgs(NamedTuple):
+    box_payment: TransactionWithSigner
+    primary_account: str
+    main_contract: int
+
+class VotingDeregisterVoterArgs(NamedTuple):
+    primary_account: str
+    main_contract: int
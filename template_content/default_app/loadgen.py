@@ -0,0 +1,330 @@
+# Load generator for the oracle request lifecycle: drives main contract `request` calls, either
+# directly or through the default app's `send_request`, and reports throughput, latency, failures and fees
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+from algosdk import abi, encoding
+from algosdk.abi import Method
+from algosdk.logic import get_application_address
+from algosdk.atomic_transaction_composer import AtomicTransactionComposer, AccountTransactionSigner
+from algokit_utils import Account
+
+from utils import generate_account
+from async_utils import AsyncAlgodClient
+from confirmations import get_confirmation_service
+from gora_abi_client import MAIN_METHODS, MainRequestArgs
+from fleet import MANIFEST_PATH, load_fleet_manifest
+from fake_algod import FakeAlgodClient
+from build_graph import ERROR_MAP_PATH
+
+sys.path.append(".")
+
+from protocol.utils.smart_assert import decode_error
+
+# compact SmartAssert failures only carry a pc, the build's error map names them
+main_error_map = []
+if os.path.exists(ERROR_MAP_PATH):
+    with open(ERROR_MAP_PATH) as error_map_file:
+        main_error_map = json.load(error_map_file).get("main_approval", [])
+
+DEFAULT_APP_SEND_REQUEST = Method.from_signature(
+    "send_request(byte[],byte[],uint64,(uint32,byte[],uint64)[],uint32,byte[],application)void"
+)
+source_spec_type = abi.ABIType.from_string("(uint32,byte[],uint64)")
+request_spec_type = abi.ABIType.from_string("((uint32,byte[],uint64)[],uint32,byte[])")
+destination_spec_type = abi.ABIType.from_string("(uint64,byte[])")
+
+SOURCE_ARGS = b"v2/crypto/prices" + b'{"assets":"eth","curr":"usd"}' + b"number" + b"$.price"
+
+def get_request_box_name(requester_address: str, key: bytes):
+    # the main contract names request boxes Sha512_256(Concat(<requester>, <key>))
+    return encoding.checksum(encoding.decode_address(requester_address) + key)
+
+def classify_failure(error: Exception):
+    message = str(error)
+    smart_assert = decode_error(message, main_error_map)
+    if smart_assert:
+        return smart_assert
+    if "assert failed" in message:
+        return "assert failed"
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    if "overspend" in message:
+        return "overspend"
+    return type(error).__name__
+
+def percentiles(values: list[float]):
+    if not values:
+        return {}
+    values = sorted(values)
+    return {
+        "mean": sum(values) / len(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "p99": values[min(len(values) - 1, int(len(values) * 0.99))],
+        "max": values[-1],
+    }
+
+class RatePacer():
+    # hands out evenly spaced send slots shared by every requester
+    def __init__(self, rate: float | None):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = None
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = now if self.next_slot is None else max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class LoadGenerator():
+    def __init__(
+        self,
+        algod: AsyncAlgodClient,
+        main_app_id: int,
+        requesters: list[Account],
+        mode: str = "direct",
+        default_app_id: int | None = None,
+        gora_asset_id: int = 0,
+        rate: float | None = None,
+        duration: float = 30.0,
+        max_requests: int | None = None,
+        check_boxes: bool = True
+    ):
+        if mode not in ("direct", "default_app"):
+            raise ValueError(f"unknown mode {mode}")
+        if mode == "default_app" and not default_app_id:
+            raise ValueError("default_app mode needs a default_app_id")
+
+        self.algod = algod
+        self.main_app_id = main_app_id
+        self.requesters = requesters
+        self.mode = mode
+        self.default_app_id = default_app_id
+        self.gora_asset_id = gora_asset_id
+        self.pacer = RatePacer(rate)
+        self.rate = rate
+        self.duration = duration
+        self.max_requests = max_requests
+        self.check_boxes = check_boxes
+        self.confirmations = get_confirmation_service(algod.client)
+        self.run_id = os.urandom(4).hex()
+        self.sent = 0
+        self.results = []
+
+    def next_key(self):
+        self.sent += 1
+        return f"load-{self.run_id}-{self.sent}".encode()
+
+    def add_request(self, atc: AtomicTransactionComposer, requester: Account, key: bytes, sp):
+        signer = AccountTransactionSigner(requester.private_key)
+        source_specs = [[6, SOURCE_ARGS, 60]]
+
+        if self.mode == "direct":
+            atc.add_method_call(
+                app_id=self.main_app_id,
+                method=MAIN_METHODS["request"],
+                sender=requester.address,
+                sp=sp,
+                signer=signer,
+                boxes=[(self.main_app_id, get_request_box_name(requester.address, key))],
+                method_args=MainRequestArgs(
+                    request_args=request_spec_type.encode([source_specs, 3, b"load"]),
+                    destination=destination_spec_type.encode([0, b""]),
+                    type=1,
+                    key=key,
+                    app_refs=[],
+                    asset_refs=[],
+                    account_refs=[],
+                    box_refs=[]
+                )
+            )
+            return get_request_box_name(requester.address, key)
+
+        # the default app makes the request with its own deposits, so the box is keyed on its address
+        box_name = get_request_box_name(get_application_address(self.default_app_id), key)
+        sp.flat_fee = True
+        sp.fee = 2000
+        atc.add_method_call(
+            app_id=self.default_app_id,
+            method=DEFAULT_APP_SEND_REQUEST,
+            sender=requester.address,
+            sp=sp,
+            signer=signer,
+            boxes=[(self.main_app_id, box_name)],
+            method_args=[
+                key,
+                key,
+                self.gora_asset_id,
+                source_specs,
+                3,
+                b"load",
+                self.main_app_id
+            ]
+        )
+        return box_name
+
+    async def send_one(self, requester: Account):
+        key = self.next_key()
+        result = {"requester": requester.address, "key": key.decode(), "ok": False, "fee": 0}
+        start = time.monotonic()
+        try:
+            sp = await self.algod.suggested_params()
+            atc = AtomicTransactionComposer()
+            box_name = self.add_request(atc, requester, key, sp)
+            atc.build_group()
+            signed_txns = atc.gather_signatures()
+            fee = sum(signed_txn.transaction.fee for signed_txn in signed_txns)
+
+            await self.algod.send_transactions(signed_txns)
+            submitted = time.monotonic()
+            result["submit_seconds"] = submitted - start
+
+            txn_info = await asyncio.wrap_future(
+                self.confirmations.watch(signed_txns[-1].get_txid(), last_valid=sp.last, fetch_info=False)
+            )
+            confirmed = time.monotonic()
+            result["confirm_seconds"] = confirmed - submitted
+            result["confirmed_round"] = txn_info["confirmed-round"]
+            result["fee"] = fee
+
+            if self.check_boxes:
+                await self.algod.call("application_box_by_name", self.main_app_id, box_name)
+                result["box_seconds"] = time.monotonic() - confirmed
+            # only now, so a request whose box never showed up counts as a failure
+            result["ok"] = True
+        except Exception as error:
+            # anything one request runs into is tallied by its type, the other requesters keep going
+            result["failure"] = classify_failure(error)
+        result["total_seconds"] = time.monotonic() - start
+        self.results.append(result)
+
+    def should_stop(self, deadline: float):
+        if self.max_requests is not None and self.sent >= self.max_requests:
+            return True
+        return time.monotonic() >= deadline
+
+    async def run_requester(self, requester: Account, deadline: float):
+        # one request in flight per requester, so the requester count is the concurrency
+        while not self.should_stop(deadline):
+            await self.pacer.wait()
+            if self.should_stop(deadline):
+                return
+            await self.send_one(requester)
+
+    async def run(self):
+        started = time.monotonic()
+        deadline = started + self.duration
+        # follow blocks before anything is sent, so early confirmations aren't missed
+        self.confirmations.start()
+        await asyncio.gather(*(self.run_requester(requester, deadline) for requester in self.requesters))
+        return self.report(time.monotonic() - started)
+
+    def report(self, elapsed: float):
+        succeeded = [result for result in self.results if result["ok"]]
+        failures = Counter(result["failure"] for result in self.results if not result["ok"])
+        per_round = Counter(result["confirmed_round"] for result in succeeded)
+        total_fees = sum(result["fee"] for result in succeeded)
+
+        return {
+            "config": {
+                "mode": self.mode,
+                "main_app_id": self.main_app_id,
+                "default_app_id": self.default_app_id,
+                "requesters": len(self.requesters),
+                "rate": self.rate,
+                "duration": self.duration,
+                "max_requests": self.max_requests,
+            },
+            "elapsed_seconds": elapsed,
+            "sent": len(self.results),
+            "succeeded": len(succeeded),
+            "failed": len(self.results) - len(succeeded),
+            "requests_per_second": len(succeeded) / elapsed if elapsed else 0,
+            "requests_per_round": {
+                "rounds": len(per_round),
+                "mean": len(succeeded) / len(per_round) if per_round else 0,
+                "max": max(per_round.values(), default=0),
+            },
+            "latency": {
+                "submit": percentiles([result["submit_seconds"] for result in succeeded]),
+                "confirm": percentiles([result["confirm_seconds"] for result in succeeded]),
+                "box": percentiles([result["box_seconds"] for result in succeeded if "box_seconds" in result]),
+                "total": percentiles([result["total_seconds"] for result in succeeded]),
+            },
+            "failures": dict(failures.most_common()),
+            "fees": {
+                "total": total_fees,
+                "per_request": total_fees / len(succeeded) if succeeded else 0,
+            },
+        }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure request throughput and latency against the main contract")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="requester fleet written by fleet.py")
+    parser.add_argument("--mode", choices=["direct", "default_app"], default="direct")
+    parser.add_argument("--default-app-id", type=int)
+    parser.add_argument("--requesters", type=int, help="how many fleet accounts to use (default: all)")
+    parser.add_argument("--rate", type=float, help="requests per second across all requesters (default: unpaced)")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--max-requests", type=int)
+    parser.add_argument("--no-box-check", action="store_true")
+    parser.add_argument("--report", default="loadgen_report.json")
+    return parser.parse_args(argv)
+
+def offline_fleet(fake_algod: FakeAlgodClient, size: int):
+    # the stand-in doesn't run TEAL, so a bare app id and funded accounts are all a run needs
+    requesters = [generate_account() for _ in range(size)]
+    for requester in requesters:
+        fake_algod.fund(requester.address, 10_000_000)
+    return {
+        "main_app_id": fake_algod.create_app(fake_algod.dispenser.address),
+        "gora_asset_id": 0,
+        "accounts": requesters
+    }
+
+async def main(args, algod_client):
+    if isinstance(algod_client, FakeAlgodClient):
+        manifest = offline_fleet(algod_client, args.requesters or 8)
+    else:
+        manifest = load_fleet_manifest(args.manifest)
+    requesters = manifest["accounts"][:args.requesters]
+    if not requesters:
+        sys.exit(f"no ready accounts in {args.manifest}")
+
+    algod = AsyncAlgodClient(algod_client, max_concurrency=max(len(requesters), 1))
+    generator = LoadGenerator(
+        algod,
+        manifest["main_app_id"],
+        requesters,
+        mode=args.mode,
+        default_app_id=args.default_app_id,
+        gora_asset_id=manifest["gora_asset_id"],
+        rate=args.rate,
+        duration=args.duration,
+        max_requests=args.max_requests,
+        check_boxes=not args.no_box_check
+    )
+    try:
+        report = await generator.run()
+    finally:
+        algod.close()
+
+    with open(args.report, "w") as report_file:
+        json.dump(report, report_file, indent=4)
+    return report
+
+if __name__ == "__main__":
+    # GORACLE_FAKE_ALGOD=1 runs offline against fake_algod.FakeAlgodClient
+    from utils import ALGOD_CLIENT
+
+    report = asyncio.run(main(parse_args(), ALGOD_CLIENT))
+    print(json.dumps({key: report[key] for key in ("sent", "succeeded", "failed", "requests_per_second", "failures")}, indent=4))
@@ -0,0 +1,72 @@
+# Run the TEAL peephole optimizer over a protocol build, print per-method cost and size deltas,
+# and check the optimized programs against the originals by replaying recorded call traces
+import os
+import sys
+import argparse
+from collections import defaultdict
+
+sys.path.append(".")
+
+from build_graph import build_protocol, POST_COMPILED
+from check_costs import abi_signatures
+from contract_traces import record_smoke_trace
+from gora_abi_client import MAIN_SELECTORS, VOTING_SELECTORS
+from protocol.utils.avm import CallTrace, Program, diff_replays, replay_trace
+from protocol.utils.teal_optimizer import foldable_ops, format_optimization_report, optimization_report, optimize_teal, split_ops
+
+# the contracts build_graph runs the optimizer stage on
+OPTIMIZED_CONTRACTS = POST_COMPILED
+
+def measured_costs(trace: CallTrace, results: list, selectors: dict):
+    # opcode cost of every approved top-level call in a replay, by method
+    costs = defaultdict(list)
+    for group, result in zip(trace.groups, results):
+        if not result.ok:
+            continue
+        for call in result.calls:
+            args = group[call.txn_index].get("ApplicationArgs") or [b""]
+            costs[selectors.get(args[0], "bare call")].append(call.cost)
+    return costs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--token-asset-id", type=int, default=1)
+    parser.add_argument("--trace", action="append", default=[], help="CallTrace pickle to replay (default: a recorded smoke run)")
+    parser.add_argument("--requests", type=int, default=50, help="request calls in the smoke run")
+    args = parser.parse_args()
+
+    # the baseline is whatever the build produces without the optimizer stage
+    os.environ.pop("GORACLE_TEAL_OPTIMIZE", None)
+    artifacts = build_protocol(args.token_asset_id)
+    signatures = abi_signatures()
+    selectors = {selector: method.name for selector, method in {**MAIN_SELECTORS, **VOTING_SELECTORS}.items()}
+
+    # static arithmetic the build still leaves to the AVM, in every contract
+    print("Constant folding:")
+    for name, artifact in artifacts.items():
+        print(f"  {name:<20} {len(split_ops(artifact.teal)):>6} ops, {foldable_ops(artifact.teal):>4} foldable")
+    print()
+
+    replacements = {}
+    for name in OPTIMIZED_CONTRACTS:
+        teal = artifacts[name].teal
+        optimized, stats = optimize_teal(teal)
+        print(format_optimization_report(optimization_report(teal, optimized, name, signatures, stats)) + "\n")
+        replacements[Program(teal, name).source_hash] = Program(optimized, name + "_optimized")
+
+    traces = [CallTrace.load(path) for path in args.trace] or [record_smoke_trace(artifacts, args.token_asset_id, args.requests)[0]]
+    differences = []
+    for number, trace in enumerate(traces):
+        expected = replay_trace(trace)
+        actual = replay_trace(trace, replacements)
+        differences += [f"trace {number}: {difference}" for difference in diff_replays(expected, actual)]
+        print(f"trace {number}: {len(trace.groups)} groups, {sum(result.ok for result in expected[0])} approved")
+        before, after = measured_costs(trace, expected[0], selectors), measured_costs(trace, actual[0], selectors)
+        for method, costs in sorted(before.items()):
+            mean_before, mean_after = sum(costs) / len(costs), sum(after[method]) / max(len(after[method]), 1)
+            print(f"  {method:<36} {len(costs):>5} calls {mean_before:>8.1f} -> {mean_after:>8.1f} per call")
+
+    if differences:
+        print("\n".join(["", "Optimized programs behave differently:"] + differences))
+        sys.exit(1)
+    print("\nOptimized programs match the originals on every replayed call")
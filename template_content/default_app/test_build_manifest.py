@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture(scope="module")
+def build():
+    """Builds the protocol with the offline algod stand-in against a manifest, returning the
+    manifest it used."""
+    os.environ.setdefault("GORACLE_FAKE_ALGOD", "1")
+    working_directory = os.getcwd()
+    # utils finds the protocol sources relative to the working directory
+    os.chdir(PROJECT_PATH)
+    try:
+        from build_graph import protocol_build_graph
+        from build_manifest import BuildManifest
+    finally:
+        os.chdir(working_directory)
+
+    def run(manifest_path):
+        manifest = BuildManifest(manifest_path)
+        artifacts = protocol_build_graph(1, manifest=manifest).run()
+        return manifest, artifacts
+    return run
+
+
+def test_unchanged_build_is_reused(build, tmp_path):
+    manifest_path = str(tmp_path / "build_manifest.json")
+    build(manifest_path)
+    manifest, _ = build(manifest_path)
+    assert manifest.rebuilt == {}
+    assert "main_approval" in manifest.reused
+
+
+def test_dev_flag_rebuilds(build, tmp_path, monkeypatch):
+    manifest_path = str(tmp_path / "build_manifest.json")
+    monkeypatch.delenv("GORACLE_DEV_ALLOW_UPDATES", raising=False)
+    _, before = build(manifest_path)
+    monkeypatch.setenv("GORACLE_DEV_ALLOW_UPDATES", "1")
+    manifest, after = build(manifest_path)
+    assert "env GORACLE_DEV_ALLOW_UPDATES" in manifest.rebuilt["main_approval"]
+    assert "voting_approval" in manifest.rebuilt
+    assert after["main_approval"].teal != before["main_approval"].teal
+
+
+def test_other_settings_fingerprinted_by_hash(build, tmp_path, monkeypatch):
+    manifest_path = str(tmp_path / "build_manifest.json")
+    build(manifest_path)
+    monkeypatch.setenv("GORACLE_FAKE_ALGOD_LATENCY", "0.5")
+    manifest, _ = build(manifest_path)
+    assert manifest.rebuilt == {}
+
+    monkeypatch.setenv("GORACLE_UNLISTED_SECRET", "hunter2")
+    manifest, _ = build(manifest_path)
+    assert "env GORACLE_UNLISTED_SECRET_sha256" in manifest.rebuilt["main_approval"]
+    with open(manifest_path) as manifest_file:
+        assert "hunter2" not in manifest_file.read()
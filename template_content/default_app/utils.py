@@ -3,6 +3,10 @@ import os
 import algokit_utils
 import json
 import io
+import re
+import copy
+import time
+import threading
 from Crypto.Hash import SHA512
 from pprint import pprint
 import sys
@@ -14,11 +18,13 @@ sys.path.append(".")
 
 from algosdk.transaction import (
     ApplicationCreateTxn,
+    ApplicationUpdateTxn,
     AssetCreateTxn,
     AssetTransferTxn,
     OnComplete,
     PaymentTxn,
     StateSchema,
+    assign_group_id,
     wait_for_confirmation
 )
 from algosdk.account import generate_account as ga
@@ -32,8 +38,114 @@ from algosdk.logic import *
 from algokit_utils import ApplicationClient,Account
 from algosdk.v2client.algod import AlgodClient
 import algosdk.abi as abi
+from gora_abi_client import MAIN_METHODS, MainDepositAlgoArgs, MainDepositTokenArgs, MainInitArgs
+from confirmations import execute_atc, get_confirmation_service
 
-ALGOD_CLIENT = algokit_utils.get_algod_client()
+FAKE_ALGOD = bool(os.environ.get("GORACLE_FAKE_ALGOD"))
+if FAKE_ALGOD:
+    # run the client path against the in-process stand-in instead of a localnet
+    from fake_algod import FakeAlgodClient
+    ALGOD_CLIENT = FakeAlgodClient.from_env()
+else:
+    ALGOD_CLIENT = algokit_utils.get_algod_client()
+
+def is_fake_algod(algod_client) -> bool:
+    # without importing fake_algod when the stand-in isn't in use
+    return FAKE_ALGOD and isinstance(algod_client, FakeAlgodClient)
+
+class SuggestedParamsProvider():
+    """Hands out copies of one SuggestedParams per round instead of asking algod for every transaction.
+
+    A daemon thread waits on `status_after_block` and refreshes the cached params whenever the
+    round advances. If that thread can't reach algod the params are refetched on the next `get`.
+    """
+
+    def __init__(
+        self,
+        algod_client: AlgodClient,
+        refresh_in_background: bool = True,
+        max_age_seconds: float = 5.0
+    ):
+        self.client = algod_client
+        self.refresh_in_background = refresh_in_background
+        self.max_age_seconds = max_age_seconds
+        self.params = None
+        self.round = 0
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def refresh(self):
+        params = self.client.suggested_params()
+        with self.lock:
+            self.params = params
+            self.round = params.first
+            self.fetched_at = time.monotonic()
+        return params
+
+    def follow_rounds(self):
+        while not self.stop_event.is_set():
+            try:
+                status = self.client.status_after_block(self.round)
+                if status["last-round"] > self.round:
+                    self.refresh()
+            except Exception:
+                # let the next get() refetch synchronously and back off before retrying
+                with self.lock:
+                    self.fetched_at = 0.0
+                self.stop_event.wait(1)
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.follow_rounds, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get(
+        self,
+        fee: int | None = None,
+        flat_fee: bool | None = None,
+        validity_rounds: int | None = None,
+        first_valid_offset: int = 0
+    ):
+        with self.lock:
+            params = self.params
+            is_stale = time.monotonic() - self.fetched_at > self.max_age_seconds
+
+        # the background thread keeps params fresh, otherwise fall back to a max age
+        if params is None or (is_stale and not (self.thread and self.thread.is_alive())):
+            params = self.refresh()
+        if self.refresh_in_background:
+            self.start()
+
+        params = copy.copy(params)
+        if fee is not None:
+            params.fee = fee
+            params.flat_fee = True if flat_fee is None else flat_fee
+        elif flat_fee is not None:
+            params.flat_fee = flat_fee
+
+        # a custom validity window lets batched submissions share params across rounds
+        params.first += first_valid_offset
+        if validity_rounds is not None:
+            params.last = params.first + validity_rounds
+        return params
+
+suggested_params_providers: dict[int, SuggestedParamsProvider] = {}
+
+def get_params_provider(algod_client: AlgodClient | None = None):
+    if algod_client is None:
+        algod_client = ALGOD_CLIENT
+    if id(algod_client) not in suggested_params_providers:
+        suggested_params_providers[id(algod_client)] = SuggestedParamsProvider(algod_client)
+    return suggested_params_providers[id(algod_client)]
+
+def get_suggested_params(algod_client: AlgodClient | None = None, **overrides):
+    return get_params_provider(algod_client).get(**overrides)
 
 class Main_Contract():
     def __init__(
@@ -43,7 +155,8 @@ class Main_Contract():
         gora_asset_id: int,
         main_approval_code: bytes,
         main_clear_code: bytes,
-        manager: str
+        manager: str,
+        app_id: int | None = None
     ):
         self.id = 0
         self.address = None
@@ -53,6 +166,14 @@ class Main_Contract():
         self.manager = manager
         self.init_processed = False
 
+        # an app that is already deployed and initialized (see deploy_diff.py)
+        if app_id is not None:
+            self.id = app_id
+            self.address = get_application_address(app_id)
+            self.owner = deployer
+            self.init_processed = True
+            return
+
         self._deploy(
             deployer,
             main_approval_code,
@@ -75,20 +196,11 @@ class Main_Contract():
             raise RuntimeError("Contract has already been deployed")
         
         else:
-            unsigned_txn = ApplicationCreateTxn(
-                sp=self.client.suggested_params(),
-                sender=user.address,
-                on_complete=OnComplete.NoOpOC,
-                approval_program=main_approval_code,
-                clear_program=main_clear_code,
-                extra_pages=3,
-                global_schema=StateSchema(13,3),
-                local_schema=StateSchema(7,4)
-            )
+            unsigned_txn = self.create_txn(user, main_approval_code, main_clear_code, get_suggested_params(self.client))
             signed_txn = unsigned_txn.sign(user.private_key)
 
             txid = self.client.send_transaction(signed_txn)
-            txn_result = wait_for_confirmation(self.client,txid,4)
+            txn_result = get_confirmation_service(self.client).wait(txid,4)
             
             self.id = txn_result["application-index"]
             self.address = get_application_address(self.id)
@@ -96,6 +208,45 @@ class Main_Contract():
 
             return self.id
     
+    @staticmethod
+    def create_txn(
+        user: Account,
+        main_approval_code: bytes,
+        main_clear_code: bytes,
+        sp=None
+    ):
+        return ApplicationCreateTxn(
+            sp=sp or get_suggested_params(),
+            sender=user.address,
+            on_complete=OnComplete.NoOpOC,
+            approval_program=main_approval_code,
+            clear_program=main_clear_code,
+            extra_pages=3,
+            global_schema=StateSchema(13,3),
+            local_schema=StateSchema(7,4)
+        )
+
+    def _update(
+        self,
+        user: Account,
+        main_approval_code: bytes,
+        main_clear_code: bytes,
+    ):
+        if self.id == 0:
+            raise RuntimeError("contract must be deployed first")
+
+        unsigned_txn = ApplicationUpdateTxn(
+            sp=get_suggested_params(self.client),
+            sender=user.address,
+            index=self.id,
+            approval_program=main_approval_code,
+            clear_program=main_clear_code
+        )
+        signed_txn = unsigned_txn.sign(user.private_key)
+
+        txid = self.client.send_transaction(signed_txn)
+        return get_confirmation_service(self.client).wait(txid,4)
+
     def _init(
         self,
         user:Account,
@@ -107,38 +258,54 @@ class Main_Contract():
             raise RuntimeError("contract has already been initiated")
         
         else:
-            path_to_abi_spec = protocol_filepath + "/assets/abi/main-contract.json"
-            sp = self.client.suggested_params()
-            sp.flat_fee = True
-            sp.fee = 2000
-
             init_group = AtomicTransactionComposer()
-            init_group.add_method_call(
-                app_id=self.id,
-                method=get_method_by_name(
-                    get_methods_list(path_to_abi_spec),
-                    "init"
-                ),
-                sender=user.address,
-                sp=sp,
-                signer=AccountTransactionSigner(user.private_key),
-                method_args=[
-                    self.gora_asset_id,
-                    self.manager
-                ]
-            )
-            response = init_group.execute(self.client,4)
+            self.compose_init(init_group, user)
+            response = execute_atc(self.client, init_group, 4)
             
             # update the contract object to show that it has been initialized
             self.init_processed = True
 
             return response.abi_results
     
+    # the compose_* methods add a call to someone else's group (see deploy_orchestrator.py)
+    def compose_init(
+        self,
+        atc:AtomicTransactionComposer,
+        user:Account,
+        sp=None
+    ):
+        atc.add_method_call(
+            app_id=self.id,
+            method=MAIN_METHODS["init"],
+            sender=user.address,
+            sp=sp or get_suggested_params(self.client, fee=2000),
+            signer=AccountTransactionSigner(user.private_key),
+            method_args=MainInitArgs(
+                token=self.gora_asset_id,
+                manager=self.manager
+            )
+        )
+        return atc
+
     def deposit_algo(
         self,
         user:Account,
         amount:int,
         address_if_other=None
+    ):
+        atc = AtomicTransactionComposer()
+        self.compose_deposit_algo(atc, user, amount, address_if_other)
+
+        result = execute_atc(self.client, atc, 4)
+        return result
+
+    def compose_deposit_algo(
+        self,
+        atc:AtomicTransactionComposer,
+        user:Account,
+        amount:int,
+        address_if_other=None,
+        sp=None
     ):
         # TODO: don't like how this is done and input naming is confusing
         # will need to change later
@@ -146,12 +313,11 @@ class Main_Contract():
 
         if type(address_if_other) is str:
             account_to_deposit_to = address_if_other
-        
-        atc = AtomicTransactionComposer()
 
+        sp = sp or get_suggested_params(self.client)
         unsigned_payment_txn = PaymentTxn(
             sender=user.address,
-            sp=self.client.suggested_params(),
+            sp=sp,
             receiver=get_application_address(self.id),
             amt=amount
         )
@@ -161,42 +327,48 @@ class Main_Contract():
             signer
         )
 
-        path_to_abi_spec = protocol_filepath + "/assets/abi/main-contract.json"
-        
         atc.add_method_call(
             app_id=self.id,
-            method=get_method_by_name(
-                get_methods_list(path_to_abi_spec),
-                "deposit_algo"
-            ),
+            method=MAIN_METHODS["deposit_algo"],
             sender=user.address,
-            sp=self.client.suggested_params(),
+            sp=sp,
             signer=signer,
-            method_args=[
-                signed_payment_txn,
-                account_to_deposit_to
-            ]
+            method_args=MainDepositAlgoArgs(
+                algorand_txn=signed_payment_txn,
+                account_to_deposit_to=account_to_deposit_to
+            )
         )
-
-        result = atc.execute(self.client,4)
-        return result
+        return atc
     
     def deposit_token(
         self,
         user:Account,
         amount:int,
         address_if_other=None
+    ):
+        atc = AtomicTransactionComposer()
+        self.compose_deposit_token(atc, user, amount, address_if_other)
+
+        result = execute_atc(self.client, atc, 4)
+        return result
+
+    def compose_deposit_token(
+        self,
+        atc:AtomicTransactionComposer,
+        user:Account,
+        amount:int,
+        address_if_other=None,
+        sp=None
     ):
         account_to_deposit_to = user.address
 
         if type(address_if_other) is str:
             account_to_deposit_to = address_if_other
-        
-        atc = AtomicTransactionComposer()
 
+        sp = sp or get_suggested_params(self.client)
         unsigned_transfer_txn = AssetTransferTxn(
             sender=user.address,
-            sp=self.client.suggested_params(),
+            sp=sp,
             receiver=get_application_address(self.id),
             amt=amount,
             index=self.gora_asset_id
@@ -207,26 +379,19 @@ class Main_Contract():
             signer
         )
 
-        path_to_abi_spec = protocol_filepath + "/assets/abi/main-contract.json"
-        
         atc.add_method_call(
             app_id=self.id,
-            method=get_method_by_name(
-                get_methods_list(path_to_abi_spec),
-                "deposit_token"
-            ),
+            method=MAIN_METHODS["deposit_token"],
             sender=user.address,
-            sp=self.client.suggested_params(),
+            sp=sp,
             signer=signer,
-            method_args=[
-                signed_transfer_txn,
-                self.gora_asset_id,
-                account_to_deposit_to
-            ]
+            method_args=MainDepositTokenArgs(
+                token_txn=signed_transfer_txn,
+                application_token=self.gora_asset_id,
+                account_to_deposit_to=account_to_deposit_to
+            )
         )
-
-        result = atc.execute(self.client,4)
-        return result
+        return atc
 
 def generate_account() -> Account:
     new_account = ga()
@@ -237,10 +402,25 @@ def generate_account() -> Account:
     # return conformed_account
     return Account(private_key=new_account[0],address=new_account[1])
 
+MAX_GROUP_SIZE = 16
+dispenser_accounts: dict[int, Account] = {}
+
+def get_dispenser(algod_client: AlgodClient | None = None):
+    # the dispenser lookup goes through KMD, so only do it once per client
+    if algod_client is None:
+        algod_client = ALGOD_CLIENT
+    if id(algod_client) not in dispenser_accounts:
+        if hasattr(algod_client, "dispenser"):
+            # FakeAlgodClient has no KMD and brings its own funded account
+            dispenser_accounts[id(algod_client)] = algod_client.dispenser
+        else:
+            dispenser_accounts[id(algod_client)] = algokit_utils.get_dispenser_account(algod_client)
+    return dispenser_accounts[id(algod_client)]
+
 def fund_account(receiver_address,amount:int):
     # get dispenser account
-    dispenser_account = algokit_utils.get_dispenser_account(ALGOD_CLIENT)
-    suggested_params = ALGOD_CLIENT.suggested_params()
+    dispenser_account = get_dispenser()
+    suggested_params = get_suggested_params()
 
     unsigned_txn = PaymentTxn(
         sender=dispenser_account.address,
@@ -251,12 +431,61 @@ def fund_account(receiver_address,amount:int):
     signed_txn = unsigned_txn.sign(dispenser_account.private_key)
 
     txid = ALGOD_CLIENT.send_transaction(signed_txn)
-    txn_result = wait_for_confirmation(ALGOD_CLIENT,txid,4)
+    txn_result = get_confirmation_service(ALGOD_CLIENT).wait(txid,4)
 
     return json.dumps(txn_result, indent=4)
 
+def fund_many(payments:list[tuple[str,int]], wait_rounds:int = 4):
+    """Fund many accounts from the dispenser in atomic groups of up to 16 payments.
+
+    Every group is submitted before any of them is awaited, so the whole batch
+    confirms in about as many rounds as a single payment. Returns the txids in order.
+    """
+    dispenser_account = get_dispenser()
+    suggested_params = get_suggested_params(validity_rounds=wait_rounds + 10)
+
+    unsigned_txns = []
+    seen_payments = set()
+    for index, (receiver_address, amount) in enumerate(payments):
+        # identical payments in one batch would have identical txids, so tell them apart
+        note = None
+        if (receiver_address, amount) in seen_payments:
+            note = f"fund_many:{index}".encode()
+        seen_payments.add((receiver_address, amount))
+
+        unsigned_txns.append(PaymentTxn(
+            sender=dispenser_account.address,
+            sp=suggested_params,
+            receiver=receiver_address,
+            amt=amount,
+            note=note
+        ))
+
+    # follow blocks from before the first send, since on dev mode every group is its own round
+    confirmation_service = get_confirmation_service(ALGOD_CLIENT)
+    confirmation_service.start()
+
+    group_txids = []
+    for start in range(0, len(unsigned_txns), MAX_GROUP_SIZE):
+        group = unsigned_txns[start:start + MAX_GROUP_SIZE]
+        if len(group) > 1:
+            group = assign_group_id(group)
+        signed_group = [txn.sign(dispenser_account.private_key) for txn in group]
+        ALGOD_CLIENT.send_transactions(signed_group)
+        group_txids.append([signed_txn.get_txid() for signed_txn in signed_group])
+
+    # groups confirm atomically, so watching one txn per group is enough
+    futures = [
+        confirmation_service.watch(txids[0], last_valid=suggested_params.last, fetch_info=False)
+        for txids in group_txids
+    ]
+    for future in futures:
+        future.result(timeout=max(wait_rounds, 1) * 10)
+
+    return [txid for txids in group_txids for txid in txids]
+
 def deploy_token(account:Account):
-    suggested_params = ALGOD_CLIENT.suggested_params()
+    suggested_params = get_suggested_params()
 
     unsigned_txn = AssetCreateTxn(
         asset_name="GORA",
@@ -272,7 +501,7 @@ def deploy_token(account:Account):
     signed_txn = unsigned_txn.sign(account.private_key)
 
     txid = ALGOD_CLIENT.send_transaction(signed_txn)
-    txn_result = wait_for_confirmation(ALGOD_CLIENT,txid,4)
+    txn_result = get_confirmation_service(ALGOD_CLIENT).wait(txid,4)
     asset_id = txn_result["asset-index"]
 
     # print(json.dumps(txn_result, indent=4))
@@ -305,7 +534,79 @@ def get_ABI_hash(file_path:str):
     h.update(sorted_abi_json_str.encode())
     return h.hexdigest()
 
-def compileTeal(program_source:bytes | str):
+TEAL_CACHE_DIR = os.environ.get("GORACLE_TEAL_CACHE_DIR", path + "/.teal_cache")
+TEAL_CACHE_MAX_BYTES = int(os.environ.get("GORACLE_TEAL_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+def get_avm_version(program_source:str):
+    match = re.match(r"\s*#pragma version (\d+)", program_source)
+    if match is None:
+        return 0
+    return int(match.group(1))
+
+def get_teal_cache_key(program_source:str, avm_version:int, source_map:bool = False):
+    h = SHA512.new(truncate="256")
+    # entries with a source map are kept apart, so a hit always has one when asked for
+    h.update(f"{avm_version}{' sourcemap' if source_map else ''}\n".encode())
+    h.update(program_source.encode())
+    return h.hexdigest()
+
+def read_teal_cache(cache_key:str):
+    cache_path = os.path.join(TEAL_CACHE_DIR, cache_key + ".json")
+    try:
+        with open(cache_path) as cache_file:
+            entry = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+    # bump the mtime so eviction treats this entry as recently used; another process may have
+    # evicted it since the read, which counts as a miss
+    try:
+        os.utime(cache_path)
+    except FileNotFoundError:
+        return None
+    return entry
+
+def write_teal_cache(cache_key:str, compile_response:dict):
+    os.makedirs(TEAL_CACHE_DIR, exist_ok=True)
+    cache_path = os.path.join(TEAL_CACHE_DIR, cache_key + ".json")
+
+    # write to a temp file first so a concurrent reader never sees half an entry
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as cache_file:
+        json.dump({key: compile_response[key] for key in ("result", "hash", "sourcemap") if key in compile_response}, cache_file)
+    os.replace(tmp_path, cache_path)
+
+    evict_teal_cache()
+
+def evict_teal_cache(max_bytes:int | None = None):
+    if max_bytes is None:
+        max_bytes = TEAL_CACHE_MAX_BYTES
+
+    entries = []
+    total_size = 0
+    for entry in os.scandir(TEAL_CACHE_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            # evicted by a concurrent build
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size += stat.st_size
+
+    # least recently used entries go first
+    entries.sort()
+    for _, size, entry_path in entries:
+        if total_size <= max_bytes:
+            break
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+def compileTeal(program_source:bytes | str, avm_version:int | None = None, use_cache:bool = True, source_map:bool = False):
     program_source_str = None
 
     if type(program_source) == bytes:
@@ -315,12 +616,25 @@ def compileTeal(program_source:bytes | str):
     else:
         raise TypeError(program_source)
 
-    compile_response = ALGOD_CLIENT.compile(program_source_str)
+    # the stand-in's compile output isn't real bytecode, keep it out of the shared cache
+    if not use_cache or is_fake_algod(ALGOD_CLIENT):
+        return ALGOD_CLIENT.compile(program_source_str, source_map=source_map)
+
+    if avm_version is None:
+        avm_version = get_avm_version(program_source_str)
+
+    # the result of /v2/teal/compile only depends on the source and the AVM version,
+    # so only go to algod when we haven't seen this exact program before
+    cache_key = get_teal_cache_key(program_source_str, avm_version, source_map)
+    compile_response = read_teal_cache(cache_key)
+    if compile_response is None:
+        compile_response = ALGOD_CLIENT.compile(program_source_str, source_map=source_map)
+        write_teal_cache(cache_key, compile_response)
 
     return compile_response
 
 def opt_in(token_id:int,user:Account):
-    suggested_params = ALGOD_CLIENT.suggested_params()
+    suggested_params = get_suggested_params()
 
     unsigned_txn = AssetTransferTxn(
         sp=suggested_params,
@@ -332,7 +646,7 @@ def opt_in(token_id:int,user:Account):
     signed_txn = unsigned_txn.sign(user.private_key)
 
     txid = ALGOD_CLIENT.send_transaction(signed_txn)
-    txn_result = wait_for_confirmation(ALGOD_CLIENT,txid,4)
+    txn_result = get_confirmation_service(ALGOD_CLIENT).wait(txid,4)
 
     return json.dumps(txn_result, indent=4)
 
@@ -342,7 +656,7 @@ def send_asa(
     asset_id,
     amount
 ):
-    suggested_params = ALGOD_CLIENT.suggested_params()
+    suggested_params = get_suggested_params()
 
     unsigned_txn = AssetTransferTxn(
         sp=suggested_params,
@@ -354,7 +668,7 @@ def send_asa(
     signed_txn = unsigned_txn.sign(main_account.private_key)
 
     txid = ALGOD_CLIENT.send_transaction(signed_txn)
-    txn_result = wait_for_confirmation(ALGOD_CLIENT,txid,4)
+    txn_result = get_confirmation_service(ALGOD_CLIENT).wait(txid,4)
 
     return json.dumps(txn_result, indent=4)
 
@@ -106,6 +106,7 @@ def write_table(table):
             json_table.append(base64.b64encode(entry).decode("utf8"))
         outfile.write(json.dumps(json_table))
 
-table = make_table(50, 7)
-write_table(table)
-# test(50, 7, 10_000)
\ No newline at end of file
+if __name__ == "__main__":
+    table = make_table(50, 7)
+    write_table(table)
+    # test(50, 7, 10_000)
\ No newline at end of file
@@ -6,7 +6,9 @@ from pyteal import *
 from typing import Literal as L
 from helpers.key_map import key_map
 sys.path.append(os.path.join(pathlib.Path(__file__).parent.resolve(),".."))
-from utils.gora_pyteal_utils import get_method_signature, SmartAssert, calc_box_cost
+from utils.gora_pyteal_utils import get_method_signature, SmartAssert, calc_box_cost, GlobalStateCache, template_int, template_bytes
+from utils.dispatch import apply_dispatch_mode
+from utils.teal_optimizer import apply_optimizer_mode
 from utils.abi_types import RequestInfo, StakeHistoryTuple,LocalHistoryEntry,ProposalsEntry
 
 hash_type = abi.StaticBytes[L[32]]
@@ -62,9 +64,10 @@ def approval_program(
     VOTE_APPROVAL_PROGRAM,
     VOTE_CLEAR_PROGRAM
 ):
-    TOKEN_ASSET_ID_INT = Int(TOKEN_ASSET_ID)
-    CONTRACT_VERSION_BYTES = Bytes(CONTRACT_VERSION)
-    MINIMUM_STAKE_INT = Int(MINIMUM_STAKE)
+    # any of these can be a TMPL_* name instead, for builds that are patched at deploy time
+    TOKEN_ASSET_ID_INT = template_int(TOKEN_ASSET_ID)
+    CONTRACT_VERSION_BYTES = template_bytes(CONTRACT_VERSION)
+    MINIMUM_STAKE_INT = template_int(MINIMUM_STAKE)
 
     @Subroutine(TealType.none)
     def populate_request_info_tmps(request_key_hash):
@@ -73,7 +76,7 @@ def approval_program(
             SmartAssert(request_box.hasValue(),"BOX DOES NOT EXIST"),
             request_len := BoxLen(request_key_hash),
             is_history.set(False),
-            If(request_len.value()).Then(is_history.decode(App.box_extract(request_key_hash, Int(abi.size_of(ProposalsEntry)) - Int(abi.size_of(abi.Bool)), Int(abi.size_of(abi.Bool))))),
+            If(request_len.value()).Then(is_history.decode(App.box_extract(request_key_hash, Int(abi.size_of(ProposalsEntry) - abi.size_of(abi.Bool)), Int(abi.size_of(abi.Bool))))),
             SmartAssert(Not(is_history.get()), "REQUEST_ALREADY_COMPLETED"),
             current_request_info.decode(request_box.value()),
             current_request_info.request_status.store_into(status_abi),
@@ -196,19 +199,21 @@ def approval_program(
     # => number_of_requests_until_threshold = (vote_refill_amount - vote_refill_threshold)
     # => x = 10,000 - 10 = 9990
 
-    number_of_requests_until_threshold = App.globalGet(global_keys["vote_refill_amount"]) - App.globalGet(global_keys["vote_refill_threshold"])
-    vote_refill_fund_fee = Seq(
-        If(App.globalGet(global_keys["vote_refill_amount"]) < App.globalGet(global_keys["vote_refill_threshold"])).
-        Then(
-            Int(0) # TODO: not sure how we want to handle this.
-        ).
-        Else(
-            App.globalGet(global_keys["vote_refill_amount"])*Global.min_txn_fee() / number_of_requests_until_threshold
+    def vote_refill_fund_fee(settings):
+        number_of_requests_until_threshold = settings.get("vote_refill_amount") - settings.get("vote_refill_threshold")
+        return Seq(
+            If(settings.get("vote_refill_amount") < settings.get("vote_refill_threshold")).
+            Then(
+                Int(0) # TODO: not sure how we want to handle this.
+            ).
+            Else(
+                settings.get("vote_refill_amount")*Global.min_txn_fee() / number_of_requests_until_threshold
+            )
         )
-    )
 
     @Subroutine(TealType.none)
     def request(request, destination, type, key, app_refs, asset_refs, account_refs, box_refs):
+        settings = GlobalStateCache(global_keys)
         account_algo = App.localGet(Txn.sender(), local_keys["account_algo"])
         account_token_amount = App.localGet(Txn.sender(), local_keys["account_token_amount"])
         algo_fee_sink_balance = App.globalGet(global_keys["algo_fee_sink"])
@@ -218,15 +223,16 @@ def approval_program(
         account_refs_length = Len(account_refs) / Int(32)
         box_refs_length = If(Len(box_refs) > Int(0)).Then(Btoi(Extract(box_refs, Int(0), Int(2)))).Else(Int(0))
         total_refs_length = (app_refs_length + asset_refs_length + account_refs_length + box_refs_length)
-        total_cost_of_request = App.globalGet(global_keys["algo_request_fee"]) + calc_box_cost(abi.size_of(hash_type),abi.size_of(RequestInfo))
+        settings.define("total_cost_of_request", settings.get("algo_request_fee") + calc_box_cost(abi.size_of(hash_type),abi.size_of(RequestInfo)))
 
         return Seq([
+            settings.load(),
             # check length of refs
             Assert(total_refs_length <= Int(4)),
             request_abi.set(Txn.tx_id()),
             app_abi.set(0),
             round_abi.set(Global.round()),
-            requester_algo_fee_abi.set(App.globalGet(global_keys["algo_request_fee"])),
+            requester_algo_fee_abi.set(settings.get("algo_request_fee")),
             total_votes_abi.set(0),
             total_votes_refunded_abi.set(0),
             status_abi.set(request_status["request_made"]),
@@ -260,12 +266,13 @@ def approval_program(
                 total_votes_abi,
                 total_votes_refunded_abi
             ),
-            SmartAssert(account_algo >= total_cost_of_request, "NOT ENOUGH ALGO"), # TODO: do we even need to assert this since the amount would result in negative if not enough or maybe its for the nr?
-            SmartAssert(account_token_amount >= App.globalGet(global_keys["gora_request_fee"])),
-            App.localPut(Txn.sender(), local_keys["account_algo"], account_algo - total_cost_of_request),
-            App.localPut(Txn.sender(), local_keys["account_token_amount"], account_token_amount - App.globalGet(global_keys["gora_request_fee"])),
-            App.globalPut(global_keys["algo_fee_sink"], algo_fee_sink_balance + (App.globalGet(global_keys["algo_request_fee"]) - vote_refill_fund_fee)),
-            App.globalPut(global_keys["token_fee_sink"], token_fee_sink_balance + App.globalGet(global_keys["gora_request_fee"])),
+            settings.load("total_cost_of_request"),
+            SmartAssert(account_algo >= settings.get("total_cost_of_request"), "NOT ENOUGH ALGO"), # TODO: do we even need to assert this since the amount would result in negative if not enough or maybe its for the nr?
+            SmartAssert(account_token_amount >= settings.get("gora_request_fee")),
+            App.localPut(Txn.sender(), local_keys["account_algo"], account_algo - settings.get("total_cost_of_request")),
+            App.localPut(Txn.sender(), local_keys["account_token_amount"], account_token_amount - settings.get("gora_request_fee")),
+            App.globalPut(global_keys["algo_fee_sink"], algo_fee_sink_balance + (settings.get("algo_request_fee") - vote_refill_fund_fee(settings))),
+            App.globalPut(global_keys["token_fee_sink"], token_fee_sink_balance + settings.get("gora_request_fee")),
             Assert(App.box_create(new_key_hash.get(), Int(abi.size_of(RequestInfo)))),
             App.box_put(new_key_hash.get(), current_request_info.encode()),
         ])
@@ -283,15 +290,20 @@ def approval_program(
 
     @Subroutine(TealType.none)
     def refund_request(requester, request_key_hash):
+        settings = GlobalStateCache(global_keys)
         account_algo = App.localGet(Txn.sender(), local_keys["account_algo"])
         account_token = App.localGet(Txn.sender(), local_keys["account_token_amount"])
         algo_fee_sink_balance = App.globalGet(global_keys["algo_fee_sink"])
         token_fee_sink_balance = App.globalGet(global_keys["token_fee_sink"])
 
+        for currency_key in ("algo_request_fee", "gora_request_fee"):
+            settings.define("refund_" + currency_key, (settings.get("refund_request_made_percentage") * settings.get(currency_key)) / Int(100))
+
         def refund(currency_key):
-            return ((App.globalGet(global_keys["refund_request_made_percentage"]) * App.globalGet(currency_key)) / Int(100))
+            return settings.get("refund_" + currency_key)
 
         return Seq([
+            settings.load(),
             populate_request_info_tmps(request_key_hash),
             Assert(Or(status_abi.get() == request_status["request_made"], status_abi.get() == request_status["processing"])),
             Assert(
@@ -301,25 +313,27 @@ def approval_program(
                     Txn.sender() == requester,
                     Txn.rekey_to()==Global.zero_address(),
                     Txn.lease()==Global.zero_address(),
-                    Add(round_abi.get(), App.globalGet(global_keys["time_lock"])) < Global.round(), # request timeout
+                    Add(round_abi.get(), settings.get("time_lock")) < Global.round(), # request timeout
                 )
             ),
             If(status_abi.get() == request_status["request_made"])
             .Then(Seq([
-                App.localPut(Txn.sender(), local_keys["account_algo"], account_algo + refund(global_keys["algo_request_fee"])),
-                App.localPut(Txn.sender(), local_keys["account_token_amount"], account_token + refund(global_keys["gora_request_fee"])),
-                App.globalPut(global_keys["algo_fee_sink"], algo_fee_sink_balance - (refund(global_keys["algo_request_fee"]) - vote_refill_fund_fee)),
-                App.globalPut(global_keys["token_fee_sink"], token_fee_sink_balance - refund(global_keys["gora_request_fee"])),
+                settings.load("refund_algo_request_fee", "refund_gora_request_fee", "vote_refill_amount"),
+                App.localPut(Txn.sender(), local_keys["account_algo"], account_algo + refund("algo_request_fee")),
+                App.localPut(Txn.sender(), local_keys["account_token_amount"], account_token + refund("gora_request_fee")),
+                App.globalPut(global_keys["algo_fee_sink"], algo_fee_sink_balance - (refund("algo_request_fee") - vote_refill_fund_fee(settings))),
+                App.globalPut(global_keys["token_fee_sink"], token_fee_sink_balance - refund("gora_request_fee")),
                 refund_request_box(requester)
             ]))
             .ElseIf(status_abi.get() == request_status["processing"])
             .Then(Seq([
+                settings.load("refund_gora_request_fee"),
                 App.localPut(
                     Txn.sender(),
                     local_keys["account_token_amount"],
-                    account_token + refund(global_keys["gora_request_fee"])
+                    account_token + refund("gora_request_fee")
                 ),
-                App.globalPut(global_keys["token_fee_sink"], token_fee_sink_balance - refund(global_keys["gora_request_fee"])),
+                App.globalPut(global_keys["token_fee_sink"], token_fee_sink_balance - refund("gora_request_fee")),
                 status_abi.set(request_status["refunded"]),
                 App.box_replace(key_hash.get(),Int(48),status_abi.encode())
             ]))
@@ -636,8 +650,8 @@ def approval_program(
             ])),
         ])
 
-    vote_approval_program = Bytes("base64",VOTE_APPROVAL_PROGRAM) # Python conversion from base64 to Byte[] then to Bytes()
-    vote_clear_program = Bytes("base64",VOTE_CLEAR_PROGRAM)
+    vote_approval_program = template_bytes(VOTE_APPROVAL_PROGRAM, "base64") # Python conversion from base64 to Byte[] then to Bytes()
+    vote_clear_program = template_bytes(VOTE_CLEAR_PROGRAM, "base64")
 
     @Subroutine(TealType.none)
     def update_rewards(rewards_account:Expr,previous_vote_bytes:Expr,previous_vote_requester:Expr):
@@ -664,7 +678,7 @@ def approval_program(
             (completed_request_len := BoxLen(key_hash.get())),
             
             previous_is_history.set(False),
-            If(completed_request_len.value()).Then(previous_is_history.decode(App.box_extract(key_hash.get(), Int(abi.size_of(ProposalsEntry)) - Int(abi.size_of(abi.Bool)), Int(abi.size_of(abi.Bool))))),
+            If(completed_request_len.value()).Then(previous_is_history.decode(App.box_extract(key_hash.get(), Int(abi.size_of(ProposalsEntry) - abi.size_of(abi.Bool)), Int(abi.size_of(abi.Bool))))),
             If(previous_is_history.get())
             .Then(Seq([
                 (get_completed_request_info := App.box_get(key_hash.get())),
@@ -1155,4 +1169,7 @@ def approval_program(
 
 if __name__ == "__main__":
     params = yaml.safe_load(sys.argv[1])
-    print(compileTeal(approval_program(**params), Mode.Application, version = 8))
\ No newline at end of file
+    # GORACLE_DISPATCH_MODE=match compiles handle_noop into a jump table, see utils/dispatch.py,
+    # and GORACLE_TEAL_OPTIMIZE=1 runs the peephole optimizer, see utils/teal_optimizer.py
+    teal = compileTeal(approval_program(**params), Mode.Application, version = 8)
+    print(apply_optimizer_mode(apply_dispatch_mode(teal, "main_approval")))
\ No newline at end of file
@@ -10,7 +10,9 @@ from helpers.key_map import key_map
 from typing import Literal as L
 
 sys.path.append(os.path.join(pathlib.Path(__file__).parent.resolve(),".."))
-from utils.gora_pyteal_utils import get_method_signature, SmartAssert, calc_box_cost
+from utils.gora_pyteal_utils import get_method_signature, SmartAssert, box_cost, calc_box_cost, template_addr, template_bytes
+from utils.dispatch import apply_dispatch_mode
+from utils.teal_optimizer import apply_optimizer_mode
 from utils.abi_types import RequestInfo, StakeHistoryTuple, LocalHistoryEntry, ProposalsEntry, ResponseBody
 
 def GetEnv(name):
@@ -82,9 +84,9 @@ delete_box_selector = MethodSignature(get_method_signature("delete_box","voting"
 reset_previous_vote_selector = MethodSignature(get_method_signature("reset_previous_vote","voting"))
 
 def approval_program(CONTRACT_VERSION, VOTE_VERIFY_LSIG_ADDRESS, DEV_MODE=False):
-    CONTRACT_VERSION_BYTES = Bytes(CONTRACT_VERSION)
+    CONTRACT_VERSION_BYTES = template_bytes(CONTRACT_VERSION)
     MAIN_APP = App.globalGet(global_keys["main_app"])
-    VOTE_VERIFY_LSIG_ADDRESS = Addr(VOTE_VERIFY_LSIG_ADDRESS)
+    VOTE_VERIFY_LSIG_ADDRESS = template_addr(VOTE_VERIFY_LSIG_ADDRESS)
     vote_verify_txn = Gtxn[Txn.group_index()-Int(1)]
     @Subroutine(TealType.anytype)
     def get_primary_account(primary_account_arg_index:Expr):
@@ -155,7 +157,7 @@ def approval_program(CONTRACT_VERSION, VOTE_VERIFY_LSIG_ADDRESS, DEV_MODE=False)
             SmartAssert(payment_txn.sender()==Txn.sender()),
             SmartAssert(payment_txn.type_enum()==TxnType.Payment),
             SmartAssert(payment_txn.receiver()==Global.current_application_address()),
-            SmartAssert(payment_txn.amount()==calc_box_cost(abi.size_of(hash_type), abi.size_of(ProposalsEntry)) + calc_box_cost(32, abi.size_of(LocalHistoryEntry))),
+            SmartAssert(payment_txn.amount()==Int(box_cost(abi.size_of(hash_type), abi.size_of(ProposalsEntry)) + box_cost(32, abi.size_of(LocalHistoryEntry)))),
             SmartAssert(payment_txn.close_remainder_to()==Global.zero_address()),
             SmartAssert(payment_txn.rekey_to()==Global.zero_address()),
             SmartAssert(payment_txn.lease()==Global.zero_address())
@@ -723,6 +725,9 @@ def approval_program(CONTRACT_VERSION, VOTE_VERIFY_LSIG_ADDRESS, DEV_MODE=False)
 if __name__ == "__main__":
     params = yaml.safe_load(sys.argv[1])
     optimize_options = OptimizeOptions(scratch_slots=True)
-    print(compileTeal(approval_program(
+    teal = compileTeal(approval_program(
         **params,
-    ), Mode.Application, version = 8, optimize=optimize_options))
\ No newline at end of file
+    ), Mode.Application, version = 8, optimize=optimize_options)
+    # GORACLE_DISPATCH_MODE=match compiles on_noop into a jump table, see utils/dispatch.py,
+    # and GORACLE_TEAL_OPTIMIZE=1 runs the peephole optimizer, see utils/teal_optimizer.py
+    print(apply_optimizer_mode(apply_dispatch_mode(teal, "voting_approval")))
\ No newline at end of file
@@ -0,0 +1,1794 @@
+# pylint: disable=C0114,C0116,C0115,C0103,C0301,R0902,R0903,R0911,R0912,R0913,R0914,R0915,W0613
+"""
+Pure-Python AVM v8 interpreter for running and costing the Gora contracts offline.
+
+Programs are interpreted from their TEAL source (as produced by pyteal), pre-decoded once
+into a list of (handler, immediates, cost) so repeated calls are cheap. Ledger state lives
+in `Ledger`; every mutation is journaled so a failed group rolls back like it would on chain.
+
+Coverage is the opcode subset the Gora contracts use plus their neighbours: integer, byte
+and byte-math ops, scratch, frames and subroutines, txn/gtxn/global fields, app global and
+local state, boxes, inner transactions, logs and hashes. `vrf_verify` has no pure-Python
+ECVRF implementation here: it calls `AVM.vrf_verifier(message, proof, public_key)`, which by
+default accepts every proof and derives a deterministic output from it.
+"""
+import os
+import re
+import copy
+import base64
+import pickle
+import hashlib
+import math
+import runpy
+from dataclasses import dataclass, field
+
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+
+from .teal_cost import (
+    OPCODE_COSTS,
+    TealProgram,
+    decode_byte_constant,
+    parse_int_constant,
+    split_teal_line,
+)
+
+APP_CALL_BUDGET = 700
+LSIG_BUDGET = 20000
+MAX_UINT64 = 2**64 - 1
+MAX_STACK_BYTES = 4096
+MAX_LOGS = 32
+MAX_LOG_BYTES = 1024
+MAX_INNER_DEPTH = 8
+MIN_TXN_FEE = 1000
+MIN_BALANCE = 100_000
+ZERO_ADDRESS = bytes(32)
+
+TXN_TYPES = {"pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6}
+ARRAY_FIELDS = ("ApplicationArgs", "Accounts", "Applications", "Assets", "Logs")
+
+class AVMError(Exception):
+    def __init__(self, message: str, pc: int | None = None, line: int | None = None):
+        self.reason = message
+        self.pc = pc
+        self.line = line
+        details = f". Details: pc={pc}" if pc is not None else ""
+        if line is not None:
+            details += f", line={line}"
+        super().__init__(f"logic eval error: {message}{details}")
+
+def sha512_256(data: bytes):
+    return hashlib.new("sha512_256", data).digest()
+
+def itob(value: int):
+    return value.to_bytes(8, "big")
+
+def app_address(app_id: int):
+    return sha512_256(b"appID" + itob(app_id))
+
+def to_address_bytes(address):
+    if isinstance(address, bytes):
+        return address
+    # 58 character base32 address with checksum
+    return base64.b32decode(address + "=" * (-len(address) % 8))[:32]
+
+def load_key_map(key_map_path: str | None = None):
+    """key_map from protocol/assets/helpers/key_map.py with the pyteal Bytes/Int turned into bytes/int."""
+    if key_map_path is None:
+        key_map_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "helpers", "key_map.py")
+    raw_key_map = runpy.run_path(key_map_path)["key_map"]
+    key_map = {}
+    for section, entries in raw_key_map.items():
+        key_map[section] = {}
+        for name, expr in entries.items():
+            if hasattr(expr, "byte_str"):
+                if expr.base == "utf8":
+                    key_map[section][name] = decode_byte_constant([expr.byte_str])
+                elif expr.base == "base16":
+                    key_map[section][name] = bytes.fromhex(expr.byte_str.removeprefix("0x"))
+                else:
+                    key_map[section][name] = decode_byte_constant([expr.base, expr.byte_str])
+            else:
+                key_map[section][name] = expr.value
+    return key_map
+
+# -- state --
+
+MISSING = object()
+
+@dataclass
+class StateAccess:
+    global_reads: int = 0
+    global_writes: int = 0
+    local_reads: int = 0
+    local_writes: int = 0
+    box_reads: int = 0
+    box_writes: int = 0
+    box_creates: int = 0
+    box_deletes: int = 0
+    boxes: set = field(default_factory=set)
+
+    def merge(self, other):
+        for name in ("global_reads", "global_writes", "local_reads", "local_writes", "box_reads", "box_writes", "box_creates", "box_deletes"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.boxes |= other.boxes
+
+class Ledger():
+    """Accounts, apps and assets, with a write journal for group rollback.
+
+    Accounts are keyed by their 32 byte public key:
+        {"balance": int, "assets": {asset_id: amount}, "locals": {app_id: {key: value}}}
+    Apps are keyed by id:
+        {"creator", "approval", "clear", "globals", "boxes", "global_schema", "local_schema", "extra_pages"}
+    """
+
+    def __init__(self, round_number: int = 1000, timestamp: int = 1_700_000_000):
+        self.round = round_number
+        self.timestamp = timestamp
+        self.accounts: dict[bytes, dict] = {}
+        self.apps: dict[int, dict] = {}
+        self.assets: dict[int, dict] = {}
+        self.block_seeds: dict[int, bytes] = {}
+        self.next_index = 1000
+        # compiled bytecode -> Program, so inner app creates can find the TEAL they run
+        self.programs: dict[bytes, "Program"] = {}
+        self.journal: list = []
+
+    # journaled primitives, every mutation below goes through these
+
+    def write(self, container: dict, key, value):
+        self.journal.append((container, key, container.get(key, MISSING)))
+        container[key] = value
+
+    def remove(self, container: dict, key):
+        if key in container:
+            self.journal.append((container, key, container[key]))
+            del container[key]
+
+    def checkpoint(self):
+        return len(self.journal)
+
+    def rollback(self, checkpoint: int):
+        while len(self.journal) > checkpoint:
+            container, key, old_value = self.journal.pop()
+            if old_value is MISSING:
+                container.pop(key, None)
+            else:
+                container[key] = old_value
+
+    def commit(self):
+        self.journal.clear()
+
+    # accounts
+
+    def account(self, address: bytes):
+        address = to_address_bytes(address)
+        if address not in self.accounts:
+            self.write(self.accounts, address, {"balance": 0, "assets": {}, "locals": {}})
+        return self.accounts[address]
+
+    def fund(self, address, amount: int):
+        account = self.account(address)
+        self.write(account, "balance", account["balance"] + amount)
+
+    def min_balance(self, address: bytes):
+        account = self.account(address)
+        total = MIN_BALANCE + MIN_BALANCE * len(account["assets"])
+        for app_id in account["locals"]:
+            uints, byte_slices = self.apps.get(app_id, {}).get("local_schema", (0, 0))
+            total += 100_000 + 28_500 * uints + 50_000 * byte_slices
+        for app_id, app in self.apps.items():
+            if app["creator"] == address:
+                uints, byte_slices = app["global_schema"]
+                total += 100_000 * (1 + app["extra_pages"]) + 28_500 * uints + 50_000 * byte_slices
+            if app_address(app_id) == address:
+                total += sum(2500 + 400 * (len(name) + len(value)) for name, value in app["boxes"].items())
+        return total
+
+    # apps and assets
+
+    def new_index(self):
+        self.next_index += 1
+        return self.next_index
+
+    def register_program(self, program: "Program", bytecode: bytes | None = None):
+        self.programs[bytecode if bytecode is not None else program.source_hash] = program
+        return program
+
+    def create_app(
+        self,
+        creator,
+        approval: "Program",
+        clear: "Program | None" = None,
+        app_id: int | None = None,
+        global_schema: tuple[int, int] = (64, 64),
+        local_schema: tuple[int, int] = (16, 16),
+        extra_pages: int = 0,
+        globals_: dict | None = None
+    ):
+        """Install an app directly, without running its create call (state can be set with set_globals)."""
+        if app_id is None:
+            app_id = self.new_index()
+        self.write(self.apps, app_id, {
+            "creator": to_address_bytes(creator),
+            "approval": approval,
+            "clear": clear,
+            "globals": dict(globals_ or {}),
+            "boxes": {},
+            "global_schema": global_schema,
+            "local_schema": local_schema,
+            "extra_pages": extra_pages,
+        })
+        self.account(app_address(app_id))
+        return app_id
+
+    def create_asset(self, creator, total: int = 10**16, decimals: int = 6, unit_name: bytes = b"GORA", name: bytes = b"GORA", asset_id: int | None = None):
+        if asset_id is None:
+            asset_id = self.new_index()
+        creator = to_address_bytes(creator)
+        self.write(self.assets, asset_id, {
+            "creator": creator, "total": total, "decimals": decimals, "unit_name": unit_name, "name": name,
+        })
+        self.write(self.account(creator)["assets"], asset_id, total)
+        return asset_id
+
+    def opt_in_asset(self, address, asset_id: int):
+        self.account(address)["assets"].setdefault(asset_id, 0)
+
+    def opt_in_app(self, address, app_id: int, locals_: dict | None = None):
+        account = self.account(address)
+        self.write(account["locals"], app_id, dict(locals_ or {}))
+
+    def replace_programs(self, replacements: dict[bytes, "Program"]):
+        """Swap programs by the source_hash of the one they replace, e.g. an optimized build."""
+        for app in self.apps.values():
+            for name in ("approval", "clear"):
+                if app[name] is not None and app[name].source_hash in replacements:
+                    app[name] = replacements[app[name].source_hash]
+        for bytecode, program in self.programs.items():
+            if program.source_hash in replacements:
+                self.programs[bytecode] = replacements[program.source_hash]
+
+    def state(self):
+        """Plain-data view of balances, holdings, local/global state and boxes, for comparisons."""
+        return {
+            "accounts": {
+                address: (account["balance"], dict(account["assets"]), {app_id: dict(values) for app_id, values in account["locals"].items()})
+                for address, account in self.accounts.items()
+            },
+            "apps": {app_id: (dict(app["globals"]), dict(app["boxes"])) for app_id, app in self.apps.items()},
+        }
+
+    def set_globals(self, app_id: int, values: dict, key_names: dict | None = None):
+        """Set global state; with key_names (e.g. load_key_map()["main_global"]) values may use key_map names."""
+        app_globals = self.apps[app_id]["globals"]
+        for key, value in values.items():
+            key = key_names.get(key, key) if key_names else key
+            self.write(app_globals, key if isinstance(key, bytes) else key.encode(), value)
+
+    def set_locals(self, address, app_id: int, values: dict, key_names: dict | None = None):
+        app_locals = self.account(address)["locals"][app_id]
+        for key, value in values.items():
+            key = key_names.get(key, key) if key_names else key
+            self.write(app_locals, key if isinstance(key, bytes) else key.encode(), value)
+
+# -- programs --
+
+@dataclass
+class Op:
+    name: str
+    line: int
+    handler: object = None
+    immediates: object = None
+    cost: int = 1
+
+class Program():
+    def __init__(self, teal: str, name: str = "program"):
+        self.name = name
+        self.teal = teal
+        self.source_hash = sha512_256(teal.encode())
+        self.version = 1
+        self.labels: dict[str, int] = {}
+        self.ops: list[Op] = []
+        self.code: list[tuple] = []
+        self.assemble()
+
+    def assemble(self):
+        for line_number, line in enumerate(self.teal.splitlines(), start=1):
+            tokens = split_teal_line(line)
+            if not tokens:
+                continue
+            if tokens[0] == "#pragma":
+                if tokens[1] == "version":
+                    self.version = int(tokens[2])
+                continue
+            while tokens and tokens[0].endswith(":"):
+                self.labels[tokens[0][:-1]] = len(self.ops)
+                tokens = tokens[1:]
+            if not tokens:
+                continue
+            self.ops.append(Op(tokens[0], line_number, immediates=tokens[1:], cost=OPCODE_COSTS.get(tokens[0], 1)))
+
+        for op in self.ops:
+            if op.name not in OPCODES:
+                raise AVMError(f"unsupported opcode {op.name}", line=op.line)
+            handler, parse = OPCODES[op.name]
+            op.handler = handler
+            op.immediates = parse(self, op.immediates) if parse else None
+        if self.ops:
+            # the intcblock/bytecblock the assembler adds for repeated pseudo-op constants
+            self.ops[0].cost += TealProgram(self.teal).implied_constant_blocks
+        self.code = [(op.handler, op.immediates, op.cost) for op in self.ops]
+
+    # pickled (and deep-copied) as source, the decoded code holds closures
+    def __getstate__(self):
+        return {"teal": self.teal, "name": self.name}
+
+    def __setstate__(self, state):
+        self.__init__(state["teal"], state["name"])
+
+    def label_pc(self, label: str):
+        if label not in self.labels:
+            raise AVMError(f"reference to undefined label {label}")
+        return self.labels[label]
+
+# -- execution --
+
+@dataclass
+class CallResult:
+    txn_index: int
+    app_id: int
+    ok: bool = True
+    error: str | None = None
+    cost: int = 0
+    logs: list = field(default_factory=list)
+    state_access: StateAccess = field(default_factory=StateAccess)
+    inner: list = field(default_factory=list)
+    created_app_id: int = 0
+
+    @property
+    def total_cost(self):
+        return self.cost + sum(inner.total_cost for inner in self.inner)
+
+@dataclass
+class GroupResult:
+    ok: bool
+    error: str | None
+    calls: list[CallResult]
+    budget: int
+    cost: int
+    lsig_costs: dict = field(default_factory=dict)
+
+class Budget():
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+
+class Frame():
+    __slots__ = ("return_pc", "height", "args", "returns", "has_proto")
+
+    def __init__(self, return_pc: int, height: int):
+        self.return_pc = return_pc
+        self.height = height
+        self.args = 0
+        self.returns = 0
+        self.has_proto = False
+
+class Machine():
+    """One program evaluation for one transaction of a group."""
+
+    def __init__(self, avm: "AVM", program: Program, group: list[dict], index: int, budget: Budget, mode: str = "app", app_id: int = 0, caller_app_id: int = 0, depth: int = 0):
+        self.avm = avm
+        self.ledger = avm.ledger
+        self.program = program
+        self.group = group
+        self.index = index
+        self.txn = group[index]
+        self.budget = budget
+        self.mode = mode
+        self.app_id = app_id
+        self.caller_app_id = caller_app_id
+        self.depth = depth
+        self.stack: list = []
+        self.scratch = [0] * 256
+        self.frames: list[Frame] = []
+        self.intc: list[int] = []
+        self.bytec: list[bytes] = []
+        self.pc = 0
+        self.cost = 0
+        self.logs: list[bytes] = []
+        self.state_access = StateAccess()
+        self.inner_group: list[dict] | None = None
+        self.last_inner_group: list[dict] = []
+        self.inner_results: list[CallResult] = []
+        self.finished = False
+
+    def fail(self, message: str):
+        line = self.program.ops[self.pc - 1].line if 0 < self.pc <= len(self.program.ops) else None
+        raise AVMError(message, self.pc - 1, line)
+
+    def run(self):
+        code = self.program.code
+        end = len(code)
+        stack = self.stack
+        budget = self.budget
+        pc = 0
+        while not self.finished:
+            if pc >= end:
+                if len(stack) != 1:
+                    self.pc = pc
+                    self.fail(f"stack len is {len(stack)} instead of 1")
+                break
+            handler, immediates, cost = code[pc]
+            self.cost += cost
+            budget.used += cost
+            if budget.used > budget.limit:
+                self.pc = pc + 1
+                self.fail(f"dynamic cost budget exceeded, executing {self.program.ops[pc].name}: local program cost was {self.cost}")
+            self.pc = pc + 1
+            try:
+                handler(self, immediates)
+            except IndexError:
+                # a pop from an empty stack or an out of range index: the program is at fault, not the interpreter
+                self.fail(f"stack underflow or index out of range in {self.program.ops[pc].name}")
+            pc = self.pc
+
+        if not stack:
+            self.fail("stack is empty at end of program")
+        result = stack[-1]
+        if not isinstance(result, int):
+            self.fail("stack finished with bytes not int")
+        return result != 0
+
+    # stack helpers
+
+    def pop_int(self):
+        value = self.stack.pop()
+        if not isinstance(value, int):
+            self.fail(f"{self.program.ops[self.pc - 1].name} arg is bytes, expected uint64")
+        return value
+
+    def pop_bytes(self):
+        value = self.stack.pop()
+        if not isinstance(value, bytes):
+            self.fail(f"{self.program.ops[self.pc - 1].name} arg is uint64, expected []byte")
+        return value
+
+    def push(self, value):
+        if isinstance(value, bytes) and len(value) > MAX_STACK_BYTES:
+            self.fail(f"{self.program.ops[self.pc - 1].name} produced a too big ({len(value)}) byte-array")
+        self.stack.append(value)
+
+    # reference resolution
+
+    def resolve_account(self, value):
+        if isinstance(value, bytes):
+            return value
+        accounts = self.txn.get("Accounts", [])
+        if value == 0:
+            return self.txn["Sender"]
+        if value <= len(accounts):
+            return accounts[value - 1]
+        self.fail(f"invalid Account reference {value}")
+
+    def resolve_app(self, value: int):
+        apps = self.txn.get("Applications", [])
+        if value == 0:
+            return self.app_id
+        if value <= len(apps):
+            return apps[value - 1]
+        return value
+
+    def resolve_asset(self, value: int):
+        assets = self.txn.get("Assets", [])
+        if value < len(assets):
+            return assets[value]
+        return value
+
+    def app_globals(self, app_id: int):
+        app = self.ledger.apps.get(app_id)
+        return None if app is None else app["globals"]
+
+    def app_locals(self, account: bytes, app_id: int):
+        return self.ledger.account(account)["locals"].get(app_id)
+
+    def current_box(self, name: bytes):
+        if not 1 <= len(name) <= 64:
+            self.fail("box names must be 1-64 bytes long")
+        self.state_access.boxes.add((self.app_id, name))
+        return self.ledger.apps[self.app_id]["boxes"]
+
+# -- immediate parsers --
+
+def parse_none(program, args):
+    return None
+
+def parse_int(program, args):
+    return int(args[0], 0)
+
+def parse_two_ints(program, args):
+    return (int(args[0], 0), int(args[1], 0))
+
+def parse_int_constant_arg(program, args):
+    return parse_int_constant(args[0])
+
+def parse_bytes(program, args):
+    return decode_byte_constant(args)
+
+def parse_addr(program, args):
+    return to_address_bytes(args[0])
+
+def parse_method(program, args):
+    return sha512_256(args[0].strip('"').encode())[:4]
+
+def parse_label(program, args):
+    return program.label_pc(args[0])
+
+def parse_labels(program, args):
+    return [program.label_pc(label) for label in args]
+
+def parse_field(program, args):
+    return args[0]
+
+def parse_field_index(program, args):
+    return (args[0], int(args[1]))
+
+def parse_group_field(program, args):
+    return (int(args[0]), args[1])
+
+def parse_group_field_index(program, args):
+    return (int(args[0]), args[1], int(args[2]))
+
+def parse_int_list(program, args):
+    return [parse_int_constant(arg) for arg in args]
+
+def parse_bytes_list(program, args):
+    return [decode_byte_constant([arg]) for arg in args]
+
+def parse_fixed(value):
+    return lambda program, args: value
+
+# -- opcodes --
+
+def op_push(m, value):
+    m.stack.append(value)
+
+def op_push_many(m, values):
+    m.stack.extend(values)
+
+def op_intcblock(m, values):
+    m.intc = values
+
+def op_bytecblock(m, values):
+    m.bytec = values
+
+def op_intc(m, index):
+    m.stack.append(m.intc[index])
+
+def op_bytec(m, index):
+    m.stack.append(m.bytec[index])
+
+def op_err(m, _):
+    m.fail("err opcode executed")
+
+def op_return(m, _):
+    value = m.stack[-1] if m.stack else None
+    if value is None:
+        m.fail("return with empty stack")
+    m.stack[:] = [value]
+    m.finished = True
+
+def op_assert(m, _):
+    if not m.pop_int():
+        m.fail(f"assert failed pc={m.pc - 1}")
+
+def op_b(m, target):
+    m.pc = target
+
+def op_bz(m, target):
+    if m.pop_int() == 0:
+        m.pc = target
+
+def op_bnz(m, target):
+    if m.pop_int() != 0:
+        m.pc = target
+
+def op_switch(m, targets):
+    index = m.pop_int()
+    if index < len(targets):
+        m.pc = targets[index]
+
+def op_match(m, targets):
+    count = len(targets)
+    value = m.stack.pop()
+    candidates = m.stack[-count:] if count else []
+    del m.stack[len(m.stack) - count:]
+    for position, candidate in enumerate(candidates):
+        if type(candidate) is type(value) and candidate == value:
+            m.pc = targets[position]
+            return
+
+def op_callsub(m, target):
+    if len(m.frames) >= 1024:
+        m.fail("callsub stack overflow")
+    m.frames.append(Frame(m.pc, len(m.stack)))
+    m.pc = target
+
+def op_proto(m, immediates):
+    args, returns = immediates
+    frame = m.frames[-1]
+    if len(m.stack) < args:
+        m.fail(f"callsub to proto that requires {args} args with stack height {len(m.stack)}")
+    frame.args = args
+    frame.returns = returns
+    frame.height = len(m.stack)
+    frame.has_proto = True
+
+def op_retsub(m, _):
+    if not m.frames:
+        m.fail("retsub with empty callstack")
+    frame = m.frames.pop()
+    if frame.has_proto:
+        if len(m.stack) < frame.height + frame.returns:
+            m.fail(f"retsub executed with stack below frame. Wanted {frame.returns} returns")
+        # the return values sit at the bottom of the frame, anything above them is dropped
+        returned = m.stack[frame.height:frame.height + frame.returns]
+        del m.stack[frame.height - frame.args:]
+        m.stack.extend(returned)
+    m.pc = frame.return_pc
+
+def op_frame_dig(m, offset):
+    frame = m.frames[-1]
+    position = frame.height + offset
+    if position < frame.height - frame.args or position >= len(m.stack):
+        m.fail(f"frame_dig {offset} in sub with {frame.args} args")
+    m.stack.append(m.stack[position])
+
+def op_frame_bury(m, offset):
+    frame = m.frames[-1]
+    value = m.stack.pop()
+    position = frame.height + offset
+    if position < frame.height - frame.args or position >= len(m.stack):
+        m.fail(f"frame_bury {offset} in sub with {frame.args} args")
+    m.stack[position] = value
+
+def op_pop(m, _):
+    m.stack.pop()
+
+def op_popn(m, count):
+    if count:
+        del m.stack[-count:]
+
+def op_dup(m, _):
+    m.stack.append(m.stack[-1])
+
+def op_dup2(m, _):
+    m.stack.extend(m.stack[-2:])
+
+def op_dupn(m, count):
+    m.stack.extend([m.stack[-1]] * count)
+
+def op_dig(m, depth):
+    m.stack.append(m.stack[-1 - depth])
+
+def op_bury(m, depth):
+    value = m.stack.pop()
+    m.stack[-depth] = value
+
+def op_cover(m, depth):
+    value = m.stack.pop()
+    m.stack.insert(len(m.stack) - depth, value)
+
+def op_uncover(m, depth):
+    m.stack.append(m.stack.pop(-1 - depth))
+
+def op_swap(m, _):
+    m.stack[-1], m.stack[-2] = m.stack[-2], m.stack[-1]
+
+def op_select(m, _):
+    condition = m.pop_int()
+    b = m.stack.pop()
+    a = m.stack.pop()
+    m.stack.append(b if condition else a)
+
+def op_load(m, index):
+    m.stack.append(m.scratch[index])
+
+def op_store(m, index):
+    m.scratch[index] = m.stack.pop()
+
+def op_loads(m, _):
+    m.stack.append(m.scratch[m.pop_int()])
+
+def op_stores(m, _):
+    value = m.stack.pop()
+    m.scratch[m.pop_int()] = value
+
+# arithmetic
+
+def op_add(m, _):
+    b, a = m.pop_int(), m.pop_int()
+    if a + b > MAX_UINT64:
+        m.fail("+ overflowed")
+    m.stack.append(a + b)
+
+def op_sub(m, _):
+    b, a = m.pop_int(), m.pop_int()
+    if b > a:
+        m.fail("- would result negative")
+    m.stack.append(a - b)
+
+def op_mul(m, _):
+    b, a = m.pop_int(), m.pop_int()
+    if a * b > MAX_UINT64:
+        m.fail("* overflowed")
+    m.stack.append(a * b)
+
+def op_div(m, _):
+    b, a = m.pop_int(), m.pop_int()
+    if b == 0:
+        m.fail("/ 0")
+    m.stack.append(a // b)
+
+def op_mod(m, _):
+    b, a = m.pop_int(), m.pop_int()
+    if b == 0:
+        m.fail("% 0")
+    m.stack.append(a % b)
+
+def op_exp(m, _):
+    b, a = m.pop_int(), m.pop_int()
+    if a == 0 and b == 0:
+        m.fail("0^0 is undefined")
+    if a > 1 and b > 64 or a ** b > MAX_UINT64:
+        m.fail(f"{a}^{b} overflow")
+    m.stack.append(a ** b)
+
+def op_sqrt(m, _):
+    m.stack.append(math.isqrt(m.pop_int()))
+
+def op_mulw(m, _):
+    b, a = m.pop_int(), m.pop_int()
+    product = a * b
+    m.stack.extend([product >> 64, product & MAX_UINT64])
+
+def op_addw(m, _):
+    b, a = m.pop_int(), m.pop_int()
+    total = a + b
+    m.stack.extend([total >> 64, total & MAX_UINT64])
+
+def op_divw(m, _):
+    c, b, a = m.pop_int(), m.pop_int(), m.pop_int()
+    if c == 0:
+        m.fail("divw 0")
+    quotient = ((a << 64) + b) // c
+    if quotient > MAX_UINT64:
+        m.fail("divw overflow")
+    m.stack.append(quotient)
+
+def op_divmodw(m, _):
+    d, c, b, a = m.pop_int(), m.pop_int(), m.pop_int(), m.pop_int()
+    divisor = (c << 64) + d
+    if divisor == 0:
+        m.fail("/ 0")
+    quotient, remainder = divmod((a << 64) + b, divisor)
+    m.stack.extend([quotient >> 64, quotient & MAX_UINT64, remainder >> 64, remainder & MAX_UINT64])
+
+def op_shl(m, _):
+    b, a = m.pop_int(), m.pop_int()
+    if b > 63:
+        m.fail(f"shl arg too big, ({b})")
+    m.stack.append((a << b) & MAX_UINT64)
+
+def op_shr(m, _):
+    b, a = m.pop_int(), m.pop_int()
+    if b > 63:
+        m.fail(f"shr arg too big, ({b})")
+    m.stack.append(a >> b)
+
+def op_bitlen(m, _):
+    value = m.stack.pop()
+    m.stack.append(value.bit_length() if isinstance(value, int) else int.from_bytes(value, "big").bit_length())
+
+def make_int_compare(compare):
+    def op_compare(m, _):
+        b, a = m.pop_int(), m.pop_int()
+        m.stack.append(1 if compare(a, b) else 0)
+    return op_compare
+
+def make_int_binary(operation):
+    def op_binary(m, _):
+        b, a = m.pop_int(), m.pop_int()
+        m.stack.append(operation(a, b))
+    return op_binary
+
+def op_eq(m, _):
+    b, a = m.stack.pop(), m.stack.pop()
+    if type(a) is not type(b):
+        m.fail("cannot compare (uint64 to []byte)")
+    m.stack.append(1 if a == b else 0)
+
+def op_neq(m, _):
+    b, a = m.stack.pop(), m.stack.pop()
+    if type(a) is not type(b):
+        m.fail("cannot compare (uint64 to []byte)")
+    m.stack.append(1 if a != b else 0)
+
+def op_not(m, _):
+    m.stack.append(1 if m.pop_int() == 0 else 0)
+
+def op_bitwise_not(m, _):
+    m.stack.append(m.pop_int() ^ MAX_UINT64)
+
+# bytes
+
+def op_len(m, _):
+    m.stack.append(len(m.pop_bytes()))
+
+def op_itob(m, _):
+    m.stack.append(itob(m.pop_int()))
+
+def op_btoi(m, _):
+    value = m.pop_bytes()
+    if len(value) > 8:
+        m.fail(f"btoi arg too long, got [{len(value)}]bytes")
+    m.stack.append(int.from_bytes(value, "big"))
+
+def op_concat(m, _):
+    b, a = m.pop_bytes(), m.pop_bytes()
+    m.push(a + b)
+
+def substring(m, value: bytes, start: int, end: int):
+    if end < start:
+        m.fail("substring end before start")
+    if end > len(value):
+        m.fail("substring range beyond length of string")
+    return value[start:end]
+
+def op_substring(m, immediates):
+    start, end = immediates
+    m.stack.append(substring(m, m.pop_bytes(), start, end))
+
+def op_substring3(m, _):
+    end, start = m.pop_int(), m.pop_int()
+    m.stack.append(substring(m, m.pop_bytes(), start, end))
+
+def extract(m, value: bytes, start: int, length: int):
+    if start + length > len(value):
+        m.fail("extraction end exceeds target length" if start <= len(value) else "extraction start exceeds target length")
+    return value[start:start + length]
+
+def op_extract(m, immediates):
+    start, length = immediates
+    value = m.pop_bytes()
+    if length == 0:
+        if start > len(value):
+            m.fail("extraction start exceeds target length")
+        m.stack.append(value[start:])
+    else:
+        m.stack.append(extract(m, value, start, length))
+
+def op_extract3(m, _):
+    length, start = m.pop_int(), m.pop_int()
+    m.stack.append(extract(m, m.pop_bytes(), start, length))
+
+def make_extract_uint(size):
+    def op_extract_uint(m, _):
+        start = m.pop_int()
+        m.stack.append(int.from_bytes(extract(m, m.pop_bytes(), start, size), "big"))
+    return op_extract_uint
+
+def replace(m, value: bytes, start: int, replacement: bytes):
+    if start + len(replacement) > len(value):
+        m.fail(f"replacement end {start + len(replacement)} beyond original length: {len(value)}")
+    return value[:start] + replacement + value[start + len(replacement):]
+
+def op_replace2(m, start):
+    replacement = m.pop_bytes()
+    m.stack.append(replace(m, m.pop_bytes(), start, replacement))
+
+def op_replace3(m, _):
+    replacement, start = m.pop_bytes(), m.pop_int()
+    m.stack.append(replace(m, m.pop_bytes(), start, replacement))
+
+def op_getbit(m, _):
+    index = m.pop_int()
+    target = m.stack.pop()
+    if isinstance(target, int):
+        if index > 63:
+            m.fail(f"getbit index {index} beyond 64 bits")
+        m.stack.append((target >> index) & 1)
+        return
+    if index >= len(target) * 8:
+        m.fail(f"getbit index {index} beyond byteslice")
+    m.stack.append((target[index // 8] >> (7 - index % 8)) & 1)
+
+def op_setbit(m, _):
+    bit = m.pop_int()
+    index = m.pop_int()
+    target = m.stack.pop()
+    if bit > 1:
+        m.fail("setbit value > 1")
+    if isinstance(target, int):
+        if index > 63:
+            m.fail(f"setbit index {index} beyond 64 bits")
+        m.stack.append(target | (1 << index) if bit else target & ~(1 << index))
+        return
+    if index >= len(target) * 8:
+        m.fail(f"setbit index {index} beyond byteslice")
+    updated = bytearray(target)
+    mask = 1 << (7 - index % 8)
+    updated[index // 8] = updated[index // 8] | mask if bit else updated[index // 8] & ~mask
+    m.stack.append(bytes(updated))
+
+def op_getbyte(m, _):
+    index = m.pop_int()
+    target = m.pop_bytes()
+    if index >= len(target):
+        m.fail(f"getbyte index {index} beyond length {len(target)}")
+    m.stack.append(target[index])
+
+def op_setbyte(m, _):
+    value = m.pop_int()
+    index = m.pop_int()
+    target = m.pop_bytes()
+    if index >= len(target):
+        m.fail(f"setbyte index {index} beyond length {len(target)}")
+    if value > 255:
+        m.fail("setbyte value > 255")
+    m.stack.append(target[:index] + bytes([value]) + target[index + 1:])
+
+def op_bzero(m, _):
+    length = m.pop_int()
+    if length > MAX_STACK_BYTES:
+        m.fail(f"bzero attempted to create a too large string")
+    m.stack.append(bytes(length))
+
+# byte math
+
+def pop_big(m):
+    value = m.pop_bytes()
+    if len(value) > 64:
+        m.fail("math attempted on large byte-array")
+    return int.from_bytes(value, "big")
+
+def big_to_bytes(value: int):
+    return value.to_bytes((value.bit_length() + 7) // 8, "big")
+
+def make_byte_math(operation):
+    def op_byte_math(m, _):
+        b, a = pop_big(m), pop_big(m)
+        m.stack.append(big_to_bytes(operation(m, a, b)))
+    return op_byte_math
+
+def byte_sub(m, a, b):
+    if b > a:
+        m.fail("byte math would have negative result")
+    return a - b
+
+def byte_div(m, a, b):
+    if b == 0:
+        m.fail("division by zero")
+    return a // b
+
+def byte_mod(m, a, b):
+    if b == 0:
+        m.fail("modulo by zero")
+    return a % b
+
+def make_byte_compare(compare):
+    def op_byte_compare(m, _):
+        b, a = pop_big(m), pop_big(m)
+        m.stack.append(1 if compare(a, b) else 0)
+    return op_byte_compare
+
+def make_byte_bitwise(operation):
+    def op_byte_bitwise(m, _):
+        b, a = m.pop_bytes(), m.pop_bytes()
+        size = max(len(a), len(b))
+        a, b = a.rjust(size, b"\0"), b.rjust(size, b"\0")
+        m.stack.append(bytes(operation(x, y) for x, y in zip(a, b)))
+    return op_byte_bitwise
+
+def op_byte_not(m, _):
+    m.stack.append(bytes(x ^ 0xFF for x in m.pop_bytes()))
+
+def op_bsqrt(m, _):
+    m.stack.append(big_to_bytes(math.isqrt(pop_big(m))))
+
+# crypto
+
+def make_hash(function):
+    def op_hash(m, _):
+        m.stack.append(function(m.pop_bytes()))
+    return op_hash
+
+def keccak256(data: bytes):
+    from Crypto.Hash import keccak
+    return keccak.new(data=data, digest_bits=256).digest()
+
+def ed25519_verify(message: bytes, signature: bytes, public_key: bytes):
+    try:
+        VerifyKey(public_key).verify(message, signature)
+        return 1
+    except (BadSignatureError, ValueError):
+        return 0
+
+def op_ed25519verify(m, _):
+    public_key, signature, data = m.pop_bytes(), m.pop_bytes(), m.pop_bytes()
+    program_hash = sha512_256(b"Program" + m.program.source_hash)
+    m.stack.append(ed25519_verify(b"ProgData" + program_hash + data, signature, public_key))
+
+def op_ed25519verify_bare(m, _):
+    public_key, signature, data = m.pop_bytes(), m.pop_bytes(), m.pop_bytes()
+    m.stack.append(ed25519_verify(data, signature, public_key))
+
+def op_vrf_verify(m, standard):
+    public_key, proof, message = m.pop_bytes(), m.pop_bytes(), m.pop_bytes()
+    if len(proof) != 80 or len(public_key) != 32:
+        m.fail("vrf_verify proof must be 80 bytes and public key 32 bytes")
+    output, verified = m.avm.vrf_verifier(message, proof, public_key)
+    m.stack.extend([output, 1 if verified else 0])
+
+# transaction fields
+
+def txn_field(m, txn: dict, name: str, index: int | None = None):
+    if name == "TypeEnum":
+        return TXN_TYPES.get(txn.get("Type"), 0)
+    if name == "Type":
+        return txn.get("Type", "").encode()
+    if name.startswith("Num") and name[3:] in ("AppArgs", "Accounts", "Applications", "Assets", "Logs"):
+        field_name = {"AppArgs": "ApplicationArgs"}.get(name[3:], name[3:])
+        return len(txn.get(field_name, []))
+    if name == "LastLog":
+        logs = txn.get("Logs", [])
+        return logs[-1] if logs else b""
+    if name == "GroupIndex":
+        return txn.get("GroupIndex", 0)
+    if name in ARRAY_FIELDS:
+        values = txn.get(name, [])
+        if name == "Accounts":
+            values = [txn["Sender"]] + list(values)
+        elif name == "Applications":
+            values = [txn.get("ApplicationID", 0)] + list(values)
+        if index is None or index >= len(values):
+            m.fail(f"invalid {name} index {index}")
+        return values[index]
+    if name in txn:
+        return txn[name]
+    return TXN_DEFAULTS.get(name, 0)
+
+TXN_DEFAULTS = {
+    "Sender": ZERO_ADDRESS, "Receiver": ZERO_ADDRESS, "CloseRemainderTo": ZERO_ADDRESS, "RekeyTo": ZERO_ADDRESS,
+    "AssetReceiver": ZERO_ADDRESS, "AssetSender": ZERO_ADDRESS, "AssetCloseTo": ZERO_ADDRESS, "Lease": bytes(32),
+    "Note": b"", "TxID": bytes(32), "GroupID": bytes(32), "ApprovalProgram": b"", "ClearStateProgram": b"",
+}
+
+def op_txn(m, name):
+    m.stack.append(txn_field(m, m.txn, name))
+
+def op_txna(m, immediates):
+    name, index = immediates
+    m.stack.append(txn_field(m, m.txn, name, index))
+
+def op_txnas(m, name):
+    m.stack.append(txn_field(m, m.txn, name, m.pop_int()))
+
+def group_txn(m, group_index: int):
+    if group_index >= len(m.group):
+        m.fail(f"gtxn lookup TxnGroup[{group_index}] but it only has {len(m.group)}")
+    return m.group[group_index]
+
+def op_gtxn(m, immediates):
+    group_index, name = immediates
+    m.stack.append(txn_field(m, group_txn(m, group_index), name))
+
+def op_gtxna(m, immediates):
+    group_index, name, index = immediates
+    m.stack.append(txn_field(m, group_txn(m, group_index), name, index))
+
+def op_gtxns(m, name):
+    m.stack.append(txn_field(m, group_txn(m, m.pop_int()), name))
+
+def op_gtxnsa(m, immediates):
+    name, index = immediates
+    m.stack.append(txn_field(m, group_txn(m, m.pop_int()), name, index))
+
+def op_gtxnsas(m, name):
+    index = m.pop_int()
+    m.stack.append(txn_field(m, group_txn(m, m.pop_int()), name, index))
+
+def op_global(m, name):
+    ledger = m.ledger
+    if name == "MinTxnFee":
+        value = MIN_TXN_FEE
+    elif name == "MinBalance":
+        value = MIN_BALANCE
+    elif name == "MaxTxnLife":
+        value = 1000
+    elif name == "ZeroAddress":
+        value = ZERO_ADDRESS
+    elif name == "GroupSize":
+        value = len(m.group)
+    elif name == "LogicSigVersion":
+        value = 8
+    elif name == "Round":
+        value = ledger.round
+    elif name == "LatestTimestamp":
+        value = ledger.timestamp
+    elif name == "CurrentApplicationID":
+        value = m.app_id
+    elif name == "CreatorAddress":
+        value = ledger.apps[m.app_id]["creator"]
+    elif name == "CurrentApplicationAddress":
+        value = app_address(m.app_id)
+    elif name == "GroupID":
+        value = m.txn.get("GroupID", bytes(32))
+    elif name == "OpcodeBudget":
+        value = m.budget.limit - m.budget.used
+    elif name == "CallerApplicationID":
+        value = m.caller_app_id
+    elif name == "CallerApplicationAddress":
+        value = app_address(m.caller_app_id) if m.caller_app_id else ZERO_ADDRESS
+    else:
+        m.fail(f"unsupported global field {name}")
+    m.stack.append(value)
+
+# state
+
+def op_balance(m, _):
+    m.stack.append(m.ledger.account(m.resolve_account(m.stack.pop()))["balance"])
+
+def op_min_balance(m, _):
+    m.stack.append(m.ledger.min_balance(m.resolve_account(m.stack.pop())))
+
+def op_app_opted_in(m, _):
+    app_id = m.resolve_app(m.pop_int())
+    account = m.resolve_account(m.stack.pop())
+    m.stack.append(1 if app_id in m.ledger.account(account)["locals"] else 0)
+
+def op_app_global_get(m, _):
+    key = m.pop_bytes()
+    m.state_access.global_reads += 1
+    m.stack.append(m.app_globals(m.app_id).get(key, 0))
+
+def op_app_global_get_ex(m, _):
+    key = m.pop_bytes()
+    app_id = m.resolve_app(m.pop_int())
+    m.state_access.global_reads += 1
+    app_globals = m.app_globals(app_id)
+    if app_globals is None or key not in app_globals:
+        m.stack.extend([0, 0])
+    else:
+        m.stack.extend([app_globals[key], 1])
+
+def op_app_global_put(m, _):
+    value = m.stack.pop()
+    key = m.pop_bytes()
+    if len(key) > 64:
+        m.fail("key too long")
+    m.state_access.global_writes += 1
+    m.ledger.write(m.app_globals(m.app_id), key, value)
+
+def op_app_global_del(m, _):
+    m.state_access.global_writes += 1
+    m.ledger.remove(m.app_globals(m.app_id), m.pop_bytes())
+
+def local_state(m, account: bytes, app_id: int):
+    app_locals = m.app_locals(account, app_id)
+    if app_locals is None:
+        m.fail(f"account {base64.b32encode(account).decode()[:8]}... is not opted into app {app_id}")
+    return app_locals
+
+def op_app_local_get(m, _):
+    key = m.pop_bytes()
+    account = m.resolve_account(m.stack.pop())
+    m.state_access.local_reads += 1
+    m.stack.append(local_state(m, account, m.app_id).get(key, 0))
+
+def op_app_local_get_ex(m, _):
+    key = m.pop_bytes()
+    app_id = m.resolve_app(m.pop_int())
+    account = m.resolve_account(m.stack.pop())
+    m.state_access.local_reads += 1
+    app_locals = m.app_locals(account, app_id)
+    if app_locals is None or key not in app_locals:
+        m.stack.extend([0, 0])
+    else:
+        m.stack.extend([app_locals[key], 1])
+
+def op_app_local_put(m, _):
+    value = m.stack.pop()
+    key = m.pop_bytes()
+    account = m.resolve_account(m.stack.pop())
+    m.state_access.local_writes += 1
+    m.ledger.write(local_state(m, account, m.app_id), key, value)
+
+def op_app_local_del(m, _):
+    key = m.pop_bytes()
+    account = m.resolve_account(m.stack.pop())
+    m.state_access.local_writes += 1
+    m.ledger.remove(local_state(m, account, m.app_id), key)
+
+def op_asset_holding_get(m, name):
+    asset_id = m.resolve_asset(m.pop_int())
+    account = m.ledger.account(m.resolve_account(m.stack.pop()))
+    if asset_id not in account["assets"]:
+        m.stack.extend([0, 0])
+    elif name == "AssetBalance":
+        m.stack.extend([account["assets"][asset_id], 1])
+    else:
+        m.stack.extend([0, 1])
+
+def op_asset_params_get(m, name):
+    asset = m.ledger.assets.get(m.resolve_asset(m.pop_int()))
+    if asset is None:
+        m.stack.extend([0, 0])
+        return
+    values = {
+        "AssetTotal": asset["total"], "AssetDecimals": asset["decimals"], "AssetUnitName": asset["unit_name"],
+        "AssetName": asset["name"], "AssetCreator": asset["creator"], "AssetManager": asset["creator"],
+        "AssetReserve": asset["creator"], "AssetFreeze": ZERO_ADDRESS, "AssetClawback": ZERO_ADDRESS,
+        "AssetDefaultFrozen": 0, "AssetURL": b"", "AssetMetadataHash": bytes(32),
+    }
+    m.stack.extend([values[name], 1])
+
+def op_app_params_get(m, name):
+    app_id = m.resolve_app(m.pop_int())
+    app = m.ledger.apps.get(app_id)
+    if app is None:
+        m.stack.extend([0, 0])
+        return
+    values = {
+        "AppCreator": app["creator"], "AppAddress": app_address(app_id),
+        "AppGlobalNumUint": app["global_schema"][0], "AppGlobalNumByteSlice": app["global_schema"][1],
+        "AppLocalNumUint": app["local_schema"][0], "AppLocalNumByteSlice": app["local_schema"][1],
+        "AppExtraProgramPages": app["extra_pages"], "AppApprovalProgram": b"", "AppClearStateProgram": b"",
+    }
+    m.stack.extend([values[name], 1])
+
+def op_acct_params_get(m, name):
+    address = m.resolve_account(m.stack.pop())
+    account = m.ledger.account(address)
+    values = {
+        "AcctBalance": account["balance"], "AcctMinBalance": m.ledger.min_balance(address), "AcctAuthAddr": ZERO_ADDRESS,
+    }
+    m.stack.extend([values[name], 1 if account["balance"] else 0])
+
+def op_block(m, name):
+    round_number = m.pop_int()
+    if not m.ledger.round - 1001 < round_number < m.ledger.round:
+        m.fail(f"round {round_number} is not available")
+    if name == "BlkSeed":
+        m.stack.append(m.ledger.block_seeds.get(round_number, sha512_256(b"seed" + itob(round_number))))
+    else:
+        m.stack.append(m.ledger.timestamp - 3 * (m.ledger.round - round_number))
+
+def op_log(m, _):
+    value = m.pop_bytes()
+    if len(m.logs) >= MAX_LOGS:
+        m.fail(f"too many log calls in program. up to {MAX_LOGS} is allowed")
+    if sum(map(len, m.logs)) + len(value) > MAX_LOG_BYTES:
+        m.fail(f"program logs too large. {MAX_LOG_BYTES} bytes is allowed")
+    m.logs.append(value)
+
+# boxes
+
+def op_box_create(m, _):
+    size = m.pop_int()
+    name = m.pop_bytes()
+    boxes = m.current_box(name)
+    if size > 32768:
+        m.fail(f"box size too large: {size}, max is 32768")
+    if name in boxes:
+        if len(boxes[name]) != size:
+            m.fail(f"box size mismatch {len(boxes[name])} {size}")
+        m.stack.append(0)
+        return
+    m.state_access.box_creates += 1
+    m.ledger.write(boxes, name, bytes(size))
+    m.stack.append(1)
+
+def existing_box(m, name: bytes):
+    boxes = m.current_box(name)
+    if name not in boxes:
+        m.fail(f"no such box {name!r}")
+    return boxes
+
+def op_box_extract(m, _):
+    length, start = m.pop_int(), m.pop_int()
+    name = m.pop_bytes()
+    value = existing_box(m, name)[name]
+    m.state_access.box_reads += 1
+    m.stack.append(extract(m, value, start, length))
+
+def op_box_replace(m, _):
+    replacement, start = m.pop_bytes(), m.pop_int()
+    name = m.pop_bytes()
+    boxes = existing_box(m, name)
+    m.state_access.box_writes += 1
+    m.ledger.write(boxes, name, replace(m, boxes[name], start, replacement))
+
+def op_box_del(m, _):
+    name = m.pop_bytes()
+    boxes = m.current_box(name)
+    if name in boxes:
+        m.state_access.box_deletes += 1
+        m.ledger.remove(boxes, name)
+        m.stack.append(1)
+    else:
+        m.stack.append(0)
+
+def op_box_len(m, _):
+    name = m.pop_bytes()
+    boxes = m.current_box(name)
+    m.state_access.box_reads += 1
+    m.stack.extend([len(boxes[name]), 1] if name in boxes else [0, 0])
+
+def op_box_get(m, _):
+    name = m.pop_bytes()
+    boxes = m.current_box(name)
+    m.state_access.box_reads += 1
+    m.stack.extend([boxes[name], 1] if name in boxes else [b"", 0])
+
+def op_box_put(m, _):
+    value = m.pop_bytes()
+    name = m.pop_bytes()
+    boxes = m.current_box(name)
+    if name in boxes and len(boxes[name]) != len(value):
+        m.fail(f"box_put wrong size {len(boxes[name])} != {len(value)}")
+    if name not in boxes:
+        m.state_access.box_creates += 1
+    m.state_access.box_writes += 1
+    m.ledger.write(boxes, name, value)
+
+# inner transactions
+
+def new_inner_txn(m):
+    return {"Sender": app_address(m.app_id), "Fee": MIN_TXN_FEE, "inner": True}
+
+def op_itxn_begin(m, _):
+    if m.inner_group is not None:
+        m.fail("itxn_begin without itxn_submit")
+    m.inner_group = [new_inner_txn(m)]
+
+def op_itxn_next(m, _):
+    if m.inner_group is None:
+        m.fail("itxn_next without itxn_begin")
+    m.inner_group.append(new_inner_txn(m))
+
+def op_itxn_field(m, name):
+    if m.inner_group is None:
+        m.fail("itxn_field without itxn_begin")
+    value = m.stack.pop()
+    txn = m.inner_group[-1]
+    if name == "TypeEnum":
+        txn["Type"] = {number: type_name for type_name, number in TXN_TYPES.items()}.get(value)
+    elif name == "Type":
+        txn["Type"] = value.decode()
+    elif name in ARRAY_FIELDS:
+        if name in ("Applications", "Assets") and isinstance(value, int):
+            value = m.resolve_app(value) if name == "Applications" else m.resolve_asset(value)
+        elif name == "Accounts":
+            value = m.resolve_account(value)
+        txn.setdefault(name, []).append(value)
+    else:
+        if name in ("Receiver", "AssetReceiver", "CloseRemainderTo", "AssetCloseTo", "AssetSender", "Sender", "RekeyTo") and isinstance(value, int):
+            value = m.resolve_account(value)
+        if name == "XferAsset":
+            value = m.resolve_asset(value)
+        if name == "ApplicationID":
+            value = m.resolve_app(value)
+        txn[name] = value
+
+def op_itxn_submit(m, _):
+    if m.inner_group is None:
+        m.fail("itxn_submit without itxn_begin")
+    if m.depth + 1 > MAX_INNER_DEPTH:
+        m.fail("too many inner transaction levels")
+    inner_group = m.inner_group
+    m.inner_group = None
+    try:
+        results = m.avm.execute_inner_group(inner_group, m)
+    except AVMError as error:
+        m.fail(f"inner tx {len(inner_group) - 1} failed: {error.reason}")
+    m.inner_results.extend(results)
+    m.last_inner_group = inner_group
+
+def op_itxn(m, name):
+    if not m.last_inner_group:
+        m.fail("no inner transaction available")
+    m.stack.append(txn_field(m, m.last_inner_group[-1], name))
+
+def op_itxna(m, immediates):
+    name, index = immediates
+    if not m.last_inner_group:
+        m.fail("no inner transaction available")
+    m.stack.append(txn_field(m, m.last_inner_group[-1], name, index))
+
+OPCODES = {
+    "int": (op_push, parse_int_constant_arg), "pushint": (op_push, parse_int_constant_arg),
+    "byte": (op_push, parse_bytes), "pushbytes": (op_push, parse_bytes),
+    "addr": (op_push, parse_addr), "method": (op_push, parse_method),
+    "pushints": (op_push_many, parse_int_list), "pushbytess": (op_push_many, parse_bytes_list),
+    "intcblock": (op_intcblock, parse_int_list), "bytecblock": (op_bytecblock, parse_bytes_list),
+    "intc": (op_intc, parse_int), "bytec": (op_bytec, parse_int),
+    "intc_0": (op_intc, parse_fixed(0)), "intc_1": (op_intc, parse_fixed(1)),
+    "intc_2": (op_intc, parse_fixed(2)), "intc_3": (op_intc, parse_fixed(3)),
+    "bytec_0": (op_bytec, parse_fixed(0)), "bytec_1": (op_bytec, parse_fixed(1)),
+    "bytec_2": (op_bytec, parse_fixed(2)), "bytec_3": (op_bytec, parse_fixed(3)),
+    "err": (op_err, None), "return": (op_return, None), "assert": (op_assert, None),
+    "b": (op_b, parse_label), "bz": (op_bz, parse_label), "bnz": (op_bnz, parse_label),
+    "switch": (op_switch, parse_labels), "match": (op_match, parse_labels),
+    "callsub": (op_callsub, parse_label), "retsub": (op_retsub, None), "proto": (op_proto, parse_two_ints),
+    "frame_dig": (op_frame_dig, parse_int), "frame_bury": (op_frame_bury, parse_int),
+    "pop": (op_pop, None), "popn": (op_popn, parse_int), "dup": (op_dup, None), "dup2": (op_dup2, None),
+    "dupn": (op_dupn, parse_int), "dig": (op_dig, parse_int), "bury": (op_bury, parse_int),
+    "cover": (op_cover, parse_int), "uncover": (op_uncover, parse_int), "swap": (op_swap, None),
+    "select": (op_select, None),
+    "load": (op_load, parse_int), "store": (op_store, parse_int), "loads": (op_loads, None), "stores": (op_stores, None),
+    "+": (op_add, None), "-": (op_sub, None), "*": (op_mul, None), "/": (op_div, None), "%": (op_mod, None),
+    "exp": (op_exp, None), "sqrt": (op_sqrt, None), "mulw": (op_mulw, None), "addw": (op_addw, None),
+    "divw": (op_divw, None), "divmodw": (op_divmodw, None), "shl": (op_shl, None), "shr": (op_shr, None),
+    "bitlen": (op_bitlen, None),
+    "<": (make_int_compare(lambda a, b: a < b), None), ">": (make_int_compare(lambda a, b: a > b), None),
+    "<=": (make_int_compare(lambda a, b: a <= b), None), ">=": (make_int_compare(lambda a, b: a >= b), None),
+    "&&": (make_int_compare(lambda a, b: a and b), None), "||": (make_int_compare(lambda a, b: a or b), None),
+    "==": (op_eq, None), "!=": (op_neq, None), "!": (op_not, None),
+    "|": (make_int_binary(lambda a, b: a | b), None), "&": (make_int_binary(lambda a, b: a & b), None),
+    "^": (make_int_binary(lambda a, b: a ^ b), None), "~": (op_bitwise_not, None),
+    "len": (op_len, None), "itob": (op_itob, None), "btoi": (op_btoi, None), "concat": (op_concat, None),
+    "substring": (op_substring, parse_two_ints), "substring3": (op_substring3, None),
+    "extract": (op_extract, parse_two_ints), "extract3": (op_extract3, None),
+    "extract_uint16": (make_extract_uint(2), None), "extract_uint32": (make_extract_uint(4), None),
+    "extract_uint64": (make_extract_uint(8), None),
+    "replace2": (op_replace2, parse_int), "replace3": (op_replace3, None),
+    "getbit": (op_getbit, None), "setbit": (op_setbit, None), "getbyte": (op_getbyte, None), "setbyte": (op_setbyte, None),
+    "bzero": (op_bzero, None),
+    "b+": (make_byte_math(lambda m, a, b: a + b), None), "b-": (make_byte_math(byte_sub), None),
+    "b*": (make_byte_math(lambda m, a, b: a * b), None), "b/": (make_byte_math(byte_div), None),
+    "b%": (make_byte_math(byte_mod), None),
+    "b<": (make_byte_compare(lambda a, b: a < b), None), "b>": (make_byte_compare(lambda a, b: a > b), None),
+    "b<=": (make_byte_compare(lambda a, b: a <= b), None), "b>=": (make_byte_compare(lambda a, b: a >= b), None),
+    "b==": (make_byte_compare(lambda a, b: a == b), None), "b!=": (make_byte_compare(lambda a, b: a != b), None),
+    "b|": (make_byte_bitwise(lambda a, b: a | b), None), "b&": (make_byte_bitwise(lambda a, b: a & b), None),
+    "b^": (make_byte_bitwise(lambda a, b: a ^ b), None), "b~": (op_byte_not, None), "bsqrt": (op_bsqrt, None),
+    "sha256": (make_hash(lambda data: hashlib.sha256(data).digest()), None),
+    "sha512_256": (make_hash(sha512_256), None),
+    "sha3_256": (make_hash(lambda data: hashlib.sha3_256(data).digest()), None),
+    "keccak256": (make_hash(keccak256), None),
+    "ed25519verify": (op_ed25519verify, None), "ed25519verify_bare": (op_ed25519verify_bare, None),
+    "vrf_verify": (op_vrf_verify, parse_field),
+    "txn": (op_txn, parse_field), "txna": (op_txna, parse_field_index), "txnas": (op_txnas, parse_field),
+    "gtxn": (op_gtxn, parse_group_field), "gtxna": (op_gtxna, parse_group_field_index),
+    "gtxns": (op_gtxns, parse_field), "gtxnsa": (op_gtxnsa, parse_field_index), "gtxnsas": (op_gtxnsas, parse_field),
+    "global": (op_global, parse_field),
+    "balance": (op_balance, None), "min_balance": (op_min_balance, None), "app_opted_in": (op_app_opted_in, None),
+    "app_global_get": (op_app_global_get, None), "app_global_get_ex": (op_app_global_get_ex, None),
+    "app_global_put": (op_app_global_put, None), "app_global_del": (op_app_global_del, None),
+    "app_local_get": (op_app_local_get, None), "app_local_get_ex": (op_app_local_get_ex, None),
+    "app_local_put": (op_app_local_put, None), "app_local_del": (op_app_local_del, None),
+    "asset_holding_get": (op_asset_holding_get, parse_field), "asset_params_get": (op_asset_params_get, parse_field),
+    "app_params_get": (op_app_params_get, parse_field), "acct_params_get": (op_acct_params_get, parse_field),
+    "block": (op_block, parse_field), "log": (op_log, None),
+    "box_create": (op_box_create, None), "box_extract": (op_box_extract, None), "box_replace": (op_box_replace, None),
+    "box_del": (op_box_del, None), "box_len": (op_box_len, None), "box_get": (op_box_get, None), "box_put": (op_box_put, None),
+    "itxn_begin": (op_itxn_begin, None), "itxn_next": (op_itxn_next, None), "itxn_field": (op_itxn_field, parse_field),
+    "itxn_submit": (op_itxn_submit, None), "itxn": (op_itxn, parse_field), "itxna": (op_itxna, parse_field_index),
+}
+
+@dataclass
+class CallTrace:
+    """Groups sent through an AVM together with the ledger they started from, for replays."""
+    ledger: Ledger
+    groups: list = field(default_factory=list)
+    # the ledger round each group ran in
+    rounds: list = field(default_factory=list)
+
+    def save(self, path: str):
+        with open(path, "wb") as trace_file:
+            pickle.dump(self, trace_file)
+
+    @staticmethod
+    def load(path: str):
+        with open(path, "rb") as trace_file:
+            return pickle.load(trace_file)
+
+def default_vrf_verifier(message: bytes, proof: bytes, public_key: bytes):
+    return hashlib.sha512(proof + message + public_key).digest(), True
+
+class AVM():
+    """Executes transaction groups against a Ledger.
+
+    Transactions are dicts keyed by TEAL field name (see `app_call`, `payment`,
+    `asset_transfer`); a logic signature is attached as `txn["lsig"] = (Program, args)`.
+    """
+
+    def __init__(self, ledger: Ledger | None = None, vrf_verifier=default_vrf_verifier, charge_fees: bool = True):
+        self.ledger = ledger or Ledger()
+        self.vrf_verifier = vrf_verifier
+        self.charge_fees = charge_fees
+        self.txn_counter = 0
+        self.trace: CallTrace | None = None
+
+    def start_trace(self):
+        """Record every group executed from here on, see replay_trace."""
+        self.trace = CallTrace(copy.deepcopy(self.ledger))
+        return self.trace
+
+    def prepare_group(self, group: list[dict]):
+        group_id = sha512_256(b"TG" + itob(self.txn_counter)) if len(group) > 1 else bytes(32)
+        for index, txn in enumerate(group):
+            txn["Sender"] = to_address_bytes(txn["Sender"])
+            txn["GroupIndex"] = index
+            txn.setdefault("Fee", MIN_TXN_FEE)
+            txn.setdefault("FirstValid", self.ledger.round)
+            txn.setdefault("LastValid", self.ledger.round + 1000)
+            if len(group) > 1:
+                txn["GroupID"] = group_id
+            if "TxID" not in txn:
+                self.txn_counter += 1
+                txn["TxID"] = sha512_256(b"TX" + itob(self.txn_counter) + txn["Sender"])
+
+    def execute_group(self, group: list[dict]):
+        """Run one atomic group; on failure the ledger is rolled back and the error reported."""
+        if self.trace is not None:
+            self.trace.groups.append(copy.deepcopy(group))
+            self.trace.rounds.append(self.ledger.round)
+        self.prepare_group(group)
+        app_calls = sum(1 for txn in group if txn.get("Type") == "appl")
+        budget = Budget(APP_CALL_BUDGET * app_calls)
+        lsig_budget = Budget(LSIG_BUDGET * len(group))
+        checkpoint = self.ledger.checkpoint()
+        calls = []
+        lsig_costs = {}
+        index = 0
+        try:
+            for index, txn in enumerate(group):
+                if "lsig" in txn:
+                    program, args = txn["lsig"]
+                    machine = Machine(self, program, group, index, lsig_budget, mode="sig")
+                    machine.txn = dict(txn, Args=args)
+                    approved = machine.run()
+                    lsig_costs[index] = machine.cost
+                    if not approved:
+                        raise AVMError(f"rejected by logic {program.name}")
+            for index, txn in enumerate(group):
+                result = self.apply_txn(group, index, budget)
+                if result is not None:
+                    calls.append(result)
+            self.check_min_balances(group)
+        except AVMError as error:
+            self.ledger.rollback(checkpoint)
+            calls.append(CallResult(index, group[index].get("ApplicationID", 0), ok=False, error=str(error)))
+            return GroupResult(False, str(error), calls, budget.limit, budget.used, lsig_costs)
+        self.ledger.commit()
+        return GroupResult(True, None, calls, budget.limit, budget.used, lsig_costs)
+
+    def execute_inner_group(self, group: list[dict], caller: Machine):
+        for index, txn in enumerate(group):
+            txn["GroupIndex"] = index
+            self.txn_counter += 1
+            txn["TxID"] = sha512_256(b"TX" + itob(self.txn_counter) + txn["Sender"])
+        results = []
+        for index, txn in enumerate(group):
+            if txn.get("Type") == "appl":
+                # each inner app call adds to the pooled budget, which is how OpUp works
+                caller.budget.limit += APP_CALL_BUDGET
+            result = self.apply_txn(group, index, caller.budget, caller=caller)
+            if result is not None:
+                results.append(result)
+        return results
+
+    def check_min_balances(self, group: list[dict]):
+        touched = set()
+        for txn in group:
+            touched.add(txn["Sender"])
+            for name in ("Receiver", "AssetReceiver"):
+                if name in txn:
+                    touched.add(to_address_bytes(txn[name]))
+        for address in touched:
+            account = self.ledger.account(address)
+            if account["balance"] < self.ledger.min_balance(address):
+                raise AVMError(f"account balance {account['balance']} below min {self.ledger.min_balance(address)}")
+
+    def move_algos(self, sender: bytes, receiver: bytes, amount: int):
+        sender_account = self.ledger.account(sender)
+        if sender_account["balance"] < amount:
+            raise AVMError(f"overspend (account {base64.b32encode(sender).decode()[:8]}..., tried to spend {amount})")
+        self.ledger.write(sender_account, "balance", sender_account["balance"] - amount)
+        receiver_account = self.ledger.account(receiver)
+        self.ledger.write(receiver_account, "balance", receiver_account["balance"] + amount)
+
+    def move_asset(self, sender: bytes, receiver: bytes, asset_id: int, amount: int):
+        sender_assets = self.ledger.account(sender)["assets"]
+        receiver_assets = self.ledger.account(receiver)["assets"]
+        if asset_id not in receiver_assets:
+            raise AVMError(f"receiver is not opted in to asset {asset_id}")
+        if sender_assets.get(asset_id, 0) < amount:
+            raise AVMError(f"underflow on subtracting {amount} from asset {asset_id} balance")
+        self.ledger.write(sender_assets, asset_id, sender_assets[asset_id] - amount)
+        self.ledger.write(receiver_assets, asset_id, receiver_assets[asset_id] + amount)
+
+    def apply_txn(self, group: list[dict], index: int, budget: Budget, caller: Machine | None = None):
+        txn = group[index]
+        sender = txn["Sender"]
+        txn_type = txn.get("Type")
+
+        if self.charge_fees:
+            self.move_algos(sender, ZERO_ADDRESS, txn.get("Fee", MIN_TXN_FEE))
+
+        if txn_type == "pay":
+            self.move_algos(sender, to_address_bytes(txn["Receiver"]), txn.get("Amount", 0))
+            if txn.get("CloseRemainderTo", ZERO_ADDRESS) != ZERO_ADDRESS:
+                self.move_algos(sender, to_address_bytes(txn["CloseRemainderTo"]), self.ledger.account(sender)["balance"])
+            return None
+        if txn_type == "axfer":
+            receiver = to_address_bytes(txn.get("AssetReceiver", sender))
+            asset_id = txn["XferAsset"]
+            if txn.get("AssetAmount", 0) == 0 and receiver == sender:
+                assets = self.ledger.account(sender)["assets"]
+                if asset_id not in assets:
+                    self.ledger.write(assets, asset_id, 0)
+            else:
+                self.move_asset(sender, receiver, asset_id, txn.get("AssetAmount", 0))
+            return None
+        if txn_type == "acfg":
+            txn["CreatedAssetID"] = self.ledger.create_asset(sender, txn.get("ConfigAssetTotal", 0), txn.get("ConfigAssetDecimals", 0))
+            return None
+        if txn_type == "appl":
+            return self.apply_app_call(group, index, budget, caller)
+        raise AVMError(f"unsupported transaction type {txn_type}")
+
+    def apply_app_call(self, group: list[dict], index: int, budget: Budget, caller: Machine | None):
+        txn = group[index]
+        sender = txn["Sender"]
+        app_id = txn.get("ApplicationID", 0)
+        on_completion = txn.get("OnCompletion", 0)
+        result = CallResult(index, app_id)
+
+        if app_id == 0:
+            approval = self.ledger.programs.get(txn.get("ApprovalProgram", b""))
+            clear = self.ledger.programs.get(txn.get("ClearStateProgram", b""))
+            if approval is None:
+                raise AVMError("approval program is not registered with the ledger, use Ledger.register_program")
+            app_id = self.ledger.create_app(
+                sender,
+                approval,
+                clear,
+                global_schema=(txn.get("GlobalNumUint", 0), txn.get("GlobalNumByteSlice", 0)),
+                local_schema=(txn.get("LocalNumUint", 0), txn.get("LocalNumByteSlice", 0)),
+                extra_pages=txn.get("ExtraProgramPages", 0)
+            )
+            txn["CreatedApplicationID"] = app_id
+            result.app_id = app_id
+            result.created_app_id = app_id
+        elif app_id not in self.ledger.apps:
+            raise AVMError(f"application {app_id} does not exist")
+
+        app = self.ledger.apps[app_id]
+        if on_completion == 1:
+            if app_id in self.ledger.account(sender)["locals"]:
+                raise AVMError(f"account has already opted in to app {app_id}")
+            self.ledger.opt_in_app(sender, app_id)
+
+        program = app["clear"] if on_completion == 3 else app["approval"]
+        machine = Machine(
+            self, program, group, index, budget, app_id=app_id,
+            caller_app_id=caller.app_id if caller else 0,
+            depth=caller.depth + 1 if caller else 0
+        )
+        if on_completion == 3:
+            # clear state can't be rejected; its effects only stick if it approves
+            checkpoint = self.ledger.checkpoint()
+            try:
+                approved = program is not None and machine.run()
+            except AVMError:
+                approved = False
+            if not approved:
+                self.ledger.rollback(checkpoint)
+            self.ledger.remove(self.ledger.account(sender)["locals"], app_id)
+        else:
+            approved = machine.run()
+            if not approved:
+                raise AVMError(f"transaction rejected by ApprovalProgram of app {app_id}")
+            if on_completion == 2:
+                self.ledger.remove(self.ledger.account(sender)["locals"], app_id)
+            elif on_completion == 5:
+                self.ledger.remove(self.ledger.apps, app_id)
+
+        txn["Logs"] = machine.logs
+        result.cost = machine.cost
+        result.logs = machine.logs
+        result.state_access = machine.state_access
+        result.inner = machine.inner_results
+        return result
+
+# -- transaction builders --
+
+def app_call(sender, app_id: int, args: list | None = None, accounts: list | None = None, applications: list | None = None, assets: list | None = None, on_completion: int = 0, **fields):
+    return dict({
+        "Type": "appl",
+        "Sender": to_address_bytes(sender),
+        "ApplicationID": app_id,
+        "OnCompletion": on_completion,
+        "ApplicationArgs": list(args or []),
+        "Accounts": [to_address_bytes(account) for account in accounts or []],
+        "Applications": list(applications or []),
+        "Assets": list(assets or []),
+    }, **fields)
+
+def method_call(sender, app_id: int, method, args: list | None = None, **fields):
+    """App call for an algosdk abi.Method; reference-typed args are added to the foreign arrays."""
+    txn = app_call(sender, app_id, [method.get_selector()], **fields)
+    for arg, value in zip(method.args, args or []):
+        arg_type = str(arg.type)
+        if arg_type == "account":
+            txn["Accounts"].append(to_address_bytes(value))
+            txn["ApplicationArgs"].append(bytes([len(txn["Accounts"])]))
+        elif arg_type == "application":
+            txn["Applications"].append(value)
+            txn["ApplicationArgs"].append(bytes([len(txn["Applications"])]))
+        elif arg_type == "asset":
+            txn["Assets"].append(value)
+            txn["ApplicationArgs"].append(bytes([len(txn["Assets"]) - 1]))
+        elif arg_type in ("txn", "pay", "axfer", "appl", "acfg", "keyreg", "afrz"):
+            # transaction args are the txns placed before this one in the group
+            continue
+        else:
+            txn["ApplicationArgs"].append(arg.type.encode(value))
+    return txn
+
+def payment(sender, receiver, amount: int, **fields):
+    return dict({"Type": "pay", "Sender": to_address_bytes(sender), "Receiver": to_address_bytes(receiver), "Amount": amount}, **fields)
+
+def asset_transfer(sender, receiver, asset_id: int, amount: int, **fields):
+    return dict({
+        "Type": "axfer",
+        "Sender": to_address_bytes(sender),
+        "AssetReceiver": to_address_bytes(receiver),
+        "XferAsset": asset_id,
+        "AssetAmount": amount,
+    }, **fields)
+
+# -- replays --
+
+def replay_trace(trace: CallTrace, replacements: dict[bytes, Program] | None = None, vrf_verifier=default_vrf_verifier):
+    """Run a recorded trace again from its starting ledger, optionally with some programs swapped.
+
+    Returns (group results, final ledger).
+    """
+    ledger = copy.deepcopy(trace.ledger)
+    replacements = replacements or {}
+    ledger.replace_programs(replacements)
+    avm = AVM(ledger, vrf_verifier)
+    results = []
+    for number, group in enumerate(trace.groups):
+        if number < len(trace.rounds):
+            ledger.round = trace.rounds[number]
+        group = copy.deepcopy(group)
+        for txn in group:
+            if "lsig" in txn and txn["lsig"][0].source_hash in replacements:
+                txn["lsig"] = (replacements[txn["lsig"][0].source_hash], txn["lsig"][1])
+        results.append(avm.execute_group(group))
+    return results, ledger
+
+def error_reason(error: str | None):
+    # pc and line move when a program is rewritten, the reason shouldn't
+    return None if error is None else re.sub(r" pc=\d+", "", error.split(". Details:")[0])
+
+def diff_replays(expected: tuple, actual: tuple):
+    """Differences between two replay_trace results, as readable strings (empty when equivalent)."""
+    differences = []
+    expected_results, expected_ledger = expected
+    actual_results, actual_ledger = actual
+    for index, (before, after) in enumerate(zip(expected_results, actual_results)):
+        if before.ok != after.ok or error_reason(before.error) != error_reason(after.error):
+            differences.append(f"group {index}: {error_reason(before.error) or 'ok'} != {error_reason(after.error) or 'ok'}")
+            continue
+        for call_before, call_after in zip(before.calls, after.calls):
+            if call_before.logs != call_after.logs:
+                differences.append(f"group {index} txn {call_before.txn_index}: logs differ")
+    if expected_ledger.state() != actual_ledger.state():
+        differences.append("final ledger state differs")
+    return differences
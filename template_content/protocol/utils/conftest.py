@@ -0,0 +1,5 @@
+# the modules here import each other as protocol.utils.*, so the tests need the project root on the path
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
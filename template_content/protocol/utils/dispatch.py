@@ -0,0 +1,173 @@
+# pylint: disable=C0114,C0116,C0115,C0103,C0301
+"""
+Jump-table method dispatch for the main and voting routers.
+
+pyteal compiles the `handle_noop`/`on_noop` Cond into a chain of
+`txna ApplicationArgs 0; method "sig"; ==; bnz label` checks, so every method pays 4 ops
+for each method listed before it. With GORACLE_DISPATCH_MODE=match the chain is rewritten
+after compilation into a single jump table:
+
+    pushbytess <selector> <selector> ...
+    txna ApplicationArgs 0
+    match <label> <label> ...
+    err
+
+which costs 3 ops whatever the method. Table entries are ordered by the call-frequency
+profile (GORACLE_DISPATCH_PROFILE, default assets/dispatch_profile.json): `match` scans
+linearly inside the node, and the same weights average the per-method comparison.
+"""
+import os
+import json
+import hashlib
+from dataclasses import dataclass, field
+
+from .teal_cost import analyze_teal, split_teal_line
+
+DISPATCH_MODES = ("cond", "match")
+DEFAULT_PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "dispatch_profile.json")
+
+@dataclass
+class RouterClause:
+    # one `bnz`: several signatures when the Cond branch is an Or() of selectors
+    signatures: list[str] = field(default_factory=list)
+    label: str = ""
+
+@dataclass
+class Router:
+    start: int
+    end: int
+    clauses: list[RouterClause]
+
+def method_selector(signature: str):
+    return hashlib.new("sha512_256", signature.encode()).digest()[:4]
+
+def method_name(signature: str):
+    return signature.split("(")[0]
+
+def parse_clause(tokens: list[list[str]], position: int):
+    """The router clause starting at `position`, as (RouterClause, next position) or (None, position)."""
+    clause = RouterClause()
+    cursor = position
+    while True:
+        compare = tokens[cursor:cursor + 3]
+        if (
+            len(compare) < 3 or compare[0] != ["txna", "ApplicationArgs", "0"]
+            or len(compare[1]) != 2 or compare[1][0] != "method" or compare[2] != ["=="]
+        ):
+            return None, position
+        clause.signatures.append(compare[1][1].strip('"'))
+        cursor += 3
+        # selectors after the first are joined with `||`
+        if len(clause.signatures) > 1:
+            if tokens[cursor:cursor + 1] != [["||"]]:
+                return None, position
+            cursor += 1
+        if cursor < len(tokens) and len(tokens[cursor]) == 2 and tokens[cursor][0] == "bnz":
+            clause.label = tokens[cursor][1]
+            return clause, cursor + 1
+
+def find_routers(teal: str):
+    """Selector chains of at least two clauses that fall through to `err`, by line index."""
+    lines = teal.splitlines()
+    tokens = [split_teal_line(line) for line in lines]
+    routers = []
+    position = 0
+    while position < len(tokens):
+        clauses = []
+        cursor = position
+        while True:
+            clause, cursor = parse_clause(tokens, cursor)
+            if clause is None:
+                break
+            clauses.append(clause)
+        if len(clauses) > 1 and tokens[cursor:cursor + 1] == [["err"]]:
+            routers.append(Router(position, cursor + 1, clauses))
+            position = cursor + 1
+        else:
+            position += 1
+    return routers
+
+def load_profile(contract_name: str, profile_path: str | None = None):
+    """Call weights by method name for one contract, e.g. {"request": 1000, "init": 0}."""
+    profile_path = profile_path or os.environ.get("GORACLE_DISPATCH_PROFILE") or DEFAULT_PROFILE_PATH
+    if not os.path.exists(profile_path):
+        return {}
+    with open(profile_path) as profile_file:
+        return json.load(profile_file).get(contract_name, {})
+
+def jump_table(clauses: list[RouterClause], profile: dict):
+    entries = [(signature, clause.label) for clause in clauses for signature in clause.signatures]
+    # hottest first; ties keep the Cond order
+    entries.sort(key=lambda entry: -profile.get(method_name(entry[0]), 0))
+    return [
+        "pushbytess " + " ".join("0x" + method_selector(signature).hex() for signature, _ in entries),
+        "txna ApplicationArgs 0",
+        "match " + " ".join(label for _, label in entries),
+        "err",
+    ]
+
+def apply_dispatch(teal: str, profile: dict):
+    """Rewrite every selector chain in `teal` into a `match` jump table (needs AVM v8)."""
+    lines = teal.splitlines()
+    for router in reversed(find_routers(teal)):
+        lines[router.start:router.end] = jump_table(router.clauses, profile)
+    return "\n".join(lines) + ("\n" if teal.endswith("\n") else "")
+
+def apply_dispatch_mode(teal: str, contract_name: str, mode: str | None = None):
+    """Apply GORACLE_DISPATCH_MODE (default "cond", which leaves pyteal's router as is)."""
+    mode = mode or os.environ.get("GORACLE_DISPATCH_MODE") or "cond"
+    if mode not in DISPATCH_MODES:
+        raise ValueError(f"unknown dispatch mode {mode}, expected one of {DISPATCH_MODES}")
+    if mode == "cond":
+        return teal
+    return apply_dispatch(teal, load_profile(contract_name))
+
+def router_signatures(teal: str):
+    return [signature for router in find_routers(teal) for clause in router.clauses for signature in clause.signatures]
+
+def compare_dispatch(cond_teal: str, contract_name: str, profile: dict | None = None):
+    """Per-method dispatch and worst-case cost of the Cond router against the jump table.
+
+    Returns {"methods": {signature: {...}}, "weighted": {...}} where the weighted numbers are
+    the profile-weighted mean dispatch cost of a call.
+    """
+    if profile is None:
+        profile = load_profile(contract_name)
+    signatures = router_signatures(cond_teal)
+    cond_report = analyze_teal(cond_teal, contract_name)
+    match_report = analyze_teal(apply_dispatch(cond_teal, profile), contract_name, signatures=signatures)
+
+    methods = {}
+    for signature in signatures:
+        cond_method = cond_report["methods"][signature]
+        match_method = match_report["methods"][signature]
+        methods[signature] = {
+            "calls": profile.get(method_name(signature), 0),
+            "cond_dispatch": cond_method["dispatch_cost"],
+            "match_dispatch": match_method["dispatch_cost"],
+            "cond_worst": cond_method["worst_cost"],
+            "match_worst": match_method["worst_cost"],
+            "saved": cond_method["worst_cost"] - match_method["worst_cost"],
+        }
+
+    total_calls = sum(method["calls"] for method in methods.values())
+    weighted = {}
+    for key in ("cond_dispatch", "match_dispatch"):
+        if total_calls:
+            weighted[key] = sum(method[key] * method["calls"] for method in methods.values()) / total_calls
+        else:
+            weighted[key] = sum(method[key] for method in methods.values()) / max(len(methods), 1)
+    return {"name": contract_name, "methods": methods, "weighted": weighted}
+
+def format_comparison(comparison: dict):
+    lines = [
+        f"{comparison['name']}: dispatch cost per call {comparison['weighted']['cond_dispatch']:.1f} (cond)"
+        f" -> {comparison['weighted']['match_dispatch']:.1f} (match), weighted by call profile",
+        f"  {'method':<32} {'calls':>7} {'cond':>6} {'match':>6} {'worst cond':>11} {'worst match':>12}",
+    ]
+    for signature, method in sorted(comparison["methods"].items(), key=lambda item: -item[1]["calls"]):
+        lines.append(
+            f"  {method_name(signature):<32} {method['calls']:>7} {method['cond_dispatch']:>6} {method['match_dispatch']:>6}"
+            f" {method['cond_worst']:>11} {method['match_worst']:>12}"
+        )
+    return "\n".join(lines)
@@ -5,6 +5,7 @@ import os
 from pyteal import *
 from .abi_types import *
 from .inline import InlineAssembly
+from .smart_assert import site_marker, smart_assert_mode
 
 ABI_PATH = "assets/abi"
 if "GORACLE_ABI_PATH" in os.environ:
@@ -14,18 +15,30 @@ main_contract_abi = json.load(open(ABI_PATH + "/main-contract.json"))
 voting_contract_abi = json.load(open(ABI_PATH + "/voting-contract.json"))
 smart_assert_errors = json.load(open(ABI_PATH + "/../smart_assert_errors.json"))
 
-def calc_box_cost(key_size_bytes:int,box_size_bytes:int):
+def box_cost(key_size_bytes:int,box_size_bytes:int):
     # (2500 per box) + (400 * (key size + box size))
     if key_size_bytes > 64:
         raise Exception("key size is over 64 bytes")
-    cost = (
-        Int(2500) + Int(400) * 
-        (
-            Int(key_size_bytes) +
-            Int(box_size_bytes)
-        )
-    )
-    return cost
+    return 2500 + 400 * (key_size_bytes + box_size_bytes)
+
+def calc_box_cost(key_size_bytes:int,box_size_bytes:int):
+    # the sizes are known at build time, so the program only pushes the result
+    return Int(box_cost(key_size_bytes, box_size_bytes))
+
+def is_template(value):
+    # a `TMPL_*` name in place of a build parameter is filled in at deploy time, see template_patch.py
+    return isinstance(value, str) and value.startswith("TMPL_")
+
+def template_int(value):
+    return Tmpl.Int(value) if is_template(value) else Int(value)
+
+def template_bytes(value, encoding:str | None = None):
+    if is_template(value):
+        return Tmpl.Bytes(value)
+    return Bytes(encoding, value) if encoding else Bytes(value)
+
+def template_addr(value):
+    return Tmpl.Addr(value) if is_template(value) else Addr(value)
 
 def get_abi_method(method_name,contract:str):
     method_dict = {
@@ -390,11 +403,116 @@ def unstake_token(goracle_main_app_id, gora_token_id, amount_to_unstake):
 Assert with a number to indentify it in API error message. The message will be:
 "shr arg too big, (%d)" where in "%d" 6 lowest decinals are the line number and
 any above that are the error code. Error types are defined "error_codes.json"
+
+With GORACLE_SMART_ASSERT=compact it is a plain assert tagged for the build's
+error map instead, see utils/smart_assert.py.
 """
 def SmartAssert(cond, err_type = 0):
     if type(err_type) == str:
         err_type = smart_assert_errors.index(err_type) # map mnemonic to code
-    err_line = sys._getframe().f_back.f_lineno # calling line number
+    caller = sys._getframe().f_back
+    err_line = caller.f_lineno # calling line number
+    if smart_assert_mode() == "compact":
+        source = "{}:{}".format(os.path.basename(caller.f_code.co_filename), err_line)
+        return InlineAssembly("assert " + site_marker(err_type, source), cond)
     return If(Not(cond)).Then(
         InlineAssembly("int 0\nint {}\nshr\n".format(err_type * 1000000 + err_line))
-    )
\ No newline at end of file
+    )
+"""
+Global state values, and uint64 values computed from them, read into scratch once per
+method call and reused from there.
+
+Reads go through `get()` and `load()` runs the scratch stores. Both resolve when the program
+is compiled, once every read is known. A global read is two ops against one for a scratch
+load, so from its `min_reads`th read on a key costs no more from scratch and is read from
+global state once; below that it is read directly. `load()` with no names stores the cached
+keys, put it at the start of the method body.
+
+A value from `define()` is cached once it is read twice. It is only computed where the method
+calls `load(name)`, which has to come before its reads on every path that has them, so a value
+that can fail (an overflow, say) fails on the paths that use it and nowhere else. Keys can be
+named there too, to keep their loads off the paths that don't read them. Reads are counted over
+the whole method. Only cache keys the method doesn't write.
+"""
+class GlobalStateCache():
+    def __init__(self, keys:dict, min_reads:int = 3):
+        self.keys = keys
+        self.min_reads = min_reads
+        self.reads: dict[str, int] = {}
+        self.definitions: dict[str, Expr] = {}
+        self.slots: dict[str, ScratchVar] = {}
+        # names given to a load() and names whose stores have been compiled
+        self.placed: set[str] = set()
+        self.loaded: set[str] = set()
+
+    def define(self, name:str, value:Expr):
+        self.definitions[name] = value
+
+    def get(self, name:str):
+        self.reads[name] = self.reads.get(name, 0) + 1
+        return CachedGlobalRead(self, name)
+
+    def load(self, *names:str):
+        self.placed.update(names)
+        return CachedGlobalLoad(self, names)
+
+    def cached(self, name:str):
+        return self.reads.get(name, 0) >= (2 if name in self.definitions else self.min_reads)
+
+    def uncached_expr(self, name:str):
+        if name in self.definitions:
+            return self.definitions[name]
+        return App.globalGet(self.keys[name])
+
+    def read_expr(self, name:str):
+        if not self.cached(name):
+            return self.uncached_expr(name)
+        if name not in self.loaded:
+            raise TealInputError(f"{name} is read before a load() stores it")
+        return self.slots[name].load()
+
+    def load_expr(self, names:tuple):
+        if not names:
+            names = [name for name in self.reads if name not in self.definitions and name not in self.placed]
+        # definitions come last, they can read the cached keys
+        names = sorted((name for name in names if self.cached(name)), key=lambda name: name in self.definitions)
+        for name in names:
+            self.slots.setdefault(name, ScratchVar(TealType.uint64))
+            self.loaded.add(name)
+        return Seq([self.slots[name].store(self.uncached_expr(name)) for name in names])
+
+class CachedGlobalRead(Expr):
+    def __init__(self, cache:GlobalStateCache, name:str):
+        super().__init__()
+        self.cache = cache
+        self.name = name
+
+    def __teal__(self, options):
+        return self.cache.read_expr(self.name).__teal__(options)
+
+    def __str__(self):
+        return "(CachedGlobalRead {})".format(self.name)
+
+    def type_of(self):
+        return TealType.uint64
+
+    def has_return(self):
+        return False
+
+class CachedGlobalLoad(Expr):
+    def __init__(self, cache:GlobalStateCache, names:tuple):
+        super().__init__()
+        self.cache = cache
+        self.names = names
+
+    def __teal__(self, options):
+        return self.cache.load_expr(self.names).__teal__(options)
+
+    def __str__(self):
+        return "(CachedGlobalLoad {})".format(list(self.names or self.cache.reads))
+
+    def type_of(self):
+        return TealType.none
+
+    def has_return(self):
+        return False
@@ -0,0 +1,85 @@
+# pylint: disable=C0114,C0116,C0115,C0103,C0301
+"""
+SmartAssert error maps and failure message decoding.
+
+By default (GORACLE_SMART_ASSERT=full) a failing SmartAssert runs `int 0; int N; shr`, so the
+node reports "shr arg too big, (N)" with N = error code * 1000000 + source line. That costs a
+branch and two constants at every call site.
+
+With GORACLE_SMART_ASSERT=compact each site compiles to a bare `assert` tagged with a comment:
+
+    assert // smart_assert <code> <file>:<line>
+
+The node then reports "assert failed pc=N", and the build keeps an error map from the tags
+(and the algod source map, for pcs) to turn the pc back into the error and source line.
+"""
+import os
+import re
+import sys
+import json
+
+SMART_ASSERT_MODES = ("full", "compact")
+SMART_ASSERT_MARKER = "smart_assert"
+ERRORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "smart_assert_errors.json")
+
+smart_assert_errors = json.load(open(ERRORS_PATH))
+
+def smart_assert_mode():
+    mode = os.environ.get("GORACLE_SMART_ASSERT", "full")
+    if mode not in SMART_ASSERT_MODES:
+        raise ValueError(f"unknown GORACLE_SMART_ASSERT {mode}, expected one of {SMART_ASSERT_MODES}")
+    return mode
+
+def site_marker(err_type: int, source: str):
+    return f"// {SMART_ASSERT_MARKER} {err_type} {source}"
+
+def error_name(code: int):
+    return smart_assert_errors[code] if code < len(smart_assert_errors) else f"UNKNOWN_{code}"
+
+def error_map(teal: str, sourcemap: dict | None = None):
+    """The compact SmartAssert sites of a program, with their pcs when an algod source map is given."""
+    line_pcs = {}
+    if sourcemap:
+        from algosdk.source_map import SourceMap
+        # source map lines are 0-based, and an assert is a single byte
+        line_pcs = {line + 1: pcs[0] for line, pcs in SourceMap(sourcemap).line_to_pc.items()}
+
+    sites = []
+    pattern = re.compile(rf"^\s*assert\s+//\s*{SMART_ASSERT_MARKER}\s+(\d+)\s+(\S+)")
+    for teal_line, text in enumerate(teal.splitlines(), start=1):
+        match = pattern.match(text)
+        if match:
+            code = int(match.group(1))
+            sites.append({
+                "pc": line_pcs.get(teal_line),
+                "teal_line": teal_line,
+                "code": code,
+                "error": error_name(code),
+                "source": match.group(2),
+            })
+    return sites
+
+def decode_error(message: str, sites: list | None = None):
+    """Name the SmartAssert behind a failed transaction's message as ERROR@file:line (or ERROR@line
+    for full mode asserts, which only carry the line), or None when it isn't one."""
+    full = re.search(r"shr arg too big, \((\d+)\)", message)
+    if full:
+        code, line = divmod(int(full.group(1)), 1000000)
+        return f"{error_name(code)}@{line}"
+
+    failed = re.search(r"assert failed pc=(\d+)", message)
+    if not failed or not sites:
+        return None
+    # algod reports the bytecode pc; the offline AVM counts pcs in ops but also reports the TEAL line
+    teal_line = re.search(r"line=(\d+)", message)
+    key, value = ("teal_line", int(teal_line.group(1))) if teal_line else ("pc", int(failed.group(1)))
+    for site in sites:
+        if site[key] == value:
+            return f"{site['error']}@{site['source']}"
+    return None
+
+if __name__ == "__main__":
+    # python smart_assert.py <error map json> <contract> "<failed transaction message>"
+    with open(sys.argv[1]) as map_file:
+        error_maps = json.load(map_file)
+    print(decode_error(sys.argv[3], error_maps[sys.argv[2]]) or "not a SmartAssert failure")
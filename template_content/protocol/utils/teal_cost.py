@@ -0,0 +1,589 @@
+# pylint: disable=C0114,C0116,C0115,C0103,C0301,R0902,R0912,R0914
+"""
+Static worst-case opcode cost and program size analysis of compiled TEAL.
+
+The program is split into basic blocks and a control flow graph is built from the
+branch ops. Subroutines are costed once and charged at every `callsub`, and each
+ABI method is attributed to the block the router branches to for its selector.
+Loops can't be bounded statically: a loop body is counted once and the result is
+flagged, so treat those numbers as a lower bound.
+"""
+import re
+import sys
+import json
+import base64
+import hashlib
+import argparse
+from dataclasses import dataclass, field
+
+APP_CALL_BUDGET = 700
+LSIG_BUDGET = 20000
+MAX_GROUP_SIZE = 16
+PAGE_SIZE = 2048
+
+# AVM v8 opcodes that don't cost 1
+OPCODE_COSTS = {
+    "sha256": 35,
+    "keccak256": 130,
+    "sha512_256": 45,
+    "sha3_256": 130,
+    "ed25519verify": 1900,
+    "ed25519verify_bare": 1900,
+    "ecdsa_verify": 1700,
+    "ecdsa_pk_decompress": 650,
+    "ecdsa_pk_recover": 2000,
+    "vrf_verify": 5700,
+    "divmodw": 20,
+    "expw": 10,
+    "sqrt": 4,
+    "bsqrt": 40,
+    "b+": 10,
+    "b-": 10,
+    "b*": 20,
+    "b/": 20,
+    "b%": 20,
+    "b|": 6,
+    "b&": 6,
+    "b^": 6,
+    "b~": 4,
+    "bn256_add": 70,
+    "bn256_scalar_mul": 970,
+    "bn256_pairing": 8700,
+}
+
+# size in bytes of each op's immediates, for ops that have fixed-size immediates
+IMMEDIATE_BYTES = {
+    "txn": 1, "global": 1, "load": 1, "store": 1, "gload": 2, "gloads": 1, "gaid": 1,
+    "txna": 2, "txnas": 1, "gtxn": 2, "gtxna": 3, "gtxnas": 2, "gtxns": 1, "gtxnsa": 2, "gtxnsas": 1,
+    "itxn": 1, "itxna": 2, "itxnas": 1, "gitxn": 2, "gitxna": 3, "gitxnas": 2, "itxn_field": 1,
+    "extract": 2, "substring": 2, "replace2": 1, "dig": 1, "bury": 1, "cover": 1, "uncover": 1,
+    "dupn": 1, "popn": 1, "proto": 2, "frame_dig": 1, "frame_bury": 1, "arg": 1,
+    "app_params_get": 1, "asset_params_get": 1, "asset_holding_get": 1, "acct_params_get": 1,
+    "json_ref": 1, "base64_decode": 1, "ecdsa_verify": 1, "ecdsa_pk_decompress": 1,
+    "ecdsa_pk_recover": 1, "vrf_verify": 1, "block": 1, "intc": 1, "bytec": 1,
+    "b": 2, "bz": 2, "bnz": 2, "callsub": 2,
+}
+
+# named integer constants pyteal emits as `int <Name>`
+NAMED_INTS = {
+    "NoOp": 0, "OptIn": 1, "CloseOut": 2, "ClearState": 3, "UpdateApplication": 4, "DeleteApplication": 5,
+    "unknown": 0, "pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6,
+}
+
+BRANCH_OPS = ("b", "bz", "bnz")
+TERMINAL_OPS = ("return", "err", "retsub")
+JUMP_TABLE_OPS = ("switch", "match")
+
+@dataclass
+class Instruction:
+    op: str
+    args: list[str]
+    line: int
+
+@dataclass
+class Block:
+    index: int
+    labels: list[str] = field(default_factory=list)
+    instructions: list[Instruction] = field(default_factory=list)
+    successors: list[int] = field(default_factory=list)
+    calls: list[str] = field(default_factory=list)
+
+def varuint_size(value: int):
+    size = 1
+    while value >= 0x80:
+        value >>= 7
+        size += 1
+    return size
+
+def split_teal_line(line: str):
+    # tokens are space separated, except inside double quoted strings; `//` starts a comment
+    tokens = []
+    for match in re.finditer(r'"(?:[^"\\]|\\.)*"|//.*|\S+', line):
+        token = match.group(0)
+        if token.startswith("//"):
+            break
+        tokens.append(token)
+    return tokens
+
+def decode_byte_constant(args: list[str]):
+    if not args:
+        return b""
+    if args[0].startswith("0x"):
+        return bytes.fromhex(args[0][2:])
+    if args[0].startswith('"'):
+        return args[0][1:-1].encode().decode("unicode_escape").encode("latin-1")
+    if args[0] in ("base64", "b64") and len(args) > 1:
+        return base64.b64decode(args[1])
+    if args[0].startswith(("base64(", "b64(")):
+        return base64.b64decode(args[0][args[0].index("(") + 1:-1])
+    if args[0] in ("base32", "b32") and len(args) > 1:
+        return base64.b32decode(args[1] + "=" * (-len(args[1]) % 8))
+    return args[0].encode()
+
+def parse_int_constant(arg: str):
+    if arg in NAMED_INTS:
+        return NAMED_INTS[arg]
+    return int(arg, 0)
+
+def instruction_cost(instruction: Instruction):
+    return OPCODE_COSTS.get(instruction.op, 1)
+
+class TealProgram():
+    def __init__(self, teal: str):
+        self.version = 1
+        self.instructions: list[Instruction] = []
+        self.blocks: list[Block] = []
+        self.label_blocks: dict[str, int] = {}
+        self.subroutine_costs: dict[str, tuple[int, bool]] = {}
+        self.parse(teal)
+        self.build_blocks()
+        self.implied_constant_blocks = self.count_implied_constant_blocks()
+
+    def count_implied_constant_blocks(self):
+        # the assembler pools repeated `int`/`byte` pseudo-ops into intcblock/bytecblock at the
+        # start of the program, and each of those executes once; explicit blocks are costed as ops
+        if any(instruction.op in ("intcblock", "bytecblock") for instruction in self.instructions):
+            return 0
+        int_counts, byte_counts = self.constant_usage()
+        return int(any(count > 1 for count in int_counts.values())) + int(any(count > 1 for count in byte_counts.values()))
+
+    def parse(self, teal: str):
+        pending_labels = []
+        self.labels_before: dict[int, list[str]] = {}
+        for line_number, line in enumerate(teal.splitlines(), start=1):
+            tokens = split_teal_line(line)
+            if not tokens:
+                continue
+            if tokens[0] == "#pragma":
+                if tokens[1] == "version":
+                    self.version = int(tokens[2])
+                continue
+            if tokens[0].endswith(":"):
+                pending_labels.append(tokens[0][:-1])
+                continue
+            if pending_labels:
+                self.labels_before[len(self.instructions)] = pending_labels
+                pending_labels = []
+            self.instructions.append(Instruction(tokens[0], tokens[1:], line_number))
+        if pending_labels:
+            self.labels_before[len(self.instructions)] = pending_labels
+
+    def build_blocks(self):
+        block = Block(0)
+        for position, instruction in enumerate(self.instructions):
+            if position in self.labels_before and (block.instructions or block.labels):
+                if block.instructions:
+                    self.blocks.append(block)
+                    block = Block(len(self.blocks))
+            block.labels.extend(self.labels_before.get(position, []))
+            block.instructions.append(instruction)
+            if instruction.op == "callsub":
+                block.calls.append(instruction.args[0])
+            if instruction.op in BRANCH_OPS + TERMINAL_OPS + JUMP_TABLE_OPS:
+                self.blocks.append(block)
+                block = Block(len(self.blocks))
+        # trailing labels (pyteal puts a final label before nothing at all sometimes)
+        block.labels.extend(self.labels_before.get(len(self.instructions), []))
+        if block.instructions or block.labels:
+            self.blocks.append(block)
+
+        for block in self.blocks:
+            for label in block.labels:
+                self.label_blocks[label] = block.index
+
+        for block in self.blocks:
+            if not block.instructions:
+                continue
+            last = block.instructions[-1]
+            fallthrough = [block.index + 1] if block.index + 1 < len(self.blocks) else []
+            if last.op == "b":
+                block.successors = [self.label_blocks[last.args[0]]]
+            elif last.op in ("bz", "bnz"):
+                block.successors = [self.label_blocks[last.args[0]]] + fallthrough
+            elif last.op in JUMP_TABLE_OPS:
+                block.successors = [self.label_blocks[label] for label in last.args] + fallthrough
+            elif last.op in TERMINAL_OPS:
+                block.successors = []
+            else:
+                block.successors = fallthrough
+
+    # -- graph helpers --
+
+    def reachable(self, start: int):
+        seen = []
+        stack = [start]
+        visited = set()
+        while stack:
+            index = stack.pop()
+            if index in visited:
+                continue
+            visited.add(index)
+            seen.append(index)
+            stack.extend(reversed(self.blocks[index].successors))
+        return seen
+
+    def strongly_connected(self, nodes: list[int]):
+        # iterative Tarjan over the subgraph `nodes`
+        node_set = set(nodes)
+        index_of, lowlink, on_stack = {}, {}, set()
+        stack, components = [], []
+        counter = 0
+        for root in nodes:
+            if root in index_of:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, child_position = work.pop()
+                if child_position == 0:
+                    index_of[node] = lowlink[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack.add(node)
+                successors = [s for s in self.blocks[node].successors if s in node_set]
+                recursed = False
+                for position in range(child_position, len(successors)):
+                    successor = successors[position]
+                    if successor not in index_of:
+                        work.append((node, position + 1))
+                        work.append((successor, 0))
+                        recursed = True
+                        break
+                    if successor in on_stack:
+                        lowlink[node] = min(lowlink[node], index_of[successor])
+                if recursed:
+                    continue
+                if lowlink[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+        # Tarjan emits components in reverse topological order
+        return list(reversed(components))
+
+    def block_cost(self, index: int, in_progress: set):
+        cost = sum(instruction_cost(instruction) for instruction in self.blocks[index].instructions)
+        if index == 0:
+            cost += self.implied_constant_blocks
+        has_loop = False
+        for label in self.blocks[index].calls:
+            sub_cost, sub_loop = self.subroutine_cost(label, in_progress)
+            cost += sub_cost
+            has_loop = has_loop or sub_loop
+        return cost, has_loop
+
+    def longest_paths(self, start: int, in_progress: set | None = None):
+        """Worst-case cost into and out of every block reachable from `start`.
+
+        Returns (cost_to, cost_from, has_loop): cost_to[b] is the most expensive path from
+        `start` up to and including b, cost_from[b] the most expensive from b to an exit.
+        """
+        in_progress = in_progress or set()
+        nodes = self.reachable(start)
+        components = self.strongly_connected(nodes)
+        component_of = {node: position for position, component in enumerate(components) for node in component}
+
+        has_loop = False
+        component_costs = []
+        for component in components:
+            cost = 0
+            for node in component:
+                block_cost, block_loop = self.block_cost(node, in_progress)
+                cost += block_cost
+                has_loop = has_loop or block_loop
+            if len(component) > 1 or component[0] in self.blocks[component[0]].successors:
+                has_loop = True
+            component_costs.append(cost)
+
+        component_successors = [set() for _ in components]
+        for node in nodes:
+            for successor in self.blocks[node].successors:
+                if component_of[successor] != component_of[node]:
+                    component_successors[component_of[node]].add(component_of[successor])
+
+        cost_to = [0] * len(components)
+        cost_to[component_of[start]] = component_costs[component_of[start]]
+        for position in range(len(components)):
+            for successor in component_successors[position]:
+                cost_to[successor] = max(cost_to[successor], cost_to[position] + component_costs[successor])
+
+        cost_from = list(component_costs)
+        for position in reversed(range(len(components))):
+            for successor in component_successors[position]:
+                cost_from[position] = max(cost_from[position], component_costs[position] + cost_from[successor])
+
+        return (
+            {node: cost_to[component_of[node]] for node in nodes},
+            {node: cost_from[component_of[node]] for node in nodes},
+            has_loop
+        )
+
+    def subroutine_cost(self, label: str, in_progress: set | None = None):
+        if label in self.subroutine_costs:
+            return self.subroutine_costs[label]
+        in_progress = set(in_progress or ())
+        if label in in_progress:
+            # recursion: can't be bounded, count the body once and flag it
+            return 0, True
+        in_progress.add(label)
+        start = self.label_blocks[label]
+        _, cost_from, has_loop = self.longest_paths(start, in_progress)
+        self.subroutine_costs[label] = (cost_from[start], has_loop)
+        return self.subroutine_costs[label]
+
+    # -- reports --
+
+    def subroutine_labels(self):
+        labels = []
+        for instruction in self.instructions:
+            if instruction.op == "callsub" and instruction.args[0] not in labels:
+                labels.append(instruction.args[0])
+        return labels
+
+    def method_labels(self, signatures: list[str] | None = None):
+        """Selector branches of the router, as {method signature: label}.
+
+        Matches the `txna ApplicationArgs 0; method "sig"; ==; bnz label` sequence pyteal's
+        Router and Cond emit (including `||` joined selectors), as well as `method ...` or
+        `pushbytess` lists feeding a `match`. Selectors pushed as bytes are named from
+        `signatures`, or by their hex when not listed.
+        """
+        methods = {}
+        pending = []
+        for position in range(len(self.instructions) - 3):
+            first, second, third, fourth = self.instructions[position:position + 4]
+            if (
+                first.op == "txna" and first.args == ["ApplicationArgs", "0"] and second.op == "method"
+                and third.op == "=="
+            ):
+                pending.append(second.args[0].strip('"'))
+                if fourth.op == "bnz":
+                    for signature in pending:
+                        methods[signature] = fourth.args[0]
+                    pending = []
+                elif fourth.op not in ("txna", "||"):
+                    pending = []
+            elif first.op == "||" and second.op == "bnz":
+                for signature in pending:
+                    methods[signature] = second.args[0]
+                pending = []
+
+        selectors = {hashlib.new("sha512_256", signature.encode()).digest()[:4]: signature for signature in signatures or []}
+        for position, instruction in enumerate(self.instructions):
+            if instruction.op != "match":
+                continue
+            table = []
+            back = position - 1
+            if back >= 0 and self.instructions[back].op == "txna":
+                back -= 1
+            if back >= 0 and self.instructions[back].op == "pushbytess":
+                for arg in self.instructions[back].args:
+                    selector = decode_byte_constant([arg])
+                    table.append(selectors.get(selector, "0x" + selector.hex()))
+            else:
+                back = position - 1
+                while back >= 0 and self.instructions[back].op == "method":
+                    table.insert(0, self.instructions[back].args[0].strip('"'))
+                    back -= 1
+            for signature, label in zip(table, instruction.args):
+                methods[signature] = label
+        return methods
+
+    def constant_usage(self):
+        int_counts, byte_counts = {}, {}
+        for instruction in self.instructions:
+            if instruction.op == "int":
+                value = parse_int_constant(instruction.args[0])
+                int_counts[value] = int_counts.get(value, 0) + 1
+            elif instruction.op == "byte":
+                value = decode_byte_constant(instruction.args)
+                byte_counts[value] = byte_counts.get(value, 0) + 1
+            elif instruction.op == "addr":
+                byte_counts[instruction.args[0]] = byte_counts.get(instruction.args[0], 0) + 1
+            elif instruction.op == "method":
+                byte_counts[instruction.args[0]] = byte_counts.get(instruction.args[0], 0) + 1
+        return int_counts, byte_counts
+
+    def instruction_size(self, instruction: Instruction, int_counts: dict, byte_counts: dict):
+        # mirrors the assembler's constant handling closely enough for a size estimate:
+        # repeated constants go through intc/bytec, one-off constants are pushed inline
+        op, args = instruction.op, instruction.args
+        if op in ("int", "pushint"):
+            value = parse_int_constant(args[0])
+            if op == "int" and int_counts.get(value, 0) > 1:
+                return 1 if sorted(int_counts, key=int_counts.get, reverse=True).index(value) < 4 else 2
+            return 1 + varuint_size(value)
+        if op in ("byte", "pushbytes", "addr", "method"):
+            if op == "addr":
+                key, length = args[0], 32
+            elif op == "method":
+                key, length = args[0], 4
+            else:
+                key = decode_byte_constant(args)
+                length = len(key)
+            if op != "pushbytes" and byte_counts.get(key, 0) > 1:
+                return 1 if sorted(byte_counts, key=byte_counts.get, reverse=True).index(key) < 4 else 2
+            return 1 + varuint_size(length) + length
+        if op in JUMP_TABLE_OPS:
+            return 2 + 2 * len(args)
+        if op == "pushints":
+            return 1 + varuint_size(len(args)) + sum(varuint_size(parse_int_constant(arg)) for arg in args)
+        if op == "pushbytess":
+            values = [decode_byte_constant([arg]) for arg in args]
+            return 1 + varuint_size(len(values)) + sum(varuint_size(len(value)) + len(value) for value in values)
+        if op == "intcblock":
+            return 1 + varuint_size(len(args)) + sum(varuint_size(int(arg, 0)) for arg in args)
+        if op == "bytecblock":
+            values = [decode_byte_constant([arg]) for arg in args]
+            return 1 + varuint_size(len(values)) + sum(varuint_size(len(value)) + len(value) for value in values)
+        return 1 + IMMEDIATE_BYTES.get(op, 0)
+
+    def constant_block_sizes(self, int_counts: dict, byte_counts: dict):
+        ints = [value for value, count in int_counts.items() if count > 1]
+        byte_values = [value for value, count in byte_counts.items() if count > 1]
+        size = 0
+        if ints:
+            size += 1 + varuint_size(len(ints)) + sum(varuint_size(value) for value in ints)
+        if byte_values:
+            # addr/method keys are strings here; their encoded sizes are 32 and 4 bytes
+            lengths = [len(value) if isinstance(value, bytes) else (4 if value.startswith('"') else 32) for value in byte_values]
+            size += 1 + varuint_size(len(lengths)) + sum(varuint_size(length) + length for length in lengths)
+        return size
+
+    def section_sizes(self):
+        """Estimated bytes per subroutine, plus "main" for code not inside any subroutine."""
+        int_counts, byte_counts = self.constant_usage()
+        block_sizes = [
+            sum(self.instruction_size(instruction, int_counts, byte_counts) for instruction in block.instructions)
+            for block in self.blocks
+        ]
+        owner = {}
+        for label in self.subroutine_labels():
+            for index in self.reachable(self.label_blocks[label]):
+                owner.setdefault(index, label)
+        sizes = {"main": 0}
+        for block in self.blocks:
+            section = owner.get(block.index, "main")
+            sizes[section] = sizes.get(section, 0) + block_sizes[block.index]
+        # version byte and the constant blocks count towards main
+        sizes["main"] += varuint_size(self.version) + self.constant_block_sizes(int_counts, byte_counts)
+        return sizes
+
+def analyze_teal(
+    teal: str,
+    name: str = "program",
+    program_size: int | None = None,
+    clear_program_size: int | None = None,
+    extra_pages: int = 0,
+    budget: int = APP_CALL_BUDGET,
+    signatures: list[str] | None = None
+):
+    program = TealProgram(teal)
+    cost_to, cost_from, has_loop = program.longest_paths(0)
+    section_sizes = program.section_sizes()
+    estimated_size = sum(section_sizes.values())
+
+    methods = {}
+    for signature, label in program.method_labels(signatures).items():
+        block = program.label_blocks[label]
+        method_cost = cost_to[block] + cost_from[block] - program.block_cost(block, set())[0]
+        _, _, method_loop = program.longest_paths(block)
+        methods[signature] = {
+            "label": label,
+            "worst_cost": method_cost,
+            # what the router costs before the method body starts
+            "dispatch_cost": cost_to[block] - program.block_cost(block, set())[0],
+            "has_loop": method_loop,
+            "budget": budget,
+            "app_calls_needed": -(-method_cost // APP_CALL_BUDGET),
+        }
+
+    size = program_size if program_size is not None else estimated_size
+    max_size = PAGE_SIZE * (1 + extra_pages)
+    report = {
+        "name": name,
+        "version": program.version,
+        "worst_cost": cost_from[0],
+        "has_loop": has_loop,
+        "budget": budget,
+        "methods": methods,
+        "subroutines": {
+            label: {"worst_cost": program.subroutine_cost(label)[0], "has_loop": program.subroutine_cost(label)[1], "bytes": section_sizes.get(label, 0)}
+            for label in program.subroutine_labels()
+        },
+        "size": {
+            "bytes": size,
+            "estimated": program_size is None,
+            "clear_bytes": clear_program_size,
+            "extra_pages": extra_pages,
+            "max_bytes": max_size,
+            "headroom": max_size - size - (clear_program_size or 0),
+            "main_bytes": section_sizes["main"],
+        },
+    }
+    return report
+
+def check_budgets(report: dict, budgets: dict):
+    """Budget violations for one analyzed program, as readable strings (empty when within budget).
+
+    budgets = {"budget": 700, "methods": {"<method name>": 1400}, "max_bytes": 8192}
+    """
+    violations = []
+    default_budget = budgets.get("budget", report["budget"])
+    method_budgets = budgets.get("methods", {})
+    for signature, method in report["methods"].items():
+        method_name = signature.split("(")[0]
+        budget = method_budgets.get(method_name, default_budget)
+        if method["worst_cost"] > budget:
+            violations.append(f"{report['name']}.{method_name}: worst case cost {method['worst_cost']} over budget {budget}")
+    if not report["methods"] and report["worst_cost"] > default_budget:
+        violations.append(f"{report['name']}: worst case cost {report['worst_cost']} over budget {default_budget}")
+
+    max_bytes = budgets.get("max_bytes", report["size"]["max_bytes"])
+    total_bytes = report["size"]["bytes"] + (report["size"]["clear_bytes"] or 0)
+    if total_bytes > max_bytes:
+        violations.append(f"{report['name']}: {total_bytes} bytes over limit {max_bytes}")
+    return violations
+
+def format_report(report: dict):
+    lines = [f"{report['name']} (v{report['version']}): worst case {report['worst_cost']}{' + loops' if report['has_loop'] else ''}"]
+    size = report["size"]
+    lines.append(
+        f"  size {'~' if size['estimated'] else ''}{size['bytes']} bytes of {size['max_bytes']} "
+        f"({size['extra_pages']} extra pages), headroom {size['headroom']}"
+    )
+    for signature, method in sorted(report["methods"].items(), key=lambda item: -item[1]["worst_cost"]):
+        lines.append(
+            f"  {signature.split('(')[0]:<32} {method['worst_cost']:>7}{'+' if method['has_loop'] else ' '}"
+            f"  dispatch {method['dispatch_cost']:>4}  app calls {method['app_calls_needed']}"
+        )
+    for label, subroutine in sorted(report["subroutines"].items(), key=lambda item: -item[1]["bytes"]):
+        lines.append(f"  sub {label:<28} {subroutine['worst_cost']:>7}{'+' if subroutine['has_loop'] else ' '}  {subroutine['bytes']:>6} bytes")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worst-case opcode cost and size of a TEAL program")
+    parser.add_argument("teal_file")
+    parser.add_argument("--name")
+    parser.add_argument("--extra-pages", type=int, default=0)
+    parser.add_argument("--budgets", help="JSON file of budgets keyed by program name")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.teal_file) as teal_file:
+        teal_report = analyze_teal(teal_file.read(), args.name or args.teal_file, extra_pages=args.extra_pages)
+    print(json.dumps(teal_report, indent=4) if args.json else format_report(teal_report))
+
+    if args.budgets:
+        with open(args.budgets) as budgets_file:
+            program_budgets = json.load(budgets_file).get(teal_report["name"], {})
+        budget_violations = check_budgets(teal_report, program_budgets)
+        for violation in budget_violations:
+            print(violation)
+        sys.exit(1 if budget_violations else 0)
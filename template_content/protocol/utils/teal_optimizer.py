@@ -0,0 +1,450 @@
+# pylint: disable=C0114,C0116,C0115,C0103,C0301,R0912
+"""
+Peephole optimizer for compiled TEAL, run as a post-compile build stage.
+
+Passes, repeated until nothing changes:
+  - load/store forwarding: `store N; load N` is dropped when that is the only load of N
+  - dead stores: `store N` of a slot that is never loaded becomes `pop`
+  - push/pop cancellation: a side-effect free push followed by `pop` is dropped
+  - constant folding: `int a; int b; <op>` becomes one `int` when the op can't fail on them
+  - condition folding: `int 0; ==` becomes `!`, and `!`/`== 0`/`!= 0` before a branch flip
+    or drop into the branch itself
+  - redundant branches: constant conditions, branches to the next instruction, jumps to
+    jumps, code after an unconditional exit and labels nothing refers to
+  - constant pooling: repeated `int`/`byte` constants go into `intcblock`/`bytecblock`
+    (most used first, so they get the one byte `intc_0..3`/`bytec_0..3` forms), one-off
+    constants become `pushint`/`pushbytes`; template variables (`TMPL_*`) are always pooled so
+    their values can be patched into the blocks at deploy time (see template_patch.py)
+
+Scratch passes are skipped when the program uses dynamic scratch access (`loads`/`stores`),
+and they assume no other transaction reads this program's scratch space with `gload`.
+`method` and `addr` constants are left as they are so the router stays readable.
+"""
+import os
+from dataclasses import dataclass, field
+
+from .teal_cost import (
+    BRANCH_OPS,
+    JUMP_TABLE_OPS,
+    analyze_teal,
+    decode_byte_constant,
+    parse_int_constant,
+    split_teal_line,
+)
+
+# pushes with no side effects that can't fail in a program that already assembled
+PURE_PUSH_OPS = (
+    "int", "byte", "pushint", "pushbytes", "addr", "method", "load", "dup", "txn", "global",
+    "intc", "intc_0", "intc_1", "intc_2", "intc_3", "bytec", "bytec_0", "bytec_1", "bytec_2", "bytec_3",
+)
+EXIT_OPS = ("b", "return", "err", "retsub")
+TEMPLATE_PREFIX = "TMPL_"
+
+MAX_UINT64 = 2**64 - 1
+# uint64 ops on two constants; None where the AVM would fail instead
+FOLDABLE_OPS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b if a >= b else None,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a // b if b else None,
+    "%": lambda a, b: a % b if b else None,
+    "<<": lambda a, b: (a << b) & MAX_UINT64 if b < 64 else None,
+    ">>": lambda a, b: a >> b if b < 64 else None,
+    "&": lambda a, b: a & b,
+    "|": lambda a, b: a | b,
+    "^": lambda a, b: a ^ b,
+    "==": lambda a, b: int(a == b),
+    "!=": lambda a, b: int(a != b),
+    "<": lambda a, b: int(a < b),
+    "<=": lambda a, b: int(a <= b),
+    ">": lambda a, b: int(a > b),
+    ">=": lambda a, b: int(a >= b),
+    "&&": lambda a, b: int(bool(a and b)),
+    "||": lambda a, b: int(bool(a or b)),
+}
+
+@dataclass
+class Line:
+    kind: str
+    tokens: list[str] = field(default_factory=list)
+    text: str = ""
+
+    @property
+    def op(self):
+        return self.tokens[0] if self.kind == "op" else None
+
+def parse_lines(teal: str):
+    lines = []
+    for text in teal.splitlines():
+        stripped = text.strip()
+        if not stripped:
+            continue
+        if stripped.startswith("//"):
+            lines.append(Line("comment", text=stripped))
+            continue
+        tokens = split_teal_line(stripped)
+        if tokens[0] == "#pragma":
+            lines.append(Line("pragma", tokens, stripped))
+        elif len(tokens) == 1 and tokens[0].endswith(":"):
+            lines.append(Line("label", [tokens[0][:-1]], stripped))
+        else:
+            # keeps trailing comments, e.g. the smart_assert site markers the error map is built from
+            lines.append(Line("op", tokens, stripped))
+    return lines
+
+def render(lines: list[Line]):
+    return "\n".join(line.text for line in lines) + "\n"
+
+def op_line(*tokens):
+    return Line("op", list(tokens), " ".join(tokens))
+
+def label_targets(line: Line):
+    if line.op in BRANCH_OPS or line.op == "callsub":
+        return line.tokens[1:2]
+    if line.op in JUMP_TABLE_OPS:
+        return line.tokens[1:]
+    return []
+
+class PeepholeOptimizer():
+    def __init__(self, teal: str):
+        self.lines = parse_lines(teal)
+        self.stats: dict[str, int] = {}
+
+    def count(self, name: str, amount: int = 1):
+        self.stats[name] = self.stats.get(name, 0) + amount
+
+    def ops(self):
+        return [line for line in self.lines if line.kind == "op"]
+
+    def uses_dynamic_scratch(self):
+        return any(line.op in ("loads", "stores", "gload", "gloads", "gloadss") for line in self.lines)
+
+    def load_counts(self):
+        counts = {}
+        for line in self.lines:
+            if line.op == "load":
+                counts[line.tokens[1]] = counts.get(line.tokens[1], 0) + 1
+        return counts
+
+    def referenced_labels(self):
+        return {target for line in self.lines for target in label_targets(line)}
+
+    def forward_stores(self):
+        changed = False
+        load_counts = self.load_counts()
+        index = 0
+        while index < len(self.lines) - 1:
+            line, following = self.lines[index], self.lines[index + 1]
+            if (
+                line.op == "store" and following.op == "load" and line.tokens[1] == following.tokens[1]
+                and load_counts.get(line.tokens[1]) == 1
+            ):
+                # the value stays on the stack; any other store to the slot is now dead
+                del self.lines[index:index + 2]
+                load_counts[line.tokens[1]] = 0
+                self.count("forwarded loads")
+                changed = True
+                continue
+            if line.op == "load" and following.op == "store" and line.tokens[1] == following.tokens[1]:
+                del self.lines[index:index + 2]
+                self.count("self copies")
+                changed = True
+                continue
+            index += 1
+        return changed
+
+    def eliminate_dead_stores(self):
+        changed = False
+        load_counts = self.load_counts()
+        for index, line in enumerate(self.lines):
+            if line.op == "store" and not load_counts.get(line.tokens[1]):
+                self.lines[index] = op_line("pop")
+                self.count("dead stores")
+                changed = True
+        return changed
+
+    def cancel_push_pop(self):
+        changed = False
+        index = 0
+        while index < len(self.lines) - 1:
+            line, following = self.lines[index], self.lines[index + 1]
+            if line.op in PURE_PUSH_OPS and following.op == "pop":
+                del self.lines[index:index + 2]
+                self.count("push/pop pairs")
+                changed = True
+                index = max(index - 1, 0)
+                continue
+            index += 1
+        return changed
+
+    def int_constant(self, line: Line):
+        if line.op not in ("int", "pushint") or is_template(line.tokens[1]):
+            return None
+        return parse_int_constant(line.tokens[1])
+
+    def fold_constants(self):
+        changed = False
+        index = 0
+        while index < len(self.lines) - 2:
+            first, second, operation = self.lines[index:index + 3]
+            a, b = self.int_constant(first), self.int_constant(second)
+            if a is not None and b is not None and operation.op in FOLDABLE_OPS:
+                result = FOLDABLE_OPS[operation.op](a, b)
+                if result is not None and result <= MAX_UINT64:
+                    self.lines[index:index + 3] = [op_line("int", str(result))]
+                    self.count("folded constant ops", 2)
+                    changed = True
+                    # the result can be the second operand of an enclosing op
+                    index = max(index - 1, 0)
+                    continue
+            index += 1
+        return changed
+
+    def is_zero(self, line: Line):
+        return self.int_constant(line) == 0
+
+    def simplify_conditions(self):
+        # `== 0` is `!`, and a negated or zero-compared condition can flip its branch instead;
+        # with a bytes operand both forms fail, so rejections stay rejections
+        changed = False
+        index = 0
+        while index < len(self.lines) - 1:
+            line, following = self.lines[index], self.lines[index + 1]
+            after = self.lines[index + 2] if index + 2 < len(self.lines) else Line("end")
+            if self.is_zero(line) and following.op in ("==", "!=") and after.op in ("bz", "bnz"):
+                flip = following.op == "=="
+                branch = {"bz": "bnz", "bnz": "bz"}[after.op] if flip else after.op
+                self.lines[index:index + 3] = [op_line(branch, after.tokens[1])]
+                self.count("folded conditions", 2)
+                changed = True
+                continue
+            if self.is_zero(line) and following.op == "==":
+                self.lines[index:index + 2] = [op_line("!")]
+                self.count("folded conditions")
+                changed = True
+                continue
+            if line.op == "!" and following.op in ("bz", "bnz"):
+                self.lines[index:index + 2] = [op_line({"bz": "bnz", "bnz": "bz"}[following.op], following.tokens[1])]
+                self.count("folded conditions")
+                changed = True
+                continue
+            if line.op == "!" and following.op == "!" and after.op in ("bz", "bnz", "assert"):
+                del self.lines[index:index + 2]
+                self.count("folded conditions", 2)
+                changed = True
+                continue
+            index += 1
+        return changed
+
+    def next_op_after(self, index: int):
+        # the next op, stepping over labels; None if the program ends first
+        for line in self.lines[index + 1:]:
+            if line.kind == "op":
+                return line
+        return None
+
+    def label_index(self):
+        return {line.tokens[0]: index for index, line in enumerate(self.lines) if line.kind == "label"}
+
+    def final_target(self, target: str, labels: dict):
+        """Where a jump to `target` ends up after any jumps to jumps; None for a cycle of jumps,
+        which loops however it is threaded."""
+        seen = {target}
+        while True:
+            target_op = self.next_op_after(labels[target])
+            if target_op is None or target_op.op != "b":
+                return target
+            target = target_op.tokens[1]
+            if target in seen:
+                return None
+            seen.add(target)
+
+    def simplify_branches(self):
+        changed = False
+        labels = self.label_index()
+        index = 0
+        while index < len(self.lines):
+            line = self.lines[index]
+            previous = self.lines[index - 1] if index else None
+
+            # constant conditions: pyteal emits `int 1; bnz` for While(Int(1)) and similar
+            if line.op in ("bz", "bnz") and previous is not None and previous.op == "int":
+                value = parse_int_constant(previous.tokens[1])
+                taken = (value != 0) == (line.op == "bnz")
+                self.lines[index - 1:index + 1] = [op_line("b", line.tokens[1])] if taken else []
+                self.count("constant branches")
+                changed = True
+                labels = self.label_index()
+                index -= 1
+                continue
+
+            if line.op in BRANCH_OPS:
+                target = line.tokens[1]
+                # jump to a jump: go straight to the final target
+                final_target = self.final_target(target, labels)
+                if final_target is not None and final_target != target:
+                    self.lines[index] = op_line(line.op, final_target)
+                    self.count("threaded jumps")
+                    changed = True
+                    continue
+                # branch to the very next instruction
+                if all(other.kind == "label" for other in self.lines[index + 1:labels[target]]) and labels[target] > index:
+                    self.lines[index] = op_line("pop") if line.op in ("bz", "bnz") else None
+                    if self.lines[index] is None:
+                        del self.lines[index]
+                        labels = self.label_index()
+                    self.count("branches to next")
+                    changed = True
+                    continue
+            index += 1
+        return changed
+
+    def remove_unreachable(self):
+        changed = False
+        index = 0
+        while index < len(self.lines):
+            # `switch` and `match` go on to the next op when no target is taken, so it stays
+            if self.lines[index].op in EXIT_OPS:
+                end = index + 1
+                while end < len(self.lines) and self.lines[end].kind not in ("label", "comment"):
+                    end += 1
+                if end > index + 1:
+                    self.count("unreachable ops", end - index - 1)
+                    del self.lines[index + 1:end]
+                    changed = True
+            index += 1
+        return changed
+
+    def remove_unused_labels(self):
+        referenced = self.referenced_labels()
+        before = len(self.lines)
+        self.lines = [line for line in self.lines if line.kind != "label" or line.tokens[0] in referenced]
+        if len(self.lines) != before:
+            self.count("unused labels", before - len(self.lines))
+            return True
+        return False
+
+    def pool_constants(self):
+        if any(line.op in ("intcblock", "bytecblock") for line in self.lines):
+            return
+        int_counts, byte_counts = {}, {}
+        for line in self.lines:
+            if line.op == "int":
+                value = int_pool_key(line)
+                int_counts[value] = int_counts.get(value, 0) + 1
+            elif line.op == "byte" or line.op == "addr" and is_template(line.tokens[1]):
+                value = byte_pool_key(line)
+                byte_counts[value] = byte_counts.get(value, 0) + 1
+
+        pooled_ints = sorted((value for value, count in int_counts.items() if count > 1 or is_template(value)), key=lambda value: -int_counts[value])
+        pooled_bytes = sorted((value for value, count in byte_counts.items() if count > 1 or is_template(value)), key=lambda value: -byte_counts[value])
+        int_slots = {value: slot for slot, value in enumerate(pooled_ints)}
+        byte_slots = {value: slot for slot, value in enumerate(pooled_bytes)}
+
+        for index, line in enumerate(self.lines):
+            if line.op == "int":
+                value = int_pool_key(line)
+                if value in int_slots:
+                    slot = int_slots[value]
+                    self.lines[index] = op_line(f"intc_{slot}") if slot < 4 else op_line("intc", str(slot))
+                else:
+                    self.lines[index] = op_line("pushint", str(value))
+            elif line.op == "byte" or line.op == "addr" and is_template(line.tokens[1]):
+                value = byte_pool_key(line)
+                if value in byte_slots:
+                    slot = byte_slots[value]
+                    self.lines[index] = op_line(f"bytec_{slot}") if slot < 4 else op_line("bytec", str(slot))
+                else:
+                    self.lines[index] = op_line("pushbytes", "0x" + value.hex())
+
+        blocks = []
+        if pooled_ints:
+            blocks.append(op_line("intcblock", *(str(value) for value in pooled_ints)))
+        if pooled_bytes:
+            blocks.append(op_line("bytecblock", *(value if is_template(value) else "0x" + value.hex() for value in pooled_bytes)))
+        position = next(index for index, line in enumerate(self.lines) if line.kind == "pragma") + 1
+        self.lines[position:position] = blocks
+        self.count("pooled ints", len(pooled_ints))
+        self.count("pooled byte constants", len(pooled_bytes))
+
+    def run(self, pool: bool = True):
+        scratch_passes = not self.uses_dynamic_scratch()
+        changed = True
+        while changed:
+            changed = False
+            if scratch_passes:
+                changed |= self.forward_stores()
+                changed |= self.eliminate_dead_stores()
+            changed |= self.cancel_push_pop()
+            changed |= self.fold_constants()
+            changed |= self.simplify_conditions()
+            changed |= self.simplify_branches()
+            changed |= self.remove_unreachable()
+            changed |= self.remove_unused_labels()
+        if pool:
+            self.pool_constants()
+        return render(self.lines)
+
+def is_template(value):
+    return isinstance(value, str) and value.startswith(TEMPLATE_PREFIX)
+
+def int_pool_key(line: Line):
+    # template variables are pooled by name, everything else by value
+    return line.tokens[1] if is_template(line.tokens[1]) else parse_int_constant(line.tokens[1])
+
+def byte_pool_key(line: Line):
+    return line.tokens[1] if is_template(line.tokens[1]) else decode_byte_constant(line.tokens[1:])
+
+def optimize_teal(teal: str, pool: bool = True):
+    """Optimized TEAL and {pass name: how many rewrites it made}."""
+    optimizer = PeepholeOptimizer(teal)
+    return optimizer.run(pool), optimizer.stats
+
+def foldable_ops(teal: str):
+    """How many ops constant folding alone would remove, i.e. static arithmetic left in the program."""
+    optimizer = PeepholeOptimizer(teal)
+    while optimizer.fold_constants():
+        pass
+    return optimizer.stats.get("folded constant ops", 0)
+
+def apply_optimizer_mode(teal: str, enabled: bool | None = None):
+    """Run the optimizer when GORACLE_TEAL_OPTIMIZE is set."""
+    if enabled is None:
+        enabled = bool(os.environ.get("GORACLE_TEAL_OPTIMIZE"))
+    return optimize_teal(teal)[0] if enabled else teal
+
+def optimization_report(original: str, optimized: str, name: str = "program", signatures: list[str] | None = None, stats: dict | None = None):
+    """Static per-method worst-case cost and estimated size, before and after."""
+    before = analyze_teal(original, name, signatures=signatures)
+    after = analyze_teal(optimized, name, signatures=signatures)
+    methods = {}
+    for signature, method in before["methods"].items():
+        optimized_method = after["methods"].get(signature)
+        methods[signature] = {
+            "before": method["worst_cost"],
+            "after": optimized_method["worst_cost"] if optimized_method else None,
+        }
+    return {
+        "name": name,
+        "passes": stats or {},
+        "worst_cost": {"before": before["worst_cost"], "after": after["worst_cost"]},
+        "bytes": {"before": before["size"]["bytes"], "after": after["size"]["bytes"]},
+        "ops": {"before": len(split_ops(original)), "after": len(split_ops(optimized))},
+        "methods": methods,
+    }
+
+def split_ops(teal: str):
+    return [line for line in parse_lines(teal) if line.kind == "op"]
+
+def format_optimization_report(report: dict):
+    lines = [
+        f"{report['name']}: {report['ops']['before']} -> {report['ops']['after']} ops,"
+        f" ~{report['bytes']['before']} -> ~{report['bytes']['after']} bytes,"
+        f" worst case {report['worst_cost']['before']} -> {report['worst_cost']['after']}",
+    ]
+    if report["passes"]:
+        lines.append("  " + ", ".join(f"{name}: {count}" for name, count in report["passes"].items()))
+    for signature, method in report["methods"].items():
+        delta = "" if method["after"] is None else f"{method['after'] - method['before']:+d}"
+        lines.append(f"  {signature.split('(')[0]:<36} {method['before']:>6} -> {method['after']!s:>6} {delta:>6}")
+    return "\n".join(lines)
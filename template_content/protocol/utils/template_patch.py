@@ -0,0 +1,155 @@
+# pylint: disable=C0114,C0116,C0115,C0103,C0301
+"""
+Deploy-time template variables for compiled programs.
+
+A contract built with `TMPL_*` names in place of its parameters (see template_int() and friends
+in gora_pyteal_utils.py) has every template constant pooled into the `intcblock`/`bytecblock`
+at the head of the program, right after the version. The build compiles it once with
+placeholder values and records where each variable sits in those blocks; a deployment then
+writes the real values straight into the bytecode without pyteal or algod.
+
+Only the constant blocks change length when a value is patched in. Every AVM branch, `callsub`,
+`switch` and `match` target is relative to the instruction, and nothing before the blocks is
+branched to, so the code after them moves as a whole and needs no fix-ups. What does move is
+the pc of every instruction, which matters to pc based error maps (see smart_assert.py).
+"""
+from .teal_optimizer import TEMPLATE_PREFIX, PeepholeOptimizer, is_template, render
+from .teal_cost import split_teal_line
+
+INTCBLOCK_OPCODE = 0x20
+BYTECBLOCK_OPCODE = 0x26
+# compiled in for every template variable; these can't collide with the `method` (4 byte) and
+# `addr` (32 byte) constants that algod matches against an explicit bytecblock
+PLACEHOLDERS = {"int": 0, "bytes": b""}
+
+def encode_varuint(value: int):
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+def decode_varuint(program: bytes, offset: int):
+    """(value, offset after it)"""
+    value, shift = 0, 0
+    while True:
+        if offset >= len(program):
+            raise ValueError("program ends inside a varuint")
+        byte = program[offset]
+        value |= (byte & 0x7F) << shift
+        offset += 1
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+def template_blocks(teal: str):
+    """{template name: (block, index)} from the `intcblock`/`bytecblock` lines of a pooled program."""
+    slots = {}
+    for line in teal.splitlines():
+        tokens = split_teal_line(line)
+        if tokens and tokens[0] in ("intcblock", "bytecblock"):
+            block = "int" if tokens[0] == "intcblock" else "bytes"
+            for index, token in enumerate(tokens[1:]):
+                if is_template(token):
+                    slots[token] = (block, index)
+    return slots
+
+def hoist_templates(teal: str):
+    """Pool the constants of a program that uses template variables, so all of them end up in
+    the constant blocks. A program the optimizer already pooled is returned as is."""
+    if TEMPLATE_PREFIX not in teal:
+        return teal
+    optimizer = PeepholeOptimizer(teal)
+    optimizer.pool_constants()
+    return render(optimizer.lines)
+
+def render_value(value):
+    if isinstance(value, int):
+        return str(value)
+    return "0x" + bytes(value).hex() if value else '""'
+
+def substitute(teal: str, values: dict):
+    """The TEAL with the given template values written into its constant blocks."""
+    lines = []
+    for line in teal.splitlines():
+        tokens = split_teal_line(line)
+        if tokens and tokens[0] in ("intcblock", "bytecblock") and any(is_template(token) for token in tokens[1:]):
+            indent = line[:len(line) - len(line.lstrip())]
+            line = indent + " ".join([tokens[0]] + [render_value(values[token]) if is_template(token) else token for token in tokens[1:]])
+        lines.append(line)
+    return "\n".join(lines) + ("\n" if teal.endswith("\n") else "")
+
+def placeholder_values(teal: str):
+    return {name: PLACEHOLDERS[block] for name, (block, _) in template_blocks(teal).items()}
+
+def read_header(program: bytes):
+    """The version and constant blocks at the head of a program: (version, ints, byte constants,
+    offset of the first instruction after them), with each constant as (value, offset, length)."""
+    version, offset = decode_varuint(program, 0)
+    ints, byte_constants = [], []
+    if offset < len(program) and program[offset] == INTCBLOCK_OPCODE:
+        count, offset = decode_varuint(program, offset + 1)
+        for _ in range(count):
+            value, end = decode_varuint(program, offset)
+            ints.append((value, offset, end - offset))
+            offset = end
+    if offset < len(program) and program[offset] == BYTECBLOCK_OPCODE:
+        count, offset = decode_varuint(program, offset + 1)
+        for _ in range(count):
+            length, start = decode_varuint(program, offset)
+            byte_constants.append((program[start:start + length], offset, start + length - offset))
+            offset = start + length
+    return version, ints, byte_constants, offset
+
+def encode_header(version: int, ints: list[int], byte_constants: list[bytes]):
+    header = bytearray(encode_varuint(version))
+    if ints:
+        header += bytes([INTCBLOCK_OPCODE]) + encode_varuint(len(ints))
+        for value in ints:
+            header += encode_varuint(value)
+    if byte_constants:
+        header += bytes([BYTECBLOCK_OPCODE]) + encode_varuint(len(byte_constants))
+        for value in byte_constants:
+            header += encode_varuint(len(value)) + value
+    return bytes(header)
+
+def template_map(program: bytes, teal: str):
+    """{template name: {block, index, offset, length}} for a program compiled from
+    substitute(teal, placeholder_values(teal)); offset and length cover the encoded entry."""
+    _, ints, byte_constants, _ = read_header(program)
+    blocks = {"int": ints, "bytes": byte_constants}
+    templates = {}
+    for name, (block, index) in template_blocks(teal).items():
+        if index >= len(blocks[block]):
+            raise ValueError(f"{name} is {block} constant {index} but the program only has {len(blocks[block])}")
+        value, offset, length = blocks[block][index]
+        if value != PLACEHOLDERS[block]:
+            raise ValueError(f"{name} is {block} constant {index} but that doesn't hold its placeholder")
+        templates[name] = {"block": block, "index": index, "offset": offset, "length": length}
+    return templates
+
+def patch_program(program: bytes, templates: dict, values: dict):
+    """The program with `values` ({template name: int or bytes}) written over its placeholders.
+    The constant blocks are re-encoded and the rest of the program is copied unchanged."""
+    missing = [name for name in templates if name not in values]
+    if missing:
+        raise KeyError(f"no values for template variables {missing}")
+    version, ints, byte_constants, code_offset = read_header(program)
+    int_values = [value for value, _, _ in ints]
+    byte_values = [value for value, _, _ in byte_constants]
+    for name, entry in templates.items():
+        constants = int_values if entry["block"] == "int" else byte_values
+        if entry["index"] >= len(constants) or constants[entry["index"]] != PLACEHOLDERS[entry["block"]]:
+            raise ValueError(f"{name} isn't a placeholder in this program, was it patched already?")
+        value = values[name]
+        if entry["block"] == "int" and not (isinstance(value, int) and 0 <= value < 2**64):
+            raise ValueError(f"{name} needs a uint64, got {value!r}")
+        if entry["block"] == "bytes" and not isinstance(value, (bytes, bytearray)):
+            raise ValueError(f"{name} needs bytes, got {type(value).__name__}")
+        constants[entry["index"]] = value if entry["block"] == "int" else bytes(value)
+
+    return encode_header(version, int_values, byte_values) + program[code_offset:]
@@ -0,0 +1,306 @@
+import hashlib
+
+from algosdk.abi import Method
+
+from protocol.utils.avm import (
+    AVM,
+    Ledger,
+    Program,
+    app_address,
+    app_call,
+    method_call,
+    payment,
+    sha512_256,
+)
+
+CREATOR = bytes(range(32))
+RECEIVER = bytes(range(32, 64))
+# creating apps with the default 64/64 schema raises the creator's min balance to about 10 algos
+FUNDING = 10**8
+
+
+def run_app(teal: str, group_size: int = 1, app_balance: int = 0, **avm_args):
+    """Install `teal` as an app and call it, padding the group with no-op calls to pool budget."""
+    ledger = Ledger()
+    ledger.fund(CREATOR, FUNDING)
+    app_id = ledger.create_app(CREATOR, Program("#pragma version 8\n" + teal, "test"))
+    noop_id = ledger.create_app(CREATOR, Program("#pragma version 8\nint 1\n", "noop"))
+    if app_balance:
+        ledger.fund(app_address(app_id), app_balance)
+    avm = AVM(ledger, **avm_args)
+    group = [app_call(CREATOR, app_id)] + [app_call(CREATOR, noop_id) for _ in range(group_size - 1)]
+    return avm.execute_group(group), ledger, app_id
+
+
+def test_sha512_256():
+    result, _, _ = run_app('byte "abc"\nsha512_256\nlog\nint 1\n')
+    assert result.ok
+    assert result.calls[0].logs == [bytes.fromhex("53048e2681941ef99b2e29b76b4c7dabe4c2d0c634fc6d46e0e2f13107e7af23")]
+    assert sha512_256(b"abc") == result.calls[0].logs[0]
+
+
+def test_boxes():
+    teal = """
+byte "req"
+int 16
+box_create
+assert
+byte "req"
+int 4
+byte 0xcafe
+box_replace
+byte "req"
+int 4
+int 2
+box_extract
+log
+byte "req"
+box_len
+assert
+itob
+log
+byte "other"
+byte "value"
+box_put
+byte "missing"
+box_get
+!
+assert
+pop
+byte "other"
+box_del
+assert
+int 1
+"""
+    result, ledger, app_id = run_app(teal)
+    assert result.ok, result.error
+    assert result.calls[0].logs == [b"\xca\xfe", (16).to_bytes(8, "big")]
+    assert ledger.apps[app_id]["boxes"] == {b"req": bytes(4) + b"\xca\xfe" + bytes(10)}
+    access = result.calls[0].state_access
+    assert (access.box_creates, access.box_writes, access.box_deletes) == (2, 2, 1)
+    assert access.boxes == {(app_id, b"req"), (app_id, b"other"), (app_id, b"missing")}
+
+
+def test_box_create_rolls_back_with_the_group():
+    result, ledger, app_id = run_app('byte "req"\nint 8\nbox_create\npop\nerr\n')
+    assert not result.ok
+    assert ledger.apps[app_id]["boxes"] == {}
+
+
+def test_box_errors():
+    result, _, _ = run_app('byte "nope"\nint 0\nint 1\nbox_extract\npop\nint 1\n')
+    assert "no such box" in result.error
+    result, _, _ = run_app('byte ""\nint 8\nbox_create\n')
+    assert "box names must be 1-64 bytes long" in result.error
+
+
+def test_inner_payment():
+    teal = """
+itxn_begin
+int pay
+itxn_field TypeEnum
+txna Accounts 1
+itxn_field Receiver
+int 250000
+itxn_field Amount
+itxn_submit
+itxn Amount
+itob
+log
+int 1
+"""
+    ledger = Ledger()
+    ledger.fund(CREATOR, FUNDING)
+    app_id = ledger.create_app(CREATOR, Program("#pragma version 8\n" + teal, "pay"))
+    ledger.fund(app_address(app_id), 1_000_000)
+    result = AVM(ledger).execute_group([app_call(CREATOR, app_id, accounts=[RECEIVER])])
+    assert result.ok, result.error
+    assert ledger.account(RECEIVER)["balance"] == 250_000
+    # the inner txn pays its own fee from the app account
+    assert ledger.account(app_address(app_id))["balance"] == 1_000_000 - 250_000 - 1000
+    assert result.calls[0].logs == [(250_000).to_bytes(8, "big")]
+
+
+def test_failed_inner_txn_fails_the_group():
+    teal = "itxn_begin\nint pay\nitxn_field TypeEnum\ntxna Accounts 1\nitxn_field Receiver\nint 250000\nitxn_field Amount\nitxn_submit\nint 1\n"
+    ledger = Ledger()
+    ledger.fund(CREATOR, FUNDING)
+    app_id = ledger.create_app(CREATOR, Program("#pragma version 8\n" + teal, "pay"))
+    result = AVM(ledger).execute_group([app_call(CREATOR, app_id, accounts=[RECEIVER])])
+    assert not result.ok
+    assert "inner tx 0 failed" in result.error
+    assert ledger.account(CREATOR)["balance"] == FUNDING
+
+
+def test_inner_app_call_adds_budget():
+    # 6 keccak256 are 780, over one call's 700 until the inner app call pools in another 700
+    hashes = 'byte "x"\n' + "keccak256\n" * 6 + "pop\n"
+    inner = "itxn_begin\nint appl\nitxn_field TypeEnum\ntxna Applications 1\nitxn_field ApplicationID\nitxn_submit\n"
+    ledger = Ledger()
+    ledger.fund(CREATOR, FUNDING)
+    noop_id = ledger.create_app(CREATOR, Program("#pragma version 8\nint 1\n", "noop"))
+    app_id = ledger.create_app(CREATOR, Program("#pragma version 8\n" + inner + hashes + "int 1\n", "opup"))
+    ledger.fund(app_address(app_id), 1_000_000)
+    result = AVM(ledger).execute_group([app_call(CREATOR, app_id, applications=[noop_id])])
+    assert result.ok, result.error
+    assert result.budget == 1400
+    assert [inner.app_id for inner in result.calls[0].inner] == [noop_id]
+
+
+def test_vrf_verify():
+    calls = []
+
+    def verifier(message, proof, public_key):
+        calls.append((message, proof, public_key))
+        return b"\x07" * 64, True
+
+    teal = """
+byte "message"
+pushbytes 0x%s
+pushbytes 0x%s
+vrf_verify VrfAlgorand
+assert
+log
+int 1
+""" % ((b"\x01" * 80).hex(), (b"\x02" * 32).hex())
+    # vrf_verify costs 5700, so it needs nine app calls of pooled budget
+    result, _, _ = run_app(teal, group_size=9, vrf_verifier=verifier)
+    assert result.ok, result.error
+    assert calls == [(b"message", b"\x01" * 80, b"\x02" * 32)]
+    assert result.calls[0].logs == [b"\x07" * 64]
+    assert result.calls[0].cost == 5700 + 6
+
+
+def test_vrf_verify_default_verifier_and_lengths():
+    proof, public_key = b"\x01" * 80, b"\x02" * 32
+    teal = 'byte "m"\npushbytes 0x%s\npushbytes 0x%s\nvrf_verify VrfAlgorand\nassert\nlog\nint 1\n'
+    result, _, _ = run_app(teal % (proof.hex(), public_key.hex()), group_size=9)
+    assert result.calls[0].logs == [hashlib.sha512(proof + b"m" + public_key).digest()]
+    result, _, _ = run_app(teal % (proof[:79].hex(), public_key.hex()), group_size=9)
+    assert "vrf_verify proof must be 80 bytes" in result.error
+
+
+def test_vrf_verify_in_logic_signature():
+    # the vote verifier is a logic signature over an app call, with its own 20000 budget
+    lsig = Program(
+        "#pragma version 7\ntxna ApplicationArgs 0\ntxna ApplicationArgs 1\ntxna ApplicationArgs 2\nvrf_verify VrfAlgorand\nbury 1\n",
+        "lsig"
+    )
+    ledger = Ledger()
+    ledger.fund(CREATOR, FUNDING)
+    noop_id = ledger.create_app(CREATOR, Program("#pragma version 8\nint 1\n", "noop"))
+    txn = app_call(CREATOR, noop_id, [b"message", b"\x01" * 80, b"\x02" * 32], lsig=(lsig, []))
+    result = AVM(ledger).execute_group([txn])
+    assert result.ok, result.error
+    assert result.lsig_costs == {0: 3 + 5700 + 1}
+    assert result.cost == 1
+
+
+def test_abi_byte_ops():
+    # the ops the ABI codecs compile to: fixed-offset reads, head/tail splices and uint encodings
+    teal = """
+pushbytes 0x0001000200000003000000000000000400ff
+dup
+extract 2 2
+log
+dup
+int 0
+extract_uint16
+itob
+log
+dup
+int 4
+extract_uint32
+itob
+log
+dup
+int 8
+extract_uint64
+itob
+log
+dup
+int 16
+int 2
+extract3
+log
+dup
+byte 0xaaaa
+replace2 0
+extract 0 4
+log
+int 2
+byte 0xbbbb
+replace3
+dup
+len
+itob
+log
+int 0
+int 4
+substring3
+byte 0x00
+concat
+log
+int 1
+"""
+    result, _, _ = run_app(teal)
+    assert result.ok, result.error
+    assert result.calls[0].logs == [
+        b"\x00\x02",
+        (1).to_bytes(8, "big"),
+        (3).to_bytes(8, "big"),
+        (4).to_bytes(8, "big"),
+        b"\x00\xff",
+        b"\xaa\xaa\x00\x02",
+        (18).to_bytes(8, "big"),
+        b"\x00\x01\xbb\xbb\x00",
+    ]
+
+
+def test_abi_byte_op_bounds():
+    result, _, _ = run_app("byte 0x01\nreplace3\nint 1\n")
+    assert "stack underflow or index out of range in replace3" in result.error
+    result, _, _ = run_app("byte 0x0102\nextract 1 2\npop\nint 1\n")
+    assert not result.ok
+    result, _, _ = run_app("byte 0x0102\nint 1\nextract_uint16\npop\nint 1\n")
+    assert not result.ok
+
+
+def test_method_call_encodes_abi_args():
+    method = Method.from_signature("set(uint64,byte[],account)void")
+    teal = "txna ApplicationArgs 1\nlog\ntxna ApplicationArgs 2\nextract 2 0\nlog\ntxna ApplicationArgs 3\nbtoi\ntxnas Accounts\nlog\nint 1\n"
+    ledger = Ledger()
+    ledger.fund(CREATOR, FUNDING)
+    app_id = ledger.create_app(CREATOR, Program("#pragma version 8\n" + teal, "abi"))
+    result = AVM(ledger).execute_group([method_call(CREATOR, app_id, method, [7, b"gora", RECEIVER])])
+    assert result.ok, result.error
+    assert result.calls[0].logs == [(7).to_bytes(8, "big"), b"gora", RECEIVER]
+
+
+def test_cost_accounting():
+    result, _, _ = run_app('byte "x"\nsha512_256\npop\nint 1\n')
+    assert (result.calls[0].cost, result.cost, result.budget) == (48, 48, 700)
+
+    # 6 keccak256 are over one app call's budget but fit in a group of two
+    teal = 'byte "x"\n' + "keccak256\n" * 6 + "pop\nint 1\n"
+    result, _, _ = run_app(teal)
+    assert not result.ok
+    assert "dynamic cost budget exceeded" in result.error
+    result, _, _ = run_app(teal, group_size=2)
+    assert result.ok, result.error
+    assert (result.calls[0].cost, result.calls[1].cost, result.cost, result.budget) == (783, 1, 784, 1400)
+
+
+def test_fees_and_rollback():
+    result, ledger, _ = run_app("int 1\n", group_size=2)
+    assert result.ok
+    assert ledger.account(CREATOR)["balance"] == FUNDING - 2000
+
+    ledger = Ledger()
+    ledger.fund(CREATOR, FUNDING)
+    app_id = ledger.create_app(CREATOR, Program("#pragma version 8\nint 0\n", "reject"))
+    result = AVM(ledger).execute_group([payment(CREATOR, RECEIVER, 500_000), app_call(CREATOR, app_id)])
+    assert not result.ok
+    assert "rejected by ApprovalProgram" in result.error
+    assert ledger.account(CREATOR)["balance"] == FUNDING
+    assert ledger.account(RECEIVER)["balance"] == 0
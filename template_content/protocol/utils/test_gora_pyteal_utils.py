@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+# the module loads the contract ABIs when it's imported
+os.environ.setdefault("GORACLE_ABI_PATH", os.path.join(PROJECT_PATH, "protocol", "assets", "abi"))
+
+from pyteal import App, Approve, Bytes, If, Int, Itob, Log, Mode, Seq, TealInputError, Txn, compileTeal
+
+from protocol.utils.avm import AVM, Ledger, Program, app_call
+from protocol.utils.gora_pyteal_utils import GlobalStateCache
+
+SENDER = bytes(range(32))
+KEYS = {"fee": Bytes("f"), "percentage": Bytes("p")}
+
+
+def refund_program(load_refund: bool = True):
+    """Logs a refund on calls without args and the fee otherwise, like refund_request's two paths."""
+    settings = GlobalStateCache(KEYS)
+    settings.define("refund", settings.get("percentage") * settings.get("fee") / Int(100))
+    return compileTeal(Seq([
+        settings.load(),
+        If(Txn.application_args.length() == Int(0))
+        .Then(Seq([
+            settings.load("refund") if load_refund else Seq([]),
+            Log(Itob(settings.get("refund"))),
+            Log(Itob(settings.get("refund"))),
+        ]))
+        .Else(Seq([
+            Log(Itob(settings.get("fee"))),
+            Log(Itob(settings.get("fee"))),
+        ])),
+        Approve()
+    ]), mode=Mode.Application, version=8)
+
+
+def call(teal: str, globals_: dict, args: list):
+    ledger = Ledger()
+    ledger.fund(SENDER, 10**8)
+    app_id = ledger.create_app(SENDER, Program(teal, "cache"), globals_=globals_)
+    return AVM(ledger).execute_group([app_call(SENDER, app_id, args)])
+
+
+def test_reads_cached_from_the_third():
+    teal = refund_program()
+    # `fee` is read three times, `percentage` once
+    assert teal.count('byte "f"\napp_global_get') == 1
+    assert teal.count('byte "p"\napp_global_get') == 1
+    result = call(teal, {b"f": 2000, b"p": 50}, [])
+    assert result.ok, result.error
+    assert result.calls[0].logs == [(1000).to_bytes(8, "big")] * 2
+
+
+def test_defined_value_only_computed_where_loaded():
+    # the refund overflows, which only the path that reads it may fail on
+    globals_ = {b"f": 2**63, b"p": 50}
+    assert not call(refund_program(), globals_, []).ok
+    result = call(refund_program(), globals_, [b"fee"])
+    assert result.ok, result.error
+    assert result.calls[0].logs == [(2**63).to_bytes(8, "big")] * 2
+
+
+def test_defined_value_read_before_its_load():
+    with pytest.raises(TealInputError, match="refund is read before a load"):
+        refund_program(load_refund=False)
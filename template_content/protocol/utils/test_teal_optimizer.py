@@ -0,0 +1,253 @@
+import os
+import sys
+
+import pytest
+
+from protocol.utils.avm import AVM, Ledger, Program, app_call, replay_trace, diff_replays
+from protocol.utils.teal_optimizer import PeepholeOptimizer, apply_optimizer_mode, foldable_ops, optimize_teal
+
+PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+SENDER = bytes(range(32))
+
+
+def run_pass(teal: str, pass_name: str):
+    """The ops left after running one pass to a fixed point, with the optimizer's stats."""
+    optimizer = PeepholeOptimizer("#pragma version 8\n" + teal)
+    while getattr(optimizer, pass_name)():
+        pass
+    return [line.text for line in optimizer.lines if line.kind != "pragma"], optimizer.stats
+
+
+def run_program(teal: str):
+    ledger = Ledger()
+    ledger.fund(SENDER, 10**8)
+    app_id = ledger.create_app(SENDER, Program(teal, "test"))
+    result = AVM(ledger).execute_group([app_call(SENDER, app_id)])
+    return result.ok, result.error, result.calls[0].logs if result.calls else []
+
+
+def assert_same_behaviour(teal: str):
+    optimized, _ = optimize_teal(teal)
+    before, after = run_program(teal), run_program(optimized)
+    assert before[0] == after[0]
+    assert before[2] == after[2]
+    return optimized
+
+
+def test_forward_stores():
+    ops, stats = run_pass("int 5\nstore 0\nload 0\nlog\nload 1\nstore 1\nint 1\n", "forward_stores")
+    assert ops == ["int 5", "log", "int 1"]
+    assert stats == {"forwarded loads": 1, "self copies": 1}
+
+
+def test_forward_stores_keeps_slots_loaded_twice():
+    teal = "int 5\nstore 0\nload 0\nload 0\n+\n"
+    assert run_pass(teal, "forward_stores")[0] == teal.splitlines()
+
+
+def test_eliminate_dead_stores():
+    ops, stats = run_pass("int 5\nstore 3\nint 6\nstore 4\nload 4\n", "eliminate_dead_stores")
+    assert ops == ["int 5", "pop", "int 6", "store 4", "load 4"]
+    assert stats == {"dead stores": 1}
+
+
+def test_scratch_passes_skipped_with_dynamic_scratch():
+    teal = "#pragma version 8\nint 5\nstore 3\nint 3\nloads\nint 1\n"
+    optimized, stats = optimize_teal(teal, pool=False)
+    assert "store 3" in optimized
+    assert "dead stores" not in stats
+
+
+def test_cancel_push_pop():
+    ops, stats = run_pass("txn Sender\nint 1\npop\npop\nbyte 0x01\nlog\nint 1\n", "cancel_push_pop")
+    assert ops == ["byte 0x01", "log", "int 1"]
+    assert stats == {"push/pop pairs": 2}
+
+
+def test_cancel_push_pop_keeps_side_effects():
+    teal = "int 1\nint 2\n/\npop\nint 1\n"
+    assert run_pass(teal, "cancel_push_pop")[0] == teal.splitlines()
+
+
+def test_fold_constants():
+    ops, stats = run_pass("int 2\nint 3\nint 4\n*\n+\nint 1\n", "fold_constants")
+    assert ops == ["int 14", "int 1"]
+    assert stats == {"folded constant ops": 4}
+
+
+@pytest.mark.parametrize("teal", [
+    "int 1\nint 2\n-\n",
+    "int 1\nint 0\n/\n",
+    "int 1\nint 0\n%\n",
+    "int 18446744073709551615\nint 1\n+\n",
+    "int 1\nint 64\n<<\n",
+    "int TMPL_FEE\nint 1\n+\n",
+])
+def test_fold_constants_leaves_failing_ops(teal):
+    # the AVM fails on these, so folding them would turn a rejection into an approval
+    assert run_pass(teal, "fold_constants")[0] == teal.splitlines()
+
+
+def test_foldable_ops():
+    assert foldable_ops("#pragma version 8\nint 2\nint 3\n+\nint 4\nint 5\n*\n==\n") == 6
+
+
+def test_simplify_conditions():
+    assert run_pass("txn Fee\nint 0\n==\nbnz done\n", "simplify_conditions")[0] == ["txn Fee", "bz done"]
+    assert run_pass("txn Fee\nint 0\n!=\nbz done\n", "simplify_conditions")[0] == ["txn Fee", "bz done"]
+    assert run_pass("txn Fee\nint 0\n==\nlog\n", "simplify_conditions")[0] == ["txn Fee", "!", "log"]
+    assert run_pass("txn Fee\n!\nbz done\n", "simplify_conditions")[0] == ["txn Fee", "bnz done"]
+    assert run_pass("txn Fee\n!\n!\nassert\n", "simplify_conditions")[0] == ["txn Fee", "assert"]
+
+
+def test_simplify_conditions_keeps_double_negation_as_value():
+    # `!; !` also turns any non-zero value into 1, which only a branch or assert can ignore
+    teal = "txn Fee\n!\n!\nlog\n"
+    assert run_pass(teal, "simplify_conditions")[0] == teal.splitlines()
+
+
+def test_simplify_branches():
+    ops, stats = run_pass("int 1\nbnz a\nint 0\nbz b\na:\nb next\nb:\nerr\nnext:\nint 1\n", "simplify_branches")
+    # `int 0; bz b` always jumps, and the jump to `a` goes on to `next`
+    assert ops == ["b next", "b b", "a:", "b next", "b:", "err", "next:", "int 1"]
+    assert stats["constant branches"] == 2
+    assert stats["threaded jumps"] == 1
+
+
+def test_simplify_branches_to_next_instruction():
+    ops, stats = run_pass("txn Fee\nbnz next\nb next\nnext:\nint 1\n", "simplify_branches")
+    assert ops == ["txn Fee", "pop", "next:", "int 1"]
+    assert stats == {"branches to next": 2}
+
+
+def test_simplify_branches_stops_at_jump_cycles():
+    # `a` and `c` jump to each other, so threading the jump to `a` has no final target
+    ops, stats = run_pass("txn Fee\nbnz a\nb a\na:\nb c\nc:\nb a\n", "simplify_branches")
+    assert ops == ["txn Fee", "pop", "a:", "c:", "b a"]
+    assert "threaded jumps" not in stats
+    optimized, _ = optimize_teal("#pragma version 8\nint 1\nbnz a\nb a\na:\nb c\nc:\nb a\n")
+    assert optimized.splitlines()[1:] == ["a:", "b a"]
+
+
+def test_remove_unreachable():
+    ops, stats = run_pass("int 1\nreturn\nint 2\nlog\n// a comment\nint 3\nlabel:\nint 4\n", "remove_unreachable")
+    assert ops == ["int 1", "return", "// a comment", "int 3", "label:", "int 4"]
+    assert stats == {"unreachable ops": 2}
+
+
+def test_remove_unreachable_keeps_jump_table_fallthrough():
+    # with no target taken, `switch` and `match` carry on with the next op
+    teal = "txn Fee\nswitch a\nint 2\nlog\na:\nint 1\n"
+    assert run_pass(teal, "remove_unreachable")[0] == teal.splitlines()
+
+
+def test_remove_unused_labels():
+    ops, stats = run_pass("b used\nunused:\nused:\ncallsub sub\nint 1\nreturn\nsub:\nretsub\n", "remove_unused_labels")
+    assert ops == ["b used", "used:", "callsub sub", "int 1", "return", "sub:", "retsub"]
+    assert stats == {"unused labels": 1}
+
+
+def test_pool_constants():
+    optimizer = PeepholeOptimizer("#pragma version 8\nint 7\nint 7\nint 9\nbyte 0xaa\nbyte 0xaa\nbyte \"b\"\nint TMPL_FEE\n")
+    optimizer.pool_constants()
+    assert [line.text for line in optimizer.lines] == [
+        "#pragma version 8",
+        "intcblock 7 TMPL_FEE",
+        "bytecblock 0xaa",
+        "intc_0",
+        "intc_0",
+        "pushint 9",
+        "bytec_0",
+        "bytec_0",
+        "pushbytes 0x62",
+        "intc_1",
+    ]
+    assert optimizer.stats == {"pooled ints": 2, "pooled byte constants": 1}
+
+
+def test_pool_constants_leaves_existing_blocks():
+    teal = "#pragma version 8\nintcblock 1\nint 7\nint 7\n"
+    optimizer = PeepholeOptimizer(teal)
+    optimizer.pool_constants()
+    assert [line.text for line in optimizer.lines] == teal.splitlines()
+
+
+def test_optimized_programs_behave_the_same():
+    optimized = assert_same_behaviour("""#pragma version 8
+int 2
+int 3
++
+store 0
+load 0
+itob
+log
+int 0
+int 0
+==
+bnz skip
+err
+skip:
+int 1
+int 0
+bz done
+b done
+done:
+byte "x"
+byte "x"
+concat
+log
+int 1
+return
+""")
+    assert "err" not in optimized
+    assert_same_behaviour("#pragma version 8\nint 1\nint 2\n-\npop\nint 1\n")
+
+
+def test_apply_optimizer_mode(monkeypatch):
+    teal = "#pragma version 8\nint 2\nint 3\n+\n"
+    monkeypatch.delenv("GORACLE_TEAL_OPTIMIZE", raising=False)
+    assert apply_optimizer_mode(teal) == teal
+    monkeypatch.setenv("GORACLE_TEAL_OPTIMIZE", "1")
+    assert apply_optimizer_mode(teal) == "#pragma version 8\npushint 5\n"
+
+
+@pytest.fixture(scope="module")
+def protocol_trace():
+    """The protocol built with the offline algod stand-in and a smoke run of it, which votes a
+    request through the voting contract, as a trace to replay."""
+    os.environ.setdefault("GORACLE_FAKE_ALGOD", "1")
+    sys.path.insert(0, os.path.join(PROJECT_PATH, "default_app"))
+    working_directory = os.getcwd()
+    # default_app's modules find the protocol sources relative to the working directory
+    os.chdir(PROJECT_PATH)
+    try:
+        from build_graph import build_protocol
+        from contract_traces import record_smoke_trace
+
+        artifacts = build_protocol(1)
+        smoke_trace, _ = record_smoke_trace(artifacts, 1, requests=8)
+    finally:
+        os.chdir(working_directory)
+
+    ledger = replay_trace(smoke_trace)[1]
+    voting_app_id = next(app_id for app_id, app in ledger.apps.items() if app["approval"] is not None and app["approval"].name == "voting_approval")
+    return artifacts, smoke_trace, voting_app_id
+
+
+def test_protocol_round_trip(protocol_trace):
+    artifacts, trace, voting_app_id = protocol_trace
+    replacements = {}
+    for name in ("main_approval", "voting_approval"):
+        optimized, stats = optimize_teal(artifacts[name].teal)
+        assert stats
+        replacements[Program(artifacts[name].teal, name).source_hash] = Program(optimized, name + "_optimized")
+
+    expected = replay_trace(trace)
+    actual = replay_trace(trace, replacements)
+    assert diff_replays(expected, actual) == []
+    # the trace has to get votes through the voting contract for the round trip to cover it
+    from gora_abi_client import VOTING_METHODS
+
+    vote_selector = VOTING_METHODS["vote"].get_selector()
+    approved_groups = [group for group, result in zip(trace.groups, expected[0]) if result.ok]
+    assert any(txn.get("ApplicationID") == voting_app_id and txn["ApplicationArgs"][0] == vote_selector for group in approved_groups for txn in group)
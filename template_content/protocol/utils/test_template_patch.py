@@ -0,0 +1,136 @@
+import base64
+import os
+import sys
+
+import pytest
+
+from protocol.utils.template_patch import (
+    decode_varuint,
+    encode_varuint,
+    hoist_templates,
+    patch_program,
+    placeholder_values,
+    read_header,
+    substitute,
+    template_map,
+)
+
+PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CODE = b"\x81\x01\x43"  # pushint 1; return
+
+TEAL = """#pragma version 8
+int TMPL_FEE
+int 0
+byte TMPL_KEY
+int TMPL_LIMIT
+byte TMPL_OWNER
+int 7
+int 7
+byte 0xaa
+byte 0xaa
++
+"""
+
+
+@pytest.fixture(scope="module")
+def fake_algod():
+    # the stand-in encodes the version and constant blocks the way algod does, so it can compile
+    # both the placeholder build and a build with the real values to compare against
+    sys.path.insert(0, os.path.join(PROJECT_PATH, "default_app"))
+    from fake_algod import FakeAlgodClient
+
+    return FakeAlgodClient()
+
+
+def compile_program(algod, teal: str):
+    return base64.b64decode(algod.compile(teal)["result"])
+
+
+def test_varuint_round_trip():
+    for value, encoded in [(0, b"\x00"), (127, b"\x7f"), (128, b"\x80\x01"), (300, b"\xac\x02"), (2**64 - 1, b"\xff" * 9 + b"\x01")]:
+        assert encode_varuint(value) == encoded
+        assert decode_varuint(b"\x01" + encoded + b"\x43", 1) == (value, 1 + len(encoded))
+    with pytest.raises(ValueError, match="program ends inside a varuint"):
+        decode_varuint(b"\x80", 0)
+
+
+def test_patch_grows_the_varuint():
+    # #pragma version 8; intcblock 5 TMPL_FEE compiled with the placeholder
+    program = b"\x08\x20\x02\x05\x00" + CODE
+    teal = "#pragma version 8\nintcblock 5 TMPL_FEE\npushint 1\nreturn\n"
+    templates = template_map(program, teal)
+    assert templates == {"TMPL_FEE": {"block": "int", "index": 1, "offset": 4, "length": 1}}
+
+    assert patch_program(program, templates, {"TMPL_FEE": 300}) == b"\x08\x20\x02\x05\xac\x02" + CODE
+    assert patch_program(program, templates, {"TMPL_FEE": 2**64 - 1}) == b"\x08\x20\x02\x05" + b"\xff" * 9 + b"\x01" + CODE
+
+
+def test_patch_grows_a_byte_constant():
+    # a 200 byte value needs a two byte length prefix where the placeholder had one
+    program = b"\x08\x26\x02\x01\xaa\x00" + CODE
+    teal = "#pragma version 8\nbytecblock 0xaa TMPL_KEY\npushint 1\nreturn\n"
+    templates = template_map(program, teal)
+    assert templates == {"TMPL_KEY": {"block": "bytes", "index": 1, "offset": 5, "length": 1}}
+
+    value = bytes(range(200))
+    assert patch_program(program, templates, {"TMPL_KEY": value}) == b"\x08\x26\x02\x01\xaa\xc8\x01" + value + CODE
+
+
+def test_templates_sharing_the_placeholder():
+    # every template of a block compiles to the same placeholder, next to a literal 0
+    program = b"\x08\x20\x03\x00\x00\x00\x26\x02\x00\x00" + CODE
+    teal = "#pragma version 8\nintcblock TMPL_A 0 TMPL_B\nbytecblock TMPL_C TMPL_D\npushint 1\nreturn\n"
+    templates = template_map(program, teal)
+    assert {name: (entry["block"], entry["index"]) for name, entry in templates.items()} == {
+        "TMPL_A": ("int", 0),
+        "TMPL_B": ("int", 2),
+        "TMPL_C": ("bytes", 0),
+        "TMPL_D": ("bytes", 1),
+    }
+
+    patched = patch_program(program, templates, {"TMPL_A": 1, "TMPL_B": 2, "TMPL_C": b"c", "TMPL_D": b"dd"})
+    assert patched == b"\x08\x20\x03\x01\x00\x02\x26\x02\x01c\x02dd" + CODE
+    _, ints, byte_constants, _ = read_header(patched)
+    assert [value for value, _, _ in ints] == [1, 0, 2]
+    assert [value for value, _, _ in byte_constants] == [b"c", b"dd"]
+
+
+def test_patching_a_patched_program_fails():
+    program = b"\x08\x20\x02\x05\x00" + CODE
+    templates = template_map(program, "#pragma version 8\nintcblock 5 TMPL_FEE\n")
+    patched = patch_program(program, templates, {"TMPL_FEE": 300})
+    with pytest.raises(ValueError, match="was it patched already"):
+        patch_program(patched, templates, {"TMPL_FEE": 400})
+    # nor can the map be taken from it
+    with pytest.raises(ValueError, match="doesn't hold its placeholder"):
+        template_map(patched, "#pragma version 8\nintcblock 5 TMPL_FEE\n")
+
+
+def test_patch_checks_values():
+    program = b"\x08\x20\x01\x00\x26\x01\x00" + CODE
+    templates = template_map(program, "#pragma version 8\nintcblock TMPL_FEE\nbytecblock TMPL_KEY\n")
+    with pytest.raises(KeyError, match="TMPL_KEY"):
+        patch_program(program, templates, {"TMPL_FEE": 1})
+    with pytest.raises(ValueError, match="TMPL_FEE needs a uint64"):
+        patch_program(program, templates, {"TMPL_FEE": 2**64, "TMPL_KEY": b""})
+    with pytest.raises(ValueError, match="TMPL_KEY needs bytes"):
+        patch_program(program, templates, {"TMPL_FEE": 1, "TMPL_KEY": "key"})
+
+
+def test_template_map_needs_the_blocks():
+    with pytest.raises(ValueError, match="TMPL_FEE is int constant 1 but the program only has 1"):
+        template_map(b"\x08\x20\x01\x05" + CODE, "#pragma version 8\nintcblock 5 TMPL_FEE\n")
+
+
+def test_patch_matches_a_direct_compile(fake_algod):
+    teal = hoist_templates(TEAL)
+    assert "intcblock" in teal and "bytecblock" in teal
+    program = compile_program(fake_algod, substitute(teal, placeholder_values(teal)))
+    templates = template_map(program, teal)
+    assert set(templates) == {"TMPL_FEE", "TMPL_LIMIT", "TMPL_KEY", "TMPL_OWNER"}
+
+    for values in [
+        {"TMPL_FEE": 1000, "TMPL_LIMIT": 2**40, "TMPL_KEY": b"gora", "TMPL_OWNER": bytes(range(32))},
+        {"TMPL_FEE": 0, "TMPL_LIMIT": 1, "TMPL_KEY": b"", "TMPL_OWNER": b"\xff" * 200},
+    ]:
+        assert patch_program(program, templates, values) == compile_program(fake_algod, substitute(teal, values))